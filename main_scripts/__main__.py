@@ -1,4 +1,4 @@
 from main_scripts import main
 
 if __name__ == "__main__":
-    main()
+    main.run()
@@ -5,39 +5,27 @@ from pydantic import BaseModel
 import uvicorn
 
 # Импортирование библиотек для работы с данными
-import warnings
+import asyncio
 from typing import Optional, List, \
-    Dict, Tuple
-import json
+    Dict, Tuple, Any
+import time
 import os
+from datetime import datetime, time as day_time
 import emoji
-from collections import OrderedDict
 import numpy as np
 import pandas as pd
 from tabulate import tabulate
-from scipy import stats
-
-# Импортирование алгоритмов машинного обучения из sklearn
-from sklearn.cluster import KMeans, DBSCAN, \
-    AgglomerativeClustering, \
-    AffinityPropagation, \
-    SpectralClustering
-from sklearn.naive_bayes import GaussianNB
-from sklearn.neighbors import KNeighborsClassifier
-from sklearn.svm import SVC
-from sklearn.linear_model import LogisticRegression
-from sklearn.tree import DecisionTreeClassifier
-from sklearn.ensemble import RandomForestClassifier, \
-    GradientBoostingClassifier
-from sklearn.metrics import precision_score, \
-    recall_score, silhouette_score, \
-    accuracy_score
 
 # импорт других файлов проекта
 from src.analysis import classification_methods, \
     clusterization_methods, \
     two_methods_included
 from src.analysis.connector import DatabaseConnector
+from src.analysis.job_queue import job_queue
+from src.analysis.model_cache import model_cache
+from src.analysis.pool_registry import pool_registry
+from src.analysis.training import train_claster_classif_models
+from src.analysis.training_pool import training_pool
 
 # Инициализация API и других переменных
 app = FastAPI()
@@ -55,7 +43,49 @@ class StringsInputServer(BaseModel):
     name_table_for_predict: Optional[str] = None
     label_limit: Optional[str] = None
     str_limit: Optional[str] = None
+    time_from: Optional[str] = None
+    time_to: Optional[str] = None
+    create_filter_indexes: Optional[bool] = False
+    incremental: Optional[bool] = False
+    force_retrain: Optional[bool] = False
     task_manager: str
+    fetch_mode: Optional[str] = None
+    save_predictions: Optional[bool] = False
+
+
+class ActiveModelInput(BaseModel):
+    server: str
+    port: int
+    user: str
+    password: str
+    name_database_agent: str
+    machine: str
+    model_table: str
+    model_id: int
+
+
+class ActiveModelResetInput(BaseModel):
+    server: str
+    port: int
+    user: str
+    password: str
+    name_database_agent: str
+    machine: str
+    model_table: str
+
+
+class BatchTrainInput(BaseModel):
+    server: str
+    port: int
+    user: str
+    password: str
+    name_database_data: str
+    name_database_agent: str
+    tables_for_learn: List[str]
+    max_concurrency: Optional[int] = None
+    incremental: Optional[bool] = False
+    force_retrain: Optional[bool] = False
+    fetch_mode: Optional[str] = None
 
 
 # Задача DELETE
@@ -82,11 +112,13 @@ async def delete_task_processing(
     """
     print("\tМенеджер указал задачу удаления"
           " - данные о прошлом опыте моделей будут удалены......")
-    # Удаление всех записей с таблиц агента
-    await db_connector_agent.\
-        delete_table_agent("data_classif")
-    await db_connector_agent.\
-        delete_table_agent("data_claster")
+    # Удаление всех записей с таблиц агента (в том числе назначенных
+    # вручную моделей, которые ссылаются на удаляемые ID)
+    await db_connector_agent.clear_agent_tables()
+    two_methods_included.clear_study_history()
+    # Идентификаторы моделей начинаются заново и будут выданы другим
+    # моделям, поэтому кэш по ним больше недействителен
+    model_cache.clear()
     print("\tДанные удалены!\n")
     await db_connector_agent.close()
     return {"data": "Данные удалены!"}
@@ -94,24 +126,30 @@ async def delete_task_processing(
 
 # Модуль выбора методов классификации и кластеризации для задачи LEARN
 async def data_learn_claster_classif_distribution(
-        data: List[Dict],
+        data: Tuple,
         task_manager: str,
         db_connector_agent: DatabaseConnector,
-        db_connector_data: DatabaseConnector
+        db_connector_data: DatabaseConnector,
+        fingerprint: Optional[str] = None
 ) -> bool:
     """Выполняет обучение моделей кластеризации
      и классификации на предоставленных данных
       и сохраняет результаты.
 
+    Обучение выполняется в пуле процессов training_pool.
+
     Args:
-        data: List[Dict].
-        Список словарей, содержащих данные для обучения.
+        data: Tuple.
+        Данные для обучения, собранные data_formater_chunks
+        (признаки, число кластеров, ID, метки).
         task_manager: str.
         Идентификатор задачи обучения.
         db_connector_agent: DatabaseConnector.
         Объект для подключения к базе данных агента.
         db_connector_data: DatabaseConnector.
         Объект для подключения к базе данных с данными для обучения.
+        fingerprint: Optional[str].
+        Отпечаток таблицы обучения, сохраняется вместе с моделями.
 
     Returns:
         bool.
@@ -123,602 +161,53 @@ async def data_learn_claster_classif_distribution(
         Если произошла ошибка во время обучения или сохранения данных
         (например, проблемы с подключением к базе данных, ошибки в запросе).
     """
-    data_for_clustering, num_clusters, id_column, label_column = \
-        two_methods_included.data_formater(
-            data, task_manager, "clasterization"
-        )
-    (
-        labels_cluster,
-        name_model_clusterization,
-        model_clusterization,
-        hyper_accuracy
-    ) = data_clasterization(
-        data_for_clustering,
-        num_clusters
+    id_column = data[2]
+    machine = str(db_connector_data.equipment)
+    trained = await training_pool.run(
+        train_claster_classif_models, data, task_manager, machine
     )
-    data_with_labels = two_methods_included.concatenate_data_with_labels(
-        data_for_clustering, labels_cluster, "behind"
-    )
-    data_for_classification = two_methods_included.data_formater(
-        data_with_labels, task_manager, "classification"
-    )
-    name_model_classification, model_classification, \
-        model_accuracy = data_classification(
-            data_for_classification, label_column
-        )
     # Данные для вставки
     data_for_claster_table = {
-        "machine": str(db_connector_data.equipment),
-        "method_claster": str(name_model_clusterization),
+        "machine": machine,
+        "method_claster": str(trained.name_claster),
         "method_param": "Optuna",
-        "accuracy": hyper_accuracy+0.25,
-        "model": model_clusterization
+        "accuracy": trained.claster_accuracy+0.25,
+        "model": trained.model_claster
     }
+    if fingerprint is not None:
+        data_for_claster_table["fingerprint"] = fingerprint
     await db_connector_agent.insert_data("data_claster",
                                          data_for_claster_table)
     # Данные для вставки
     data_for_classif_table = {
-        "machine": str(db_connector_data.equipment),
-        "method_classif": str(name_model_classification),
+        "machine": machine,
+        "method_classif": str(trained.name_classif),
         "method_param": "Optuna",
-        "accuracy": model_accuracy+0.25,
-        "model": model_classification
+        "accuracy": trained.classif_accuracy+0.25,
+        "model": trained.model_classif
     }
+    if fingerprint is not None:
+        data_for_classif_table["fingerprint"] = fingerprint
     await db_connector_agent.insert_data("data_classif",
                                          data_for_classif_table)
+    # Отметка последней строки обучения для дообучения
+    if len(id_column):
+        await db_connector_agent.set_watermark(
+            machine, int(np.max(id_column)), task="learn")
     return True
 
 
-# Модуль выбора метода классификации
-def data_classification(
-        data_for_classification: List[Dict],
-        label_column: List[Dict],
-        rules_classification_file: str = "rules/classification_rules.json"
-) -> Tuple[str, str, float]:
-    """Выполняет классификацию данных
-    на основе заданных правил и
-    возвращает модель и ее точность.
-
-    Args:
-        data_for_classification: List[Dict].
-         Список словарей, содержащих данные для классификации.
-        label_column: List[Dict].
-        Список столбцов с метками для классификации.
-        rules_classification_file: str.
-        Путь к файлу с правилами классификации
-        (по умолчанию "rules/classification_rules.json").
-
-    Returns:
-        Tuple[str, str, float]. Кортеж, содержащий:
-            - str: Название использованного
-            алгоритма классификации.
-            - str: Модель классификации.
-            - float: Точность модели классификации.
-
-    Raises:
-        FileNotFoundError:
-        Если файл с правилами классификации не найден.
-        Exception:
-        Если произошла ошибка во время классификации.
-    """
-    # Извлечение данных из кортежа
-    labels = label_column
-    best_score = 0
-    # Обработка нужных данных перед классификацией
-    X = data_for_classification.to_numpy()
-    y = labels.to_numpy()
-    # Получение файла с правилами
-    try:
-        with open(rules_classification_file, "r") as f:
-            rules_classification = json.load(f)
-    except FileNotFoundError:
-        raise FileNotFoundError(f"Rules file not found")
-    except json.JSONDecodeError:
-        raise ValueError(f"Invalid JSON format"
-                         f" in rules file")
-    # Анализ данных
-    num_samples, num_features = data_for_classification.shape
-    dimensionality = "Low" \
-        if num_features < 10 else "High"
-    data_volume = "Small" \
-        if num_samples < 1000 else "Large"
-    # Определение линейности данных
-    linearity = \
-        classification_methods.determine_linearity(
-            X, y
-        )
-    # Определение баланса классов
-    unique, counts = np.unique(labels, return_counts=True)
-    class_balance_ratio = counts.min() / counts.max()
-    class_balance = "Balanced" \
-        if class_balance_ratio > 0.8 else "Imbalanced"
-    analysis_classification_results = {
-        "dimensionality": dimensionality,
-        "data_volume": data_volume,
-        "linearity": linearity,
-        "class_balance": class_balance,
-    }
-    # Выбор метода
-    algorithm_name = \
-        two_methods_included.method_selector_by_analysis(
-            analysis_classification_results, rules_classification
-        )
-    # Вызов алгоритма
-    with warnings.catch_warnings():
-        warnings.simplefilter("ignore",
-                              category=UserWarning)
-        warnings.simplefilter("ignore",
-                              category=RuntimeWarning)
-        if algorithm_name == "NaiveBayes":
-            print("\tВыбранный метод классификации"
-                  " - NaiveBayes")
-            param_grid = {
-                'var_smoothing': [1e-9, 1e-8, 1e-7,
-                                  1e-6, 1e-5]
-            }
-            result = \
-                two_methods_included.optimize_hyperparameters_classif(
-                    GaussianNB, param_grid,
-                    X, y, n_trials=100
-                )
-            if not result:
-                print("\tОптимизация не была выполнена, "
-                      "используем стандартные параметры.")
-                best_params = OrderedDict([('var_smoothing',
-                                            1e-9)])
-            else:
-                best_params, best_score = result
-            y_pred, model_classification, y_test = \
-                classification_methods.data_naiveb_classif(
-                    None, None, X, y, best_params
-                )
-        elif algorithm_name == "KNN":
-            print("\tВыбранный метод классификации"
-                  " - KNN")
-            param_grid = {
-                'n_neighbors': list(range(1, counts.max())),
-                'weights': ['uniform', 'distance'],
-                'metric': ['euclidean', 'manhattan',
-                           'minkowski']
-            }
-            result = \
-                two_methods_included.optimize_hyperparameters_classif(
-                    KNeighborsClassifier, param_grid,
-                    X, y, n_trials=100
-                )
-            if not result:
-                print("\tОптимизация не была выполнена, "
-                      "используем стандартные параметры.")
-                best_params = OrderedDict([('n_neighbors', 5),
-                                           ('weights', 'uniform'),
-                                           ('metric', 'minkowski')])
-            else:
-                best_params, best_score = result
-            # Классификация данным
-            y_pred, model_classification, y_test = \
-                classification_methods.data_knn_classif(
-                    None, None, X, y, best_params
-                )
-        elif algorithm_name == "SVM":
-            print("\tВыбранный метод классификации"
-                  " - SVM")
-            param_grid = {
-                'C': [0.1, 1, 10, 100],
-                'kernel': ['linear', 'poly',
-                           'rbf', 'sigmoid'],
-                'gamma': ['scale', 'auto']
-            }
-            result = \
-                two_methods_included.optimize_hyperparameters_classif(
-                    SVC, param_grid,
-                    X, y, n_trials=100
-                )
-            if not result:
-                print("\tОптимизация не была выполнена, "
-                      "используем стандартные параметры.")
-                best_params = OrderedDict([('C', 1),
-                                           ('kernel', 'rbf'),
-                                           ('gamma', 'scale')])
-            else:
-                best_params, best_score = result
-            # Классификация данным
-            y_pred, model_classification, y_test = \
-                classification_methods.data_svm_classif(
-                    None, None, X, y, best_params
-                )
-        elif algorithm_name == "LogisticRegression":
-            print("\tВыбранный метод классификации"
-                  " - LogisticRegression")
-            param_grid = {
-                'C': (1, 100),
-                'solver': ['newton-cg', 'lbfgs',
-                           'liblinear', 'sag',
-                           'saga'],
-                'max_iter': (100, 1000)
-            }
-            result = \
-                two_methods_included.optimize_hyperparameters_classif(
-                    LogisticRegression, param_grid,
-                    X, y, n_trials=100
-                )
-            if not result or None in result:
-                print("\tОптимизация не была выполнена, "
-                      "используем стандартные параметры.")
-                best_params = OrderedDict([('C', 1),
-                                           ('solver', 'lbfgs'),
-                                           ('max_iter', 100)])
-            else:
-                best_params, best_score = result
-            # Классификация данным
-            y_pred, model_classification, y_test = \
-                classification_methods.data_logregress_classif(
-                    None, None, X, y, best_params
-                )
-        elif algorithm_name == "DecisionTree":
-            print("\tВыбранный метод классификации"
-                  " - DecisionTree")
-            param_grid = {
-                'criterion': ['gini', 'entropy'],
-                'splitter': ['best', 'random'],
-                'max_depth': list(range(1, 21)),
-                'min_samples_split': [2, 5, 10],
-                'min_samples_leaf': [1, 2, 4]
-            }
-            result = \
-                two_methods_included.optimize_hyperparameters_classif(
-                    DecisionTreeClassifier, param_grid,
-                    X, y, n_trials=100
-                )
-            if not result:
-                print("\tОптимизация не была выполнена, "
-                      "используем стандартные параметры.")
-                best_params = OrderedDict(
-                    [('criterion', 'gini'),
-                     ('splitter', 'best'),
-                     ('max_depth', None),
-                     ('min_samples_split', 2),
-                     ('min_samples_leaf', 1)])
-            else:
-                best_params, best_score = result
-            # Классификация данным
-            y_pred, model_classification, y_test = \
-                classification_methods.data_dectree_classif(
-                    None, None, X, y, best_params
-                )
-        elif algorithm_name == "RandomForest":
-            print("\tВыбранный метод классификации"
-                  " - RandomForest")
-            param_grid = {
-                'n_estimators': [50, 100, 200],
-                'criterion': ['gini', 'entropy'],
-                'max_depth': list(range(1, 21)),
-                'min_samples_split': [2, 5, 10],
-                'min_samples_leaf': [1, 2, 4]
-            }
-            result = \
-                two_methods_included.optimize_hyperparameters_classif(
-                    RandomForestClassifier, param_grid,
-                    X, y, n_trials=100
-                )
-            if not result:
-                print("\tОптимизация не была выполнена, "
-                      "используем стандартные параметры.")
-                best_params = OrderedDict(
-                    [('n_estimators', 100),
-                     ('criterion', 'gini'),
-                     ('max_depth', None),
-                     ('min_samples_split', 2),
-                     ('min_samples_leaf', 1)])
-            else:
-                best_params, best_score = result
-            # Классификация данным
-            y_pred, model_classification, y_test = \
-                classification_methods.data_randforest_classif(
-                    None, None, X, y, best_params
-                )
-        elif algorithm_name == "GradientBoosting":
-            print("\tВыбранный метод классификации"
-                  " - GradientBoosting")
-            param_grid = {
-                'n_estimators': [50, 100, 200],
-                'learning_rate': [0.01, 0.1, 0.2],
-                'max_depth': list(range(1, 6)),
-                'min_samples_split': [2, 5, 10],
-                'min_samples_leaf': [1, 2, 4]
-            }
-            result = \
-                two_methods_included.optimize_hyperparameters_classif(
-                    GradientBoostingClassifier, param_grid,
-                    X, y, n_trials=100
-                )
-            if not result:
-                print("\tОптимизация не была выполнена, "
-                      "используем стандартные параметры.")
-                best_params = OrderedDict(
-                    [('n_estimators', 100),
-                     ('learning_rate', 0.1),
-                     ('max_depth', 3),
-                     ('min_samples_split', 2),
-                     ('min_samples_leaf', 1)])
-            else:
-                best_params, best_score = result
-            # Классификация данным
-            y_pred, model_classification, y_test = \
-                classification_methods.data_gradboost_classif(
-                    None, None, X, y, best_params
-                )
-        else:
-            raise ValueError(f"Ошибка выбора алгоритма.")
-    # Результаты классификации
-    precision = precision_score(y_test, y_pred, average='macro')
-    recall = recall_score(y_test, y_pred, average='macro')
-    accuracy = round(accuracy_score(y_test, y_pred), 2)
-    print(f"\tТочность модели {algorithm_name}: {accuracy}")
-    print(f"\tТочность модели precision {algorithm_name}: {precision}")
-    print(f"\tТочность модели recall {algorithm_name}: {recall}")
-    return algorithm_name, model_classification, accuracy
-
-
-# Модуль выбора метода кластеризации
-def data_clasterization(
-        data_for_clustering: List[Dict],
-        num_clusters: int,
-        rules_claster_file: str = "rules/clusterization_rules.json"
-) -> Tuple[List[Dict], str, str, float]:
-    """Выполняет кластеризацию данных и
-    возвращает результаты, название алгоритма,
-    модель и оценку качества кластеризации.
-
-    Args:
-        data_for_clustering: List[Dict].
-        Список словарей, содержащих данные для кластеризации.
-        num_clusters: int.
-        Количество кластеров, на которые нужно разделить данные.
-        rules_claster_file: str.
-        Путь к файлу с правилами кластеризации
-        (по умолчанию "rules/clusterization_rules.json").
-
-    Returns:
-        Tuple[List[Dict], str, str, float]. Кортеж, содержащий:
-            - List[Dict]: Список словарей
-            с метками кластеров для каждого элемента данных.
-            - str: Название использованного
-            алгоритма кластеризации.
-            - str: Модель кластеризации.
-            - float: Оценка качества кластеризации
-            (например, Silhouette score).
-
-    Raises:
-        FileNotFoundError:
-        Если файл с правилами кластеризации не найден.
-        ValueError:
-        Если количество кластеров недопустимо.
-        Exception:
-        Если произошла ошибка во время кластеризации.
-    """
-    # Получение файла с правилами
-    try:
-        with open(rules_claster_file, "r") as f:
-            rules_claster = json.load(f)
-    except FileNotFoundError:
-        raise FileNotFoundError(f"Rules file not found")
-    except json.JSONDecodeError:
-        raise ValueError(f"Invalid JSON format "
-                         f"in rules file")
-    # Анализ данных
-    best_score = 0
-    num_samples, num_features = data_for_clustering.shape
-    data_size = "Low" \
-        if num_samples < 100 \
-        else ("Average" if num_samples < 1000
-              else "High")
-    data_set = "Low" \
-        if num_features < 5 else "High"
-    num_clusters_status = "Known" \
-        if num_clusters != -1 else "Unknown"
-    # Статистический анализ
-    std = \
-        np.std(data_for_clustering, axis=0)
-    cv = \
-        np.mean(np.std(data_for_clustering, axis=0)
-                / np.mean(data_for_clustering, axis=0))
-    iqr = \
-        np.mean(stats.iqr(data_for_clustering, axis=0))
-    outliers_zscore = \
-        np.mean(np.abs(stats.zscore
-                       (data_for_clustering)) > 3)
-    # Определение уровня шума
-    noise = "Low" if cv < 0.5 and outliers_zscore < 0.05 \
-        else ("Medium"
-              if cv < 1.0 and outliers_zscore < 0.1
-              else "High")
-    analysis_claster_results = {
-        "data_size": data_size,
-        "data_set": data_set,
-        "num_clusters": num_clusters_status,
-        "noise": noise,
-    }
-    algorithm_name = \
-        two_methods_included.method_selector_by_analysis(
-            analysis_claster_results, rules_claster
-        )
-    print("METHOD:", algorithm_name)
-    # Выбор одного метода из множества
-    max_n_clusters = min(6, num_samples - 1)
-    # Вызов алгоритма по выбранному методу
-    with warnings.catch_warnings():
-        warnings.simplefilter("ignore",
-                              category=UserWarning)
-        warnings.simplefilter("ignore",
-                              category=RuntimeWarning)
-        if algorithm_name == "KMeans":
-            print("\tВыбранный метод кластеризации"
-                  " - KMeans")
-            # Определение лучших гиперпараметров
-            param_grid = {
-                'n_clusters': list(range(2, max_n_clusters-1)),
-                'init': ['k-means++', 'random'],
-                'max_iter': list(range(100, 301, 50))
-            }
-            result = \
-                two_methods_included.optimize_hyperparameters_claster(
-                    KMeans, param_grid,
-                    data_for_clustering, n_trials=100
-                )
-            # Если данных слишком мало
-            if not result:
-                print("\tОптимизация не была выполнена, "
-                      "используем стандартные параметры.")
-                best_params = OrderedDict([
-                    ('n_clusters', 3),
-                    ('init', 'k-means++'),
-                    ('max_iter', 300)])
-            else:
-                best_params, best_score = result
-            # Кластеризация данным
-            labels, model_clusterization = \
-                clusterization_methods.data_kmean_cluster(
-                    data_for_clustering, best_params
-                )
-        elif algorithm_name == "AgglomerativeClustering":
-            print("\tВыбранный метод кластеризации"
-                  " - AgglomerativeClustering")
-            # Определение лучших гиперпараметров
-            param_grid = {
-                'n_clusters': list(range(2,  max_n_clusters-1)),
-                'linkage': ['ward', 'complete', 'average']
-            }
-            result = \
-                two_methods_included.optimize_hyperparameters_claster(
-                    AgglomerativeClustering, param_grid,
-                    data_for_clustering, n_trials=100
-                )
-            # Если данных слишком мало
-            if not result:
-                print("\tОптимизация не была выполнена, "
-                      "используем стандартные параметры.")
-                best_params = OrderedDict([(
-                    'n_clusters', num_clusters),
-                    ('linkage', 'ward')])
-            else:
-                best_params, best_score = result
-            # Кластеризация данным
-            labels, model_clusterization = \
-                clusterization_methods.data_agglclust_cluster(
-                    data_for_clustering,
-                    best_params
-                )
-        elif algorithm_name == "SpectralClustering":
-            print("\tВыбранный метод кластеризации - SpectralClustering")
-            # Определение лучших гиперпараметров
-            result = \
-                two_methods_included.optimize_hyperparameters_claster(
-                    SpectralClustering, param_grid,
-                    data_for_clustering, n_trials=100
-                )
-            # Определение лучших гиперпараметров
-            param_grid = {
-                'n_clusters': list(range(2, max_n_clusters-1)),
-                'affinity': ['rbf', 'nearest_neighbors'],
-                'gamma': np.arange(0.1, 1.0, 0.1)
-            }
-            # Если данных слишком мало
-            if not result:
-                print("\tОптимизация не была выполнена, "
-                      "используем стандартные параметры.")
-                best_params = OrderedDict([('n_clusters', 3),
-                                           ('affinity', 'rbf'),
-                                           ('gamma', 0.5)])
-            else:
-                best_params, best_score = result
-            # Кластеризация данным
-            labels, model_clusterization = \
-                clusterization_methods.data_specclust_clust(
-                    data_for_clustering, best_params
-                )
-        elif algorithm_name == "DBSCAN":
-            print("\tВыбранный метод кластеризации - DBSCAN")
-            # Определение лучших гиперпараметров
-            param_grid = {
-                'eps': np.arange(0.1, 0.7, 0.1),
-                'min_samples': list(range(2,
-                                          max_n_clusters-1))
-            }
-            # Если данных слишком мало
-            result = \
-                two_methods_included.optimize_hyperparameters_claster(
-                    DBSCAN, param_grid,
-                    data_for_clustering, n_trials=100
-                )
-            if not result:
-                print("\tОптимизация не была выполнена, "
-                      "используем стандартные параметры.")
-                best_params = OrderedDict([('eps', 0.5),
-                                           ('min_samples', 5)])
-            else:
-                best_params, best_score = result
-            # Кластеризация данным
-            labels, model_clusterization = \
-                clusterization_methods.data_dbscan_cluster(
-                    data_for_clustering, best_params
-                )
-        elif algorithm_name == "AffinityPropagation":
-            print("\tВыбранный метод кластеризации"
-                  " - AffinityPropagation")
-            # Определение лучших гиперпараметров
-            param_grid = {
-                'damping': np.arange(0.5, 1.0, 0.1),
-                'preference': np.arange(-50, 50, 10)
-            }
-            result = two_methods_included.optimize_hyperparameters_claster(
-                AffinityPropagation, param_grid,
-                data_for_clustering, n_trials=100
-            )
-            # Если данных слишком мало
-            if not result:
-                print("\tОптимизация не была выполнена, "
-                      "используем стандартные параметры.")
-                best_params = OrderedDict([('damping', 0.5),
-                                           ('preference', -10)])
-            else:
-                best_params, best_score = result
-            # Кластеризация данным
-            labels, model_clusterization = \
-                clusterization_methods.data_affprop_cluster(
-                    data_for_clustering, best_params
-                )
-        else:
-            raise ValueError(f"Ошибка выбора алгоритма.")
-    best_score = round(best_score, 2)
-    print("\tЛучшая метрика силуэта:", best_score)
-
-    # Финальная оценка кластеризации
-    final_score = -1
-    try:
-        if len(set(labels)) > 1 and len(set(labels)) \
-                < len(data_for_clustering):
-            final_score = silhouette_score(data_for_clustering, labels)
-            final_score = round(final_score, 2)
-            print(f"\tФинальный Silhouette Score: {final_score}")
-        else:
-            print("\tНевозможно рассчитать финальный "
-                  "Silhouette Score: кластеров слишком мало "
-                  "или они одинаковы.")
-    except Exception as e:
-        print(f"\tОшибка при вычислении финальной метрики: {e}")
-
-    return labels, algorithm_name, model_clusterization, best_score
-
-
 # Модуль получения методов
 # классификации и кластеризации для задачи PREDICT
 async def data_predict_claster_classif_distribution(
         db_connector_data: DatabaseConnector,
-        db_connector_agent: DatabaseConnector,
-        data: List[Dict],
+        models: Dict[str, Dict],
+        data: Tuple,
         task_manager: str,
         label_limit: str,
-        str_limit: str
+        str_limit: str,
+        db_connector_agent: Optional[DatabaseConnector] = None,
+        save_predictions: bool = False
 ) -> List[Dict]:
     """Прогнозирует кластер и
     класс для каждого элемента данных,
@@ -728,15 +217,21 @@ async def data_predict_claster_classif_distribution(
     Args:
         db_connector_data: DatabaseConnector.
         Объект для подключения к базе данных с исходными данными.
-        db_connector_agent: DatabaseConnector.
-        Объект для подключения к базе данных агента, где хранятся модели.
-        data: List[Dict]. Список словарей,
-        содержащих данные для прогнозирования.
+        models: Dict[str, Dict]. Строки текущих моделей
+        из get_best_models ("data_claster" и "data_classif").
+        data: Tuple. Данные для прогнозирования,
+        собранные data_formater_chunks (признаки, -1, ID, время).
         task_manager: str. Идентификатор задачи
         прогнозирования.
         label_limit: str. Ограничение на количество
         используемых меток.
-        str_limit: str. Ограничение на длину строк в данных.
+        str_limit: str. Ограничение на диапазон ID строк.
+        Передается None, если диапазон уже применен в запросе.
+        db_connector_agent: Optional[DatabaseConnector].
+        Объект для подключения к базе данных агента,
+        нужен при save_predictions.
+        save_predictions: bool. Записать результаты
+        в таблицу предсказаний оборудования.
 
     Returns:
         List[Dict].
@@ -751,29 +246,13 @@ async def data_predict_claster_classif_distribution(
     """
     method_cluster = ""
     # Кластеризация
-    data_about_cluserization = \
-        await db_connector_agent.get_data_table_in_coloumn(
-            "data_claster", "machine",
-            db_connector_data.equipment_predict
-        )
-    # Выбор нужной строки, если выдается несколько
-    if len(data_about_cluserization) > 1:
-        # Сортировка данных по значению accuracy в порядке убывания
-        ssorted_data = sorted(data_about_cluserization,
-                              key=lambda item: (item['accuracy'],
-                                                item['id']), reverse=True)
-        data_about_cluserization = ssorted_data[0]
-    else:
-        data_about_cluserization = data_about_cluserization[0]
+    data_about_cluserization = models["data_claster"]
     # Десериализация модели
     print("Данные из таблицы для кластеризации:\n",
           data_about_cluserization)
-    method_cluster = data_about_cluserization["method_claster"]
+    method_cluster = data_about_cluserization["method"]
     model_cluster = data_about_cluserization["model"]
-    # Форматирование данных
-    data_for_clustering, num_clusters, id_column, time_col = \
-        two_methods_included.data_formater(data, task_manager,
-                                           "clasterization")
+    data_for_clustering, num_clusters, id_column, time_col = data
     # Выбор метода
     if method_cluster == "KMeans":
         labels_cluster = clusterization_methods.data_kmean_cluster(
@@ -795,6 +274,15 @@ async def data_predict_claster_classif_distribution(
         labels_cluster = clusterization_methods.data_affprop_cluster(
             data_for_clustering, None, model_cluster
         )
+    elif method_cluster == "MiniBatchKMeans":
+        labels_cluster = \
+            clusterization_methods.data_minibatch_kmeans_cluster(
+                data_for_clustering, None, model_cluster
+            )
+    elif method_cluster == "Birch":
+        labels_cluster = clusterization_methods.data_birch_cluster(
+            data_for_clustering, None, model_cluster
+        )
     else:
         raise ValueError(f"Ошибка выбора алгоритма. "
                          f"Полученный алгоритм: {method_cluster}")
@@ -804,24 +292,11 @@ async def data_predict_claster_classif_distribution(
             data_for_clustering, labels_cluster, "behind"
         )
     # Классификация
-    data_about_classification = \
-        await db_connector_agent.get_data_table_in_coloumn(
-            "data_classif", "machine",
-            db_connector_data.equipment_predict
-        )
-    # Выбор нужной строки, если выдается несколько
-    if len(data_about_classification) > 1:
-        # Сортировка данных по значению accuracy в порядке убывания
-        ssorted_data = sorted(data_about_classification,
-                              key=lambda item: (item['accuracy'],
-                                                item['id']), reverse=True)
-        data_about_classification = ssorted_data[0]
-    else:
-        data_about_classification = data_about_classification[0]
+    data_about_classification = models["data_classif"]
     print("Данные из таблицы для классификации:\n",
           data_about_classification)
     # Десериализация модели
-    method_classif = data_about_classification["method_classif"]
+    method_classif = data_about_classification["method"]
     model_classif = data_about_classification["model"]
     # Форматирование данных
     data_for_classification = two_methods_included.data_formater(
@@ -856,9 +331,24 @@ async def data_predict_claster_classif_distribution(
         y_pred = classification_methods.data_gradboost_classif(
             model_classif, data_for_classification
         )
+    elif method_classif == "SGD":
+        y_pred = classification_methods.data_sgd_classif(
+            model_classif, data_for_classification
+        )
     else:
         raise ValueError(f"Ошибка выбора алгоритма. "
                          f"Полученный алгоритм: {method_classif}")
+    # Запись результатов в таблицу предсказаний агента
+    if save_predictions and db_connector_agent is not None:
+        records = two_methods_included.build_prediction_records(
+            id_column, time_col, labels_cluster, y_pred,
+            data_about_classification["id"],
+            data_about_cluserization["id"]
+        )
+        saved = await db_connector_agent.copy_predictions(
+            db_connector_data.equipment_predict, records
+        )
+        print(f"\tСохранено предсказаний: {saved}")
     # Добавление результатов к данным
     classif_data_with_labels_without_id = \
         two_methods_included.concatenate_data_with_labels(
@@ -874,13 +364,13 @@ async def data_predict_claster_classif_distribution(
         )
     # Обработка ограничений
     print("\n[RESULT TASK]:")
-    if label_limit is not None:
+    if str_limit is not None:
         classif_data_with_labels = await \
             two_methods_included.processing_limit_str(
                 classif_data_with_labels,
                 str_limit
             )
-    if str_limit is not None:
+    if label_limit is not None:
         classif_data_with_labels = await \
             two_methods_included.processing_limit_label(
                 classif_data_with_labels,
@@ -889,6 +379,261 @@ async def data_predict_claster_classif_distribution(
     return classif_data_with_labels
 
 
+# Параллельное получение данных и моделей для задачи PREDICT
+async def fetch_predict_data_and_models(
+        db_connector_data: DatabaseConnector,
+        db_connector_agent: DatabaseConnector,
+        predict: str,
+        fetch_mode: Optional[str] = None,
+        id_range: Optional[Tuple[int, int]] = None,
+        time_range: Optional[Tuple[Optional[str], Optional[str]]] = None,
+        create_indexes: bool = False,
+        fallback: bool = True
+) -> Tuple[Tuple, Dict[str, Dict]]:
+    """Одновременно читает таблицу для предсказания из базы данных
+    и текущие модели оборудования из базы агента.
+    Диапазон ID и окно по времени применяются в запросе к таблице;
+    если в них нет строк и fallback включен, читается вся таблица.
+
+    Args:
+        db_connector_data: DatabaseConnector.
+        Объект для подключения к базе данных с исходными данными.
+        db_connector_agent: DatabaseConnector.
+        Объект для подключения к базе данных агента.
+        predict: str. Имя таблицы для предсказания.
+        fetch_mode: Optional[str]. Способ чтения таблицы
+        ("COPY" или потоковое чтение).
+        id_range: Optional[Tuple[int, int]]. Диапазон ID строк.
+        time_range: Optional[Tuple]. Границы окна по времени.
+        create_indexes: bool. Создать индексы для фильтров.
+        fallback: bool. Читать всю таблицу, если фильтр пуст.
+
+    Returns:
+        Tuple[Tuple, Dict[str, Dict]]. Данные из data_formater_chunks
+        и строки моделей из get_best_models.
+    """
+    if create_indexes:
+        await db_connector_data.ensure_filter_indexes(predict)
+    data, models = await asyncio.gather(
+        two_methods_included.data_formater_chunks(
+            db_connector_data.table_chunks(
+                predict, fetch_mode=fetch_mode,
+                id_range=id_range, time_range=time_range),
+            "PREDICT"),
+        db_connector_agent.get_best_models(predict)
+    )
+    if fallback and (id_range is not None or time_range is not None) \
+            and len(data[2]) == 0:
+        print("\tДиапазон не найден. Возвращаются все данные.")
+        data = await two_methods_included.data_formater_chunks(
+            db_connector_data.table_chunks(predict, fetch_mode=fetch_mode),
+            "PREDICT")
+    return data, models
+
+
+# Инкрементальное предсказание по отметке последней строки
+async def incremental_predict(
+        db_connector_data: DatabaseConnector,
+        db_connector_agent: DatabaseConnector,
+        predict: str,
+        result: Dict
+) -> Optional[List[List[Any]]]:
+    """Оценивает только строки, добавленные после прошлого вызова,
+    сохраняет их в таблицу предсказаний оборудования и возвращает
+    все сохраненные результаты вместе с новыми.
+
+    Отметка последней строки (watermark) хранится в базе агента.
+    Окно по времени в этом режиме не применяется, чтобы отметка
+    не пропускала строки; str_limit и label_limit применяются
+    к объединенному результату.
+
+    Args:
+        db_connector_data: DatabaseConnector.
+        Объект для подключения к базе данных с исходными данными.
+        db_connector_agent: DatabaseConnector.
+        Объект для подключения к базе данных агента.
+        predict: str. Имя таблицы для предсказания.
+        result: Dict. Входные данные задачи.
+
+    Returns:
+        Optional[List[List[Any]]]. Строки [id, ts, cluster, label]
+        или None, если у оборудования нет обученных моделей.
+    """
+    machine = db_connector_data.equipment_predict
+    last_id = await db_connector_agent.get_watermark(machine)
+    start_id = None if last_id is None else last_id + 1
+    data, models = await fetch_predict_data_and_models(
+        db_connector_data, db_connector_agent, predict,
+        result.get("fetch_mode"), id_range=(start_id, None),
+        create_indexes=bool(result.get("create_filter_indexes")),
+        fallback=False)
+    if None in models.values():
+        return None
+    id_column, time_col = data[2], data[3]
+    print(f"\tНовых строк для предсказания: {len(id_column)}")
+    if len(id_column):
+        await data_predict_claster_classif_distribution(
+            db_connector_data, models, data, "PREDICT",
+            None, None, db_connector_agent, save_predictions=True)
+        last = int(np.argmax(id_column))
+        last_ts = None
+        if time_col.ndim == 2 and time_col.shape[1] > 0:
+            last_ts = str(time_col[last, 0])
+        await db_connector_agent.set_watermark(
+            machine, int(id_column[last]), last_ts)
+    data_all = await db_connector_agent.get_predictions(machine)
+    if result.get("str_limit") is not None:
+        data_all = await two_methods_included.processing_limit_str(
+            data_all, result["str_limit"])
+    if result.get("label_limit") is not None:
+        data_all = await two_methods_included.processing_limit_label(
+            data_all, result["label_limit"])
+    return data_all
+
+
+# Проверка изменений таблицы обучения
+async def check_learn_fingerprint(
+        db_connector_data: DatabaseConnector,
+        db_connector_agent: DatabaseConnector,
+        result: Dict
+) -> Tuple[str, Optional[Dict[str, int]]]:
+    """Вычисляет отпечаток таблицы обучения и ищет модели
+    оборудования, обученные на тех же данных.
+
+    Args:
+        db_connector_data: DatabaseConnector.
+        Объект для подключения к базе данных с исходными данными.
+        db_connector_agent: DatabaseConnector.
+        Объект для подключения к базе данных агента.
+        result: Dict. Входные данные задачи; при force_retrain
+        поиск моделей не выполняется.
+
+    Returns:
+        Tuple[str, Optional[Dict[str, int]]]. Отпечаток и ID
+        найденных моделей (None, если нужно обучение).
+    """
+    fingerprint = await db_connector_data.table_fingerprint(
+        result["name_table_for_learn"])
+    if result.get("force_retrain"):
+        return fingerprint, None
+    models = await db_connector_agent.find_models_by_fingerprint(
+        str(db_connector_data.equipment), fingerprint)
+    if models is not None:
+        print("\tДанные не изменились с прошлого обучения. "
+              "Используются сохраненные модели:", models)
+    return fingerprint, models
+
+
+# Дообучение классификатора на новых строках таблицы обучения
+async def incremental_learn(
+        db_connector_data: DatabaseConnector,
+        db_connector_agent: DatabaseConnector,
+        result: Dict,
+        fingerprint: str
+) -> Optional[Dict[str, Any]]:
+    """Дообучает сохраненный классификатор оборудования через
+    partial_fit только на строках, добавленных после прошлого
+    обучения, и обновляет его строку в data_classif.
+
+    Модель кластеризации не переобучается: новые строки относятся
+    к ее кластерам. Отметка последней строки обучения хранится
+    в watermarks с задачей "learn".
+
+    Args:
+        db_connector_data: DatabaseConnector.
+        Объект для подключения к базе данных с исходными данными.
+        db_connector_agent: DatabaseConnector.
+        Объект для подключения к базе данных агента.
+        result: Dict. Входные данные задачи.
+        fingerprint: str. Отпечаток таблицы обучения.
+
+    Returns:
+        Optional[Dict[str, Any]]. Результат задачи или None, если
+        дообучение невозможно и нужно полное обучение (нет моделей
+        или отметки, модель не поддерживает partial_fit, в новых
+        строках есть неизвестные классы).
+    """
+    machine = str(db_connector_data.equipment)
+    last_id = await db_connector_agent.get_watermark(machine, task="learn")
+    models = await db_connector_agent.get_best_models(machine)
+    model_classif = models["data_classif"]
+    if last_id is None or None in models.values() \
+            or not classification_methods.supports_partial_fit(
+                model_classif["model"]):
+        print("\tДообучение недоступно, выполняется полное обучение.")
+        return None
+    data = await two_methods_included.data_formater_chunks(
+        db_connector_data.table_chunks(
+            result["name_table_for_learn"], with_labels=True,
+            fetch_mode=result.get("fetch_mode"),
+            id_range=(last_id + 1, None)),
+        "LEARN")
+    data_for_clustering, _, id_column, label_column = data
+    print(f"\tНовых строк для обучения: {len(id_column)}")
+    if not len(id_column):
+        return {"data": "Новых данных нет", "rows": 0}
+    labels_cluster = clusterization_methods.predict_clusters(
+        models["data_claster"]["model"], data_for_clustering)
+    data_for_classification = two_methods_included.data_formater(
+        two_methods_included.concatenate_data_with_labels(
+            data_for_clustering, labels_cluster, "behind"),
+        "LEARN", "classification")
+    try:
+        model, accuracy = classification_methods.partial_fit_classif(
+            model_classif["model"],
+            data_for_classification.to_numpy(),
+            label_column.to_numpy())
+    except ValueError as e:
+        print(f"\tДообучение невозможно ({e}), "
+              "выполняется полное обучение.")
+        return None
+    print(f"\tТочность модели на новых строках до дообучения: "
+          f"{round(accuracy, 2)}")
+    await db_connector_agent.update_model(
+        "data_classif", model_classif["id"], model_classif["machine"],
+        model, fingerprint, "Incremental")
+    await db_connector_agent.update_model(
+        "data_claster", models["data_claster"]["id"],
+        models["data_claster"]["machine"], fingerprint=fingerprint)
+    await db_connector_agent.set_watermark(
+        machine, int(np.max(id_column)), task="learn")
+    return {"data": "Модель дообучена", "rows": len(id_column),
+            "accuracy": round(accuracy, 2)}
+
+
+# Параметры фильтров PREDICT из входных данных задачи
+def predict_filters(result: Dict) -> Dict[str, Any]:
+    """Собирает аргументы фильтрации для fetch_predict_data_and_models
+    из полей time_from и time_to.
+
+    Диапазон str_limit в запрос не передается: строки с меткой
+    "Предел" возвращаются и вне диапазона, а метка известна только
+    после предсказания. Он применяется processing_limit_str."""
+    time_range = None
+    if result.get("time_from") or result.get("time_to"):
+        time_range = (result.get("time_from"), result.get("time_to"))
+    return {
+        "time_range": time_range,
+        "create_indexes": bool(result.get("create_filter_indexes")),
+    }
+
+
+# Формат времени в ответе
+def format_timestamp(value: Any) -> Any:
+    """Приводит время строки к виду ЧЧ:ММ:СС. Время из таблицы
+    предсказаний (инкрементальный режим) хранится текстом ISO
+    и разбирается, чтобы ответ не зависел от режима."""
+    if isinstance(value, str):
+        for parser in (datetime.fromisoformat, day_time.fromisoformat):
+            try:
+                value = parser(value)
+                break
+            except ValueError:
+                continue
+    return value.strftime('%H:%M:%S') if hasattr(value, 'strftime') \
+        else value
+
+
 # Подготовка вывода
 async def processing_result_by_task(
         db_connection: DatabaseConnector,
@@ -931,11 +676,7 @@ async def processing_result_by_task(
         df = pd.DataFrame(dataset)
         df = df.iloc[:, [0, 1, -1]]
         df.columns = ['ID', 'Timestamp', 'Label']
-        df['Timestamp'] = df['Timestamp'].apply(
-            lambda x: (
-                x.strftime('%H:%M:%S') if hasattr(x, 'strftime') else x
-            )
-        )
+        df['Timestamp'] = df['Timestamp'].apply(format_timestamp)
         # Выводим таблицу с учетом ограничения на количество строк
         if len(df) > 30:
             # Группируем строки с одинаковыми метками
@@ -996,118 +737,238 @@ async def task_processing(result: str, predict: str) -> Dict[str, str]:
                                            result["name_database_agent"],
                                            result["user"],
                                            result["password"])
-    conn_agent = await db_connector_agent.connect()
-    if conn_agent:
+    db_connector_data = None
+    try:
+        conn_agent = await db_connector_agent.connect()
+        if not conn_agent:
+            return data_to_return
         if result["task_manager"] == "DELETE":
             print("[RESULT TASK]:")
             data_to_return = await delete_task_processing(db_connector_agent)
             return data_to_return
-        else:
-            print("[INFO DATASETS]:")
-            # Подключение к БД и получение данных
-            db_connector_data = DatabaseConnector(
-                result["server"], result["port"],
-                result["name_database_data"], result["user"],
-                result["password"], result["name_table_for_learn"], predict)
-            conn_data = await db_connector_data.connect()
-            if conn_data and \
-                    await db_connector_data.check_table_exists(
-                        result["name_table_for_learn"]):
-                print("\tВсе необходимые датасеты обнаружены!")
-                print("\tСоздаем или находим"
-                      " таблицы для успешной работы агента.....")
-                # Программное создание нужных таблиц для работы агента
-                await \
-                    db_connector_agent.create_model_table(
-                        "data_classif", "method_classif")
-                await \
-                    db_connector_agent.create_model_table(
-                        "data_claster", "method_claster")
-                print("\tТаблицы созданы или были успешно найдены!")
-                print("\tТогда получим данные из таблиц о необходимом датчике")
-                if result["task_manager"] == "LEARN":
-                    data = \
-                        await db_connector_data.get_data_table(
-                            result["name_table_for_learn"])
-                    print("\tДанные для обучения получены!")
-                    # переход к алгоритму обучения
-                    print("\tАлгоритм обучения будет запущен....")
-                    print("\n[INFO PROCESSING]:")
-                    if await \
-                            data_learn_claster_classif_distribution(
-                                        data,
-                                        result["task_manager"],
-                                        db_connector_agent,
-                                        db_connector_data
-                                    ):
-                        # ВСТАВИТЬ ФУНКЦИЯ ОБРАБОТКИ ВЫВОДА
-                        data_to_return = \
-                            await processing_result_by_task(db_connector_data,
-                                                            data, "LEARN")
-                        await db_connector_agent.close()
-                        await db_connector_data.close()
-                        return data_to_return
-                if result["task_manager"] == "PREDICT":
-                    data = await db_connector_data.get_data_table(predict)
-                    print("\tДанные для предсказания получены!")
-                    if not await db_connector_agent.check_exists_in_table(
-                            "data_classif", predict
+        print("[INFO DATASETS]:")
+        # Подключение к БД и получение данных
+        db_connector_data = DatabaseConnector(
+            result["server"], result["port"],
+            result["name_database_data"], result["user"],
+            result["password"], result["name_table_for_learn"], predict)
+        conn_data = await db_connector_data.connect()
+        if not conn_data:
+            return data_to_return
+        # Проверка датасета и подготовка таблиц агента
+        # выполняются параллельно на разных соединениях
+        table_exists, _ = await asyncio.gather(
+            db_connector_data.check_table_exists(
+                result["name_table_for_learn"]),
+            db_connector_agent.bootstrap_agent_schema()
+        )
+        if not table_exists:
+            return data_to_return
+        print("\tВсе необходимые датасеты обнаружены!")
+        print("\tТаблицы агента созданы или были успешно найдены!")
+        print("\tТогда получим данные из таблиц о необходимом датчике")
+        if result["task_manager"] == "LEARN":
+            fingerprint, models = await check_learn_fingerprint(
+                db_connector_data, db_connector_agent, result)
+            if models is not None:
+                return {"data": "Модель актуальна", **models}
+            if result.get("incremental"):
+                data_to_return = await incremental_learn(
+                    db_connector_data, db_connector_agent, result,
+                    fingerprint)
+                if data_to_return is not None:
+                    return data_to_return
+            data = await two_methods_included.data_formater_chunks(
+                db_connector_data.table_chunks(
+                    result["name_table_for_learn"], with_labels=True,
+                    fetch_mode=result.get("fetch_mode")),
+                "LEARN")
+            print("\tДанные для обучения получены!")
+            # переход к алгоритму обучения
+            print("\tАлгоритм обучения будет запущен....")
+            print("\n[INFO PROCESSING]:")
+            if await \
+                    data_learn_claster_classif_distribution(
+                        data,
+                        result["task_manager"],
+                        db_connector_agent,
+                        db_connector_data,
+                        fingerprint
                     ):
-                        print("\n[ERROR DATASETS]:\nВы указали "
-                              "задачу обучения....")
-                        print("Но ваше оборудование "
-                              "не содержит обученную модель! "
-                              "Попробуйте другую задачу.\n")
-                        return False
+                # ВСТАВИТЬ ФУНКЦИЯ ОБРАБОТКИ ВЫВОДА
+                data_to_return = \
+                    await processing_result_by_task(db_connector_data,
+                                                    data, "LEARN")
+                return data_to_return
+        if result["task_manager"] == "PREDICT":
+            if result.get("incremental"):
+                data_all = await incremental_predict(
+                    db_connector_data, db_connector_agent, predict, result)
+            else:
+                data, models = await fetch_predict_data_and_models(
+                    db_connector_data, db_connector_agent, predict,
+                    result.get("fetch_mode"), **predict_filters(result))
+                print("\tДанные для предсказания получены!")
+                data_all = None
+                if None not in models.values():
                     # переход к алгоритму предсказания
                     print("\tАлгоритм предсказания будет запущен....")
-                    data_all = await data_predict_claster_classif_distribution(
+                    data_all = \
+                        await data_predict_claster_classif_distribution(
+                            db_connector_data,
+                            models,
+                            data,
+                            result["task_manager"],
+                            result["label_limit"],
+                            result["str_limit"],
+                            db_connector_agent,
+                            bool(result.get("save_predictions")))
+            if data_all is None:
+                print("\n[ERROR DATASETS]:\nВы указали "
+                      "задачу обучения....")
+                print("Но ваше оборудование "
+                      "не содержит обученную модель! "
+                      "Попробуйте другую задачу.\n")
+                return False
+            # ВСТАВИТЬ ФУНКЦИЯ ОБРАБОТКИ ВЫВОДА
+            data_to_return = \
+                await processing_result_by_task(db_connector_data,
+                                                data_all, "PREDICT")
+            return data_to_return
+        if result["task_manager"] == "LEARN AND PREDICT":
+            fingerprint, models = await check_learn_fingerprint(
+                db_connector_data, db_connector_agent, result)
+            trained = models is not None
+            if not trained:
+                data = await two_methods_included.data_formater_chunks(
+                    db_connector_data.table_chunks(
+                        result["name_table_for_learn"], with_labels=True,
+                        fetch_mode=result.get("fetch_mode")),
+                    "LEARN")
+                print("\tДанные для обучения и предсказания получены!")
+                # переход к алгоритму обучения и предсказания
+                print("\tАлгоритм обучения "
+                      "и предсказания будет запущен....")
+                print("\n[INFO PROCESSING]:")
+                trained = await data_learn_claster_classif_distribution(
+                    data, "LEARN", db_connector_agent,
+                    db_connector_data, fingerprint
+                )
+            if trained:
+                data, models = await fetch_predict_data_and_models(
+                    db_connector_data, db_connector_agent, predict,
+                    result.get("fetch_mode"), **predict_filters(result))
+                data_all = \
+                    await data_predict_claster_classif_distribution(
                         db_connector_data,
-                        db_connector_agent,
+                        models,
                         data,
-                        result["task_manager"],
+                        "PREDICT",
                         result["label_limit"],
-                        result["str_limit"])
-                    # ВСТАВИТЬ ФУНКЦИЯ ОБРАБОТКИ ВЫВОДА
-                    data_to_return = \
-                        await processing_result_by_task(db_connector_data,
-                                                        data_all, "PREDICT")
-                    await db_connector_agent.close()
-                    await db_connector_data.close()
-                    return data_to_return
-                if result["task_manager"] == "LEARN AND PREDICT":
-                    data = \
-                        await db_connector_data.get_data_table(
-                            result["name_table_for_learn"])
-                    print("\tДанные для обучения и предсказания получены!")
-                    # переход к алгоритму обучения и предсказания
-                    print("\tАлгоритм обучения "
-                          "и предсказания будет запущен....")
-                    print("\n[INFO PROCESSING]:")
-                    if await data_learn_claster_classif_distribution(
-                            data, "LEARN", db_connector_agent,
-                            db_connector_data
-                    ):
-                        data = await db_connector_data.get_data_table(predict)
-                        data_all = \
-                            await data_predict_claster_classif_distribution(
-                                db_connector_data,
-                                db_connector_agent,
-                                data,
-                                "PREDICT",
-                                result["label_limit"],
-                                result["str_limit"]
-                            )
-                        # функция обработки вывода
-                        data_to_return = \
-                            await processing_result_by_task(db_connector_data,
-                                                            data_all,
-                                                            "PREDICT")
-                        await db_connector_agent.close()
-                        await db_connector_data.close()
-                        return data_to_return
-                await db_connector_agent.close()
-                await db_connector_data.close()
+                        result["str_limit"],
+                        db_connector_agent,
+                        bool(result.get("save_predictions"))
+                    )
+                # функция обработки вывода
+                data_to_return = \
+                    await processing_result_by_task(db_connector_data,
+                                                    data_all,
+                                                    "PREDICT")
+                return data_to_return
+    finally:
+        # Возврат соединений в пул
+        await db_connector_agent.close()
+        if db_connector_data is not None:
+            await db_connector_data.close()
+
+
+# Обучение одного оборудования пакетной задачи
+async def batch_train_machine(
+        result: Dict,
+        table: str,
+        semaphore: asyncio.Semaphore
+) -> Dict[str, Any]:
+    """Выполняет LEARN для одной таблицы пакета и возвращает
+    ее статус и время обучения. Ошибка одной таблицы не прерывает
+    обучение остальных."""
+    async with semaphore:
+        started = time.perf_counter()
+        try:
+            data_to_return = await task_processing(
+                {**result, "name_table_for_learn": table}, None)
+            status = "done" if data_to_return else "error"
+            if not data_to_return:
+                data_to_return = {"detail": "Таблица не найдена "
+                                            "или обучение не выполнено"}
+        except Exception as e:
+            status, data_to_return = "error", {"detail": str(e)}
+        seconds = round(time.perf_counter() - started, 2)
+        print(f"\t{table}: {status} ({seconds} с)")
+        return {"machine": table, "status": status,
+                "seconds": seconds, **data_to_return}
+
+
+# Пакетное обучение нескольких единиц оборудования
+async def batch_train_processing(
+        result: Dict,
+        tables: List[str],
+        max_concurrency: Optional[int] = None
+) -> Dict[str, Any]:
+    """Обучает модели для списка таблиц оборудования.
+
+    Одновременно обрабатывается не больше max_concurrency таблиц
+    (по умолчанию - число процессов training_pool). Модели каждой
+    таблицы сохраняются в базе агента сразу после ее обучения.
+
+    Args:
+        result: Dict. Общие параметры подключения и обучения.
+        tables: List[str]. Таблицы обучения (по одной на оборудование).
+        max_concurrency: Optional[int]. Ограничение числа
+        одновременно обучаемых таблиц.
+
+    Returns:
+        Dict[str, Any]. Статусы и время обучения по каждой таблице
+        и общее время пакета.
+    """
+    started = time.perf_counter()
+    # Таблицы агента создаются один раз до запуска обучения,
+    # чтобы параллельные задачи не создавали их одновременно
+    db_connector_agent = DatabaseConnector(result["server"],
+                                           result["port"],
+                                           result["name_database_agent"],
+                                           result["user"],
+                                           result["password"])
+    try:
+        await db_connector_agent.connect()
+        await db_connector_agent.bootstrap_agent_schema()
+    finally:
+        await db_connector_agent.close()
+    semaphore = asyncio.Semaphore(
+        max(1, max_concurrency or training_pool.workers))
+    print("[BATCH LEARN]:")
+    statuses = await asyncio.gather(*[
+        batch_train_machine(result, table, semaphore)
+        for table in dict.fromkeys(tables)
+    ])
+    return {
+        "data": statuses,
+        "failed": sum(status["status"] == "error" for status in statuses),
+        "seconds": round(time.perf_counter() - started, 2),
+    }
+
+
+# Выполнение задачи целиком в процессе пула обучения
+def run_task_in_worker(result: Dict) -> Dict[str, str]:
+    """Выполняет task_processing в процессе training_pool в отдельном
+    цикле событий: чтение и разбор данных, профилирование и обучение
+    не занимают цикл событий сервера. Пулы соединений процесса
+    закрываются вместе с циклом событий."""
+    async def run_task() -> Dict[str, str]:
+        try:
+            return await task_processing(result, None)
+        finally:
+            await pool_registry.close_all()
+    return asyncio.run(run_task())
 
 
 # Функция принятия входных для задачи обучения и предсказания
@@ -1124,11 +985,17 @@ async def concatenate_strings(input: StringsInputServer):
         "name_table_for_predict": input.name_table_for_predict,
         "label_limit": input.label_limit,
         "str_limit": input.str_limit,
+        "time_from": input.time_from,
+        "time_to": input.time_to,
+        "create_filter_indexes": input.create_filter_indexes,
         "task_manager": input.task_manager,
+        "fetch_mode": input.fetch_mode,
+        "save_predictions": input.save_predictions,
+        "force_retrain": input.force_retrain,
     }
     try:
-        result_task = await task_processing(result,
-                                            result["name_table_for_predict"])
+        result_task = await task_processing(
+            result, result.get("name_table_for_predict"))
         if result_task:
             return result_task
         raise HTTPException(status_code=500,
@@ -1150,10 +1017,13 @@ async def concatenate_strings(input: StringsInputServer):
         "name_database_agent": input.name_database_agent,
         "name_table_for_learn": input.name_table_for_learn,
         "task_manager": input.task_manager,
+        "fetch_mode": input.fetch_mode,
+        "force_retrain": input.force_retrain,
+        "incremental": input.incremental,
     }
     try:
-        result_task = await task_processing(result,
-                                            result["name_table_for_predict"])
+        result_task = await task_processing(
+            result, result.get("name_table_for_predict"))
         if result_task:
             return result_task
         raise HTTPException(status_code=500,
@@ -1163,6 +1033,93 @@ async def concatenate_strings(input: StringsInputServer):
                             detail=f"Внутренняя ошибка сервера: {str(e)}")
 
 
+# Функция принятия входных для пакетного обучения
+@app.post("/task/train_batch")
+async def train_batch(input: BatchTrainInput):
+    result = {
+        "server": input.server,
+        "port": input.port,
+        "user": input.user,
+        "password": input.password,
+        "name_database_data": input.name_database_data,
+        "name_database_agent": input.name_database_agent,
+        "task_manager": "LEARN",
+        "fetch_mode": input.fetch_mode,
+        "force_retrain": input.force_retrain,
+        "incremental": input.incremental,
+    }
+    if not input.tables_for_learn:
+        raise HTTPException(status_code=400,
+                            detail="Список таблиц обучения пуст")
+    try:
+        return await batch_train_processing(
+            result, input.tables_for_learn, input.max_concurrency)
+    except Exception as e:
+        raise HTTPException(status_code=500,
+                            detail=f"Внутренняя ошибка сервера: {str(e)}")
+
+
+# Постановка задачи обучения в очередь
+@app.post("/task/jobs/train")
+async def submit_train_job(input: StringsInputServer):
+    result = {
+        "server": input.server,
+        "port": input.port,
+        "user": input.user,
+        "password": input.password,
+        "name_database_data": input.name_database_data,
+        "name_database_agent": input.name_database_agent,
+        "name_table_for_learn": input.name_table_for_learn,
+        "task_manager": "LEARN",
+        "fetch_mode": input.fetch_mode,
+        "force_retrain": input.force_retrain,
+        "incremental": input.incremental,
+    }
+    if not input.name_table_for_learn:
+        raise HTTPException(status_code=400,
+                            detail="Не указана таблица обучения")
+    job_id = job_queue.submit(training_pool.run, run_task_in_worker,
+                              result, kind="LEARN",
+                              machine=input.name_table_for_learn)
+    return job_queue.status(job_id)
+
+
+# Статус задачи из очереди
+@app.get("/task/jobs/{job_id}")
+async def job_status(job_id: str):
+    status = job_queue.status(job_id)
+    if status is None:
+        raise HTTPException(status_code=404,
+                            detail="Задача не найдена")
+    return status
+
+
+# Ход обучения задачи из очереди
+@app.get("/task/jobs/{job_id}/progress")
+async def job_progress(job_id: str):
+    progress = job_queue.progress(job_id)
+    if progress is None:
+        raise HTTPException(status_code=404,
+                            detail="Задача не найдена")
+    return progress
+
+
+# Результат задачи из очереди
+@app.get("/task/jobs/{job_id}/result")
+async def job_result(job_id: str):
+    job = job_queue.result(job_id)
+    if job is None:
+        raise HTTPException(status_code=404,
+                            detail="Задача не найдена")
+    if job["status"] in ("queued", "running"):
+        raise HTTPException(status_code=409,
+                            detail="Задача еще выполняется")
+    if job["status"] == "error":
+        raise HTTPException(status_code=500,
+                            detail=f"Ошибка задачи: {job['error']}")
+    return job["result"]
+
+
 # Функция принятия входных для задачи удаления
 @app.delete("/task/delete")
 async def concatenate_strings(input: StringsInputServer):
@@ -1175,8 +1132,8 @@ async def concatenate_strings(input: StringsInputServer):
         "task_manager": input.task_manager,
     }
     try:
-        result_task = await task_processing(result,
-                                            result["name_table_for_predict"])
+        result_task = await task_processing(
+            result, result.get("name_table_for_predict"))
         if result_task:
             return result_task
         raise HTTPException(status_code=500,
@@ -1197,13 +1154,21 @@ async def concatenate_strings(input: StringsInputServer):
         "name_database_data": input.name_database_data,
         "name_database_agent": input.name_database_agent,
         "name_table_for_learn": input.name_table_for_learn,
+        "name_table_for_predict": (input.name_table_for_predict
+                                   or input.name_table_for_learn),
         "label_limit": input.label_limit,
         "str_limit": input.str_limit,
+        "time_from": input.time_from,
+        "time_to": input.time_to,
+        "create_filter_indexes": input.create_filter_indexes,
         "task_manager": input.task_manager,
+        "fetch_mode": input.fetch_mode,
+        "save_predictions": input.save_predictions,
+        "incremental": input.incremental,
     }
     try:
-        result_task = await task_processing(result,
-                                            result["name_table_for_predict"])
+        result_task = await task_processing(
+            result, result.get("name_table_for_predict"))
         if result_task:
             return result_task
         raise HTTPException(status_code=500,
@@ -1213,12 +1178,90 @@ async def concatenate_strings(input: StringsInputServer):
                             detail=f"Внутренняя ошибка сервера: {str(e)}")
 
 
+# Назначение активной модели оборудования
+@app.post("/task/active_model")
+async def set_active_model(input: ActiveModelInput):
+    if input.model_table not in ("data_claster", "data_classif"):
+        raise HTTPException(status_code=400,
+                            detail="Неизвестная таблица моделей")
+    db_connector_agent = DatabaseConnector(input.server, input.port,
+                                           input.name_database_agent,
+                                           input.user, input.password)
+    try:
+        await db_connector_agent.connect()
+        await db_connector_agent.bootstrap_agent_schema()
+        found = await db_connector_agent.set_active_model(
+            input.model_table, input.machine, input.model_id)
+    finally:
+        await db_connector_agent.close()
+    if not found:
+        raise HTTPException(status_code=404,
+                            detail="Модель оборудования не найдена")
+    return {"data": "Активная модель назначена"}
+
+
+# Снятие назначения активной модели оборудования
+@app.delete("/task/active_model")
+async def clear_active_model(input: ActiveModelResetInput):
+    if input.model_table not in ("data_claster", "data_classif"):
+        raise HTTPException(status_code=400,
+                            detail="Неизвестная таблица моделей")
+    db_connector_agent = DatabaseConnector(input.server, input.port,
+                                           input.name_database_agent,
+                                           input.user, input.password)
+    try:
+        await db_connector_agent.connect()
+        await db_connector_agent.bootstrap_agent_schema()
+        found = await db_connector_agent.clear_active_model(
+            input.model_table, input.machine)
+    finally:
+        await db_connector_agent.close()
+    if not found:
+        raise HTTPException(status_code=404,
+                            detail="Активная модель не назначена")
+    return {"data": "Назначение активной модели снято"}
+
+
+# Статистика пулов соединений
+@app.get("/task/pool_stats")
+async def pool_stats():
+    return pool_registry.stats()
+
+
+# Статистика кэша моделей
+@app.get("/task/model_cache_stats")
+async def model_cache_stats():
+    return model_cache.stats()
+
+
+# Статистика пула процессов обучения
+@app.get("/task/training_pool_stats")
+async def training_pool_stats():
+    return training_pool.stats()
+
+
+# Статистика очереди задач обучения
+@app.get("/task/job_queue_stats")
+async def job_queue_stats():
+    return job_queue.stats()
+
+
+# Закрытие пулов соединений при остановке сервера
+@app.on_event("shutdown")
+async def close_pools():
+    await job_queue.shutdown()
+    await pool_registry.close_all()
+    training_pool.shutdown()
+
+
 # Запуск всех функций с API
 def run():
+    nest_asyncio.apply()
     # Запускаем сервер
     uvicorn.run(app, host="127.0.0.1", port=8000)
 
 
-# Основной блок
-nest_asyncio.apply()
-run()
+# Основной блок: процессы пула обучения импортируют этот модуль
+# заново, поэтому сервер запускается только при прямом запуске
+if __name__ == "__main__":
+    run()
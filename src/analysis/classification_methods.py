@@ -1,17 +1,19 @@
-import pickle
-from typing import Any, Optional
+import copy
+from typing import Any, Optional, Tuple
 import numpy as np
 
 from sklearn.ensemble import GradientBoostingClassifier, RandomForestClassifier
-from sklearn.linear_model import LogisticRegression
+from sklearn.linear_model import LogisticRegression, SGDClassifier
 from sklearn.metrics import accuracy_score
 from sklearn.model_selection import train_test_split
 from sklearn.naive_bayes import GaussianNB
 from sklearn.neighbors import KNeighborsClassifier
 from sklearn.preprocessing import StandardScaler
-from sklearn.svm import SVC
+from sklearn.svm import SVC, LinearSVC
 from sklearn.tree import DecisionTreeClassifier
 
+from src.analysis.model_cache import deserialize_model
+
 
 def determine_linearity(
         X: np.ndarray,
@@ -20,7 +22,8 @@ def determine_linearity(
 ) -> str:
     """Определяет, являются ли данные линейно разделимыми.
 
-    Используются логистическая регрессия и SVM с линейным ядром.
+    Используются логистическая регрессия и линейный SVM (LinearSVC,
+    время обучения линейно по числу строк).
 
     Args:
         X: numpy.ndarray. Массив признаков.
@@ -43,8 +46,8 @@ def determine_linearity(
     y_pred_log_reg = log_reg.predict(X_test)
     accuracy_log_reg = accuracy_score(y_test, y_pred_log_reg)
 
-    # SVM с линейным ядром
-    svm_linear = SVC(kernel='linear')
+    # Линейный SVM
+    svm_linear = LinearSVC()
     svm_linear.fit(X_train, y_train)
     y_pred_svm = svm_linear.predict(X_test)
     accuracy_svm = accuracy_score(y_test, y_pred_svm)
@@ -71,7 +74,7 @@ def data_naiveb_classif(
         y_pred = model_classif_naiveb.predict(X_test)
         return y_pred, model_classif_naiveb, y_test
 
-    loaded_model = pickle.loads(loaded_model)
+    loaded_model = deserialize_model(loaded_model)
     return loaded_model.predict(data)
 
 
@@ -92,7 +95,7 @@ def data_knn_classif(
         y_pred = model_classif_knn.predict(X_test)
         return y_pred, model_classif_knn, y_test
 
-    loaded_model = pickle.loads(loaded_model)
+    loaded_model = deserialize_model(loaded_model)
     return loaded_model.predict(data)
 
 
@@ -113,7 +116,7 @@ def data_svm_classif(
         y_pred = model_classif_svm.predict(X_test)
         return y_pred, model_classif_svm, y_test
 
-    loaded_model = pickle.loads(loaded_model)
+    loaded_model = deserialize_model(loaded_model)
     return loaded_model.predict(data)
 
 
@@ -134,7 +137,7 @@ def data_logregress_classif(
         y_pred = model_classif_loggr.predict(X_test)
         return y_pred, model_classif_loggr, y_test
 
-    loaded_model = pickle.loads(loaded_model)
+    loaded_model = deserialize_model(loaded_model)
     return loaded_model.predict(data)
 
 
@@ -155,7 +158,7 @@ def data_dectree_classif(
         y_pred = model_classif_tree.predict(X_test)
         return y_pred, model_classif_tree, y_test
 
-    loaded_model = pickle.loads(loaded_model)
+    loaded_model = deserialize_model(loaded_model)
     return loaded_model.predict(data)
 
 
@@ -176,7 +179,7 @@ def data_randforest_classif(
         y_pred = model_classif_forest.predict(X_test)
         return y_pred, model_classif_forest, y_test
 
-    loaded_model = pickle.loads(loaded_model)
+    loaded_model = deserialize_model(loaded_model)
     return loaded_model.predict(data)
 
 
@@ -197,5 +200,65 @@ def data_gradboost_classif(
         y_pred = model_classif_grand.predict(X_test)
         return y_pred, model_classif_grand, y_test
 
-    loaded_model = pickle.loads(loaded_model)
+    loaded_model = deserialize_model(loaded_model)
     return loaded_model.predict(data)
+
+
+def data_sgd_classif(
+        loaded_model: Optional[Any] = None,
+        data: Optional[Any] = None,
+        X: Optional[Any] = None,
+        y: Optional[Any] = None,
+        best_params: Optional[Any] = None
+) -> Any:
+    """Классификация с использованием SGDClassifier
+    (поддерживает дообучение через partial_fit)."""
+    if loaded_model is None:
+        X_train, X_test, y_train, y_test = train_test_split(
+            X, y, test_size=0.2, random_state=42
+        )
+        model_classif_sgd = SGDClassifier(**best_params)
+        model_classif_sgd.fit(X_train, y_train)
+        y_pred = model_classif_sgd.predict(X_test)
+        return y_pred, model_classif_sgd, y_test
+
+    loaded_model = deserialize_model(loaded_model)
+    return loaded_model.predict(data)
+
+
+def supports_partial_fit(loaded_model: Any) -> bool:
+    """Проверяет, можно ли дообучать модель на новых строках."""
+    return hasattr(deserialize_model(loaded_model), "partial_fit")
+
+
+def partial_fit_classif(
+        loaded_model: Any,
+        X: np.ndarray,
+        y: np.ndarray
+) -> Tuple[Any, float]:
+    """Дообучает классификатор только на новых строках.
+
+    Сначала модель проверяется на новых строках (точность
+    "проверка, затем обучение"), затем вызывается partial_fit
+    для копии модели: исходный объект может находиться в кэше.
+
+    Args:
+        loaded_model: Any. Обученная модель с методом partial_fit.
+        X: numpy.ndarray. Признаки новых строк.
+        y: numpy.ndarray. Метки новых строк.
+
+    Returns:
+        Tuple[Any, float]. Дообученная модель и точность исходной
+        модели на новых строках.
+
+    Raises:
+        ValueError: Если в новых строках есть классы, которых модель
+        не видела при обучении (нужно полное переобучение).
+    """
+    model = copy.deepcopy(deserialize_model(loaded_model))
+    unseen = set(np.unique(y)) - set(model.classes_)
+    if unseen:
+        raise ValueError(f"Новые классы в данных: {sorted(unseen)}")
+    accuracy = accuracy_score(y, model.predict(X))
+    model.partial_fit(X, y)
+    return model, float(accuracy)
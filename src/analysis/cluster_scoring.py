@@ -0,0 +1,183 @@
+from typing import Callable, Dict, NamedTuple, Optional
+
+import numpy as np
+from sklearn.metrics import (
+    calinski_harabasz_score,
+    davies_bouldin_score,
+    silhouette_score,
+)
+
+
+# До этого размера испытания оцениваются полным силуэтом
+FULL_SILHOUETTE_MAX_ROWS = 10000
+# До этого размера используется силуэт по стратифицированной выборке,
+# дальше - линейная метрика Calinski-Harabasz
+SAMPLED_SILHOUETTE_MAX_ROWS = 200000
+# До этого размера финальная модель оценивается полным силуэтом
+FINAL_FULL_SILHOUETTE_MAX_ROWS = 50000
+SILHOUETTE_SAMPLE_SIZE = 5000
+SILHOUETTE_REPEATS = 5
+
+
+class ClusterScore(NamedTuple):
+    """Оценка кластеризации: значение, способ расчета и границы
+    95% доверительного интервала (для выборочных оценок)."""
+    value: float
+    method: str
+    ci_low: Optional[float] = None
+    ci_high: Optional[float] = None
+
+
+def _is_degenerate(X: np.ndarray, labels: np.ndarray) -> bool:
+    """Метрики не определены для одного кластера и для случая,
+    когда каждая точка - отдельный кластер."""
+    n_labels = len(np.unique(labels))
+    return n_labels < 2 or n_labels >= len(X)
+
+
+def _with_ci(values: np.ndarray, method: str) -> ClusterScore:
+    """Среднее повторных оценок с нормальным 95% интервалом."""
+    mean = float(np.mean(values))
+    half = 1.96 * float(np.std(values, ddof=1)) / np.sqrt(len(values)) \
+        if len(values) > 1 else 0.0
+    return ClusterScore(mean, method, mean - half, mean + half)
+
+
+def stratified_sample(
+    labels: np.ndarray,
+    sample_size: int,
+    rng: np.random.Generator,
+) -> np.ndarray:
+    """Индексы выборки, в которой каждый кластер представлен
+    пропорционально размеру, но не менее чем двумя точками."""
+    indices = []
+    n = len(labels)
+    for label in np.unique(labels):
+        members = np.flatnonzero(labels == label)
+        size = max(2, int(round(sample_size * len(members) / n)))
+        size = min(size, len(members))
+        indices.append(rng.choice(members, size=size, replace=False))
+    return np.concatenate(indices)
+
+
+def silhouette_full(X: np.ndarray, labels: np.ndarray) -> ClusterScore:
+    """Полный силуэт, O(n^2)."""
+    return ClusterScore(float(silhouette_score(X, labels)), "silhouette")
+
+
+def silhouette_sampled(
+    X: np.ndarray,
+    labels: np.ndarray,
+    sample_size: int = SILHOUETTE_SAMPLE_SIZE,
+    n_repeats: int = SILHOUETTE_REPEATS,
+    random_state: int = 42,
+) -> ClusterScore:
+    """Силуэт по нескольким случайным выборкам с доверительным
+    интервалом."""
+    if len(X) <= sample_size:
+        return silhouette_full(X, labels)
+    values = []
+    for seed in range(random_state, random_state + n_repeats):
+        try:
+            values.append(silhouette_score(X, labels,
+                                           sample_size=sample_size,
+                                           random_state=seed))
+        except ValueError:
+            # В выборку попал один кластер
+            continue
+    if not values:
+        return ClusterScore(-1.0, "sampled_silhouette")
+    return _with_ci(np.array(values), "sampled_silhouette")
+
+
+def silhouette_stratified(
+    X: np.ndarray,
+    labels: np.ndarray,
+    sample_size: int = SILHOUETTE_SAMPLE_SIZE,
+    n_repeats: int = SILHOUETTE_REPEATS,
+    random_state: int = 42,
+) -> ClusterScore:
+    """Силуэт по стратифицированным выборкам: малые кластеры
+    не теряются при выборке."""
+    if len(X) <= sample_size:
+        return silhouette_full(X, labels)
+    rng = np.random.default_rng(random_state)
+    values = []
+    for _ in range(n_repeats):
+        idx = stratified_sample(labels, sample_size, rng)
+        values.append(silhouette_score(X[idx], labels[idx]))
+    return _with_ci(np.array(values), "stratified_silhouette")
+
+
+def calinski_harabasz_bounded(X: np.ndarray,
+                              labels: np.ndarray) -> ClusterScore:
+    """Calinski-Harabasz за O(n), отображенный в [0, 1): ch / (1 + ch)."""
+    ch = float(calinski_harabasz_score(X, labels))
+    return ClusterScore(ch / (1.0 + ch), "calinski_harabasz")
+
+
+def davies_bouldin_bounded(X: np.ndarray,
+                           labels: np.ndarray) -> ClusterScore:
+    """Davies-Bouldin за O(n), отображенный в (0, 1]: 1 / (1 + db),
+    чтобы большее значение означало лучшую кластеризацию."""
+    db = float(davies_bouldin_score(X, labels))
+    return ClusterScore(1.0 / (1.0 + db), "davies_bouldin")
+
+
+SCORERS: Dict[str, Callable[[np.ndarray, np.ndarray], ClusterScore]] = {
+    "silhouette": silhouette_full,
+    "sampled_silhouette": silhouette_sampled,
+    "stratified_silhouette": silhouette_stratified,
+    "calinski_harabasz": calinski_harabasz_bounded,
+    "davies_bouldin": davies_bouldin_bounded,
+}
+
+
+def select_scorer(n_rows: int) -> str:
+    """Выбирает метрику для испытаний по размеру данных."""
+    if n_rows <= FULL_SILHOUETTE_MAX_ROWS:
+        return "silhouette"
+    if n_rows <= SAMPLED_SILHOUETTE_MAX_ROWS:
+        return "stratified_silhouette"
+    return "calinski_harabasz"
+
+
+def score_clustering(
+    X: np.ndarray,
+    labels: np.ndarray,
+    method: Optional[str] = None,
+    distances: Optional[np.ndarray] = None,
+) -> ClusterScore:
+    """
+    Оценивает кластеризацию выбранной метрикой (по умолчанию -
+    по размеру данных). Для вырожденной разметки возвращает -1.
+    Полный силуэт использует готовую матрицу distances, если она есть.
+    """
+    method = method or select_scorer(len(X))
+    if method not in SCORERS:
+        raise ValueError(f"Неизвестная метрика кластеризации: {method}")
+    labels = np.asarray(labels)
+    if _is_degenerate(X, labels):
+        return ClusterScore(-1.0, method)
+    if method == "silhouette" and distances is not None:
+        score = ClusterScore(float(silhouette_score(
+            distances, labels, metric="precomputed")), method)
+    else:
+        score = SCORERS[method](X, labels)
+    if np.isnan(score.value):
+        return ClusterScore(-1.0, method)
+    return score
+
+
+def final_score(X: np.ndarray, labels: np.ndarray) -> ClusterScore:
+    """
+    Оценка выбранной модели: полный силуэт, если он выполним,
+    иначе стратифицированный силуэт по большей выборке.
+    """
+    labels = np.asarray(labels)
+    if _is_degenerate(X, labels):
+        return ClusterScore(-1.0, "silhouette")
+    if len(X) <= FINAL_FULL_SILHOUETTE_MAX_ROWS:
+        return silhouette_full(X, labels)
+    return silhouette_stratified(X, labels,
+                                 sample_size=FINAL_FULL_SILHOUETTE_MAX_ROWS)
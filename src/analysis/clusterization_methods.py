@@ -1,20 +1,136 @@
-import pickle
-from typing import Any, Optional
+import os
+import tempfile
+from typing import Any, Dict, Iterator, Optional, Type
 import numpy as np
+from joblib import Memory
 
 from sklearn.cluster import (
     AffinityPropagation,
     AgglomerativeClustering,
+    Birch,
     DBSCAN,
     KMeans,
+    MiniBatchKMeans,
     SpectralClustering,
 )
+from sklearn.neighbors import NearestNeighbors
+
+from src.analysis.distance_graph import precompute_distances
+from src.analysis.model_cache import deserialize_model
+
+
+# Размер блока строк для потокового обучения и предсказания
+STREAM_BATCH_ROWS = 10000
+# Число проходов MiniBatchKMeans по данным
+MINIBATCH_EPOCHS = 3
+# Параметры MiniBatchKMeans, общие для испытаний и итоговой модели
+MINIBATCH_PARAMS = {"n_init": 3, "random_state": 42}
+
+# Каталог кэша деревьев агломеративной кластеризации
+TREE_CACHE_DIR = os.path.join(tempfile.gettempdir(),
+                              "agglomerative_tree_cache")
+# Предельный размер кэша деревьев в байтах
+TREE_CACHE_BYTES = 1024 * 1024 * 1024
+
+
+def tree_memory() -> Memory:
+    """Кэш joblib для деревьев слияний AgglomerativeClustering
+    в каталоге AGGLOMERATIVE_CACHE_DIR (по умолчанию во временном
+    каталоге системы)."""
+    location = os.environ.get("AGGLOMERATIVE_CACHE_DIR", TREE_CACHE_DIR)
+    return Memory(location, verbose=0)
+
+
+def trim_tree_cache() -> None:
+    """Удаляет старые деревья, если кэш превысил TREE_CACHE_BYTES."""
+    tree_memory().reduce_size(bytes_limit=TREE_CACHE_BYTES)
+
+
+def search_model_params(model_class: Type[Any]) -> Dict[str, Any]:
+    """Дополнительные параметры модели при подборе гиперпараметров.
+    Для AgglomerativeClustering полное дерево строится один раз
+    на метод связи и кэшируется, а испытания только разрезают его
+    на n_clusters кластеров. MiniBatchKMeans в испытаниях
+    инициализируется так же, как итоговая модель."""
+    if model_class is AgglomerativeClustering:
+        return {"memory": tree_memory(), "compute_full_tree": True}
+    if model_class is MiniBatchKMeans:
+        return dict(MINIBATCH_PARAMS)
+    return {}
+
+
+class ClusterAssigner:
+    """Легкая структура для отнесения новых точек к кластерам
+    моделей без метода predict (DBSCAN, агломеративная и спектральная
+    кластеризация). Хранит опорные точки с их метками и индекс
+    ближайших соседей; точка получает метку ближайшей опорной точки,
+    а при заданном radius - метку шума, если она дальше radius."""
+
+    def __init__(
+        self,
+        points: np.ndarray,
+        labels: np.ndarray,
+        radius: Optional[float] = None,
+        params: Optional[dict] = None,
+        noise_label: int = -1,
+    ):
+        self.points = np.asarray(points, dtype=np.float64)
+        self.labels = np.asarray(labels)
+        self.radius = radius
+        self.params = params or {}
+        self.noise_label = noise_label
+        self.index = None
+        if len(self.points):
+            self.index = NearestNeighbors(n_neighbors=1).fit(self.points)
+
+    @classmethod
+    def from_centroids(cls, model: Any, data: np.ndarray,
+                       labels: np.ndarray) -> "ClusterAssigner":
+        """Строит структуру по центрам кластеров обучающих данных."""
+        cluster_ids = np.unique(labels)
+        centroids = np.array([
+            data[labels == cluster_id].mean(axis=0)
+            for cluster_id in cluster_ids
+        ])
+        params = {
+            key: value for key, value in model.get_params().items()
+            if key != "memory"
+        }
+        return cls(centroids, cluster_ids, params=params)
+
+    @classmethod
+    def from_dbscan(cls, model: DBSCAN) -> "ClusterAssigner":
+        """Строит структуру по ядровым точкам DBSCAN с радиусом eps."""
+        core_labels = model.labels_[model.core_sample_indices_]
+        return cls(model.components_, core_labels, radius=model.eps,
+                   params=model.get_params())
+
+    def predict(self, data: np.ndarray) -> np.ndarray:
+        """Возвращает метки кластеров для новых точек без переобучения."""
+        if self.index is None:
+            return np.full(len(data), self.noise_label)
+        distances, indices = self.index.kneighbors(data)
+        labels = self.labels[indices[:, 0]]
+        if self.radius is not None:
+            labels = np.where(distances[:, 0] <= self.radius,
+                              labels, self.noise_label)
+        return labels
+
+
+def predict_clusters(loaded_model: Any, data: np.ndarray) -> np.ndarray:
+    """Относит данные к кластерам сохраненной модели. Модели,
+    сохраненные до появления ClusterAssigner и не имеющие predict,
+    переобучаются на данных, как раньше."""
+    model = deserialize_model(loaded_model)
+    if hasattr(model, "predict"):
+        return model.predict(data)
+    return model.fit_predict(data)
 
 
 def data_kmean_cluster(
     data: np.ndarray,
     params: Optional[dict] = None,
-    loaded_model: Optional[bytes] = None,
+    loaded_model: Optional[Any] = None,
 ) -> Any:
     """Выполняет кластеризацию данных с
     использованием алгоритма K-средних (KMeans)."""
@@ -27,34 +143,45 @@ def data_kmean_cluster(
         )
         labels = model_cluster_kmeans.fit_predict(data)
         return labels, model_cluster_kmeans
-    loaded_model = pickle.loads(loaded_model)
-    loaded_model_cluster_kmeans = loaded_model.fit_predict(data)
-    return loaded_model_cluster_kmeans
+    return predict_clusters(loaded_model, data)
 
 
 def data_agglclust_cluster(
     data: np.ndarray,
     params: Optional[dict] = None,
-    loaded_model: Optional[bytes] = None,
+    loaded_model: Optional[Any] = None,
 ) -> Any:
     """Выполняет кластеризацию данных
-    с использованием агломеративной кластеризации."""
+    с использованием агломеративной кластеризации.
+
+    Модель обучается на тех же входных данных, что и при подборе
+    гиперпараметров (для связей, отличных от ward, - на матрице
+    расстояний), поэтому дерево слияний берется из кэша."""
     if loaded_model is None and params is not None:
+        fit_params = {"n_clusters": params["n_clusters"],
+                      "linkage": params["linkage"]}
+        data_fit = data
+        if fit_params["linkage"] != "ward":
+            precomputed = precompute_distances(AgglomerativeClustering,
+                                               fit_params, data)
+            fit_params, data_fit = precomputed.fit_input(
+                AgglomerativeClustering, fit_params, data)
         model_cluster_agg = AgglomerativeClustering(
-            n_clusters=params["n_clusters"],
-            linkage=params["linkage"],
+            **fit_params,
+            **search_model_params(AgglomerativeClustering),
+        )
+        labels = model_cluster_agg.fit_predict(data_fit)
+        trim_tree_cache()
+        return labels, ClusterAssigner.from_centroids(
+            model_cluster_agg, data, labels
         )
-        labels = model_cluster_agg.fit_predict(data)
-        return labels, model_cluster_agg
-    loaded_model = pickle.loads(loaded_model)
-    loaded_model_cluster_agg = loaded_model.fit_predict(data)
-    return loaded_model_cluster_agg
+    return predict_clusters(loaded_model, data)
 
 
 def data_specclust_clust(
     data: np.ndarray,
     params: Optional[dict] = None,
-    loaded_model: Optional[bytes] = None,
+    loaded_model: Optional[Any] = None,
 ) -> Any:
     """Выполняет кластеризацию данных
     с использованием спектральной кластеризации."""
@@ -66,16 +193,16 @@ def data_specclust_clust(
             random_state=42,
         )
         labels = model_cluster_spectral.fit_predict(data)
-        return labels, model_cluster_spectral
-    loaded_model = pickle.loads(loaded_model)
-    loaded_model_cluster_spectral = loaded_model.fit_predict(data)
-    return loaded_model_cluster_spectral
+        return labels, ClusterAssigner.from_centroids(
+            model_cluster_spectral, data, labels
+        )
+    return predict_clusters(loaded_model, data)
 
 
 def data_dbscan_cluster(
     data: np.ndarray,
     params: Optional[dict] = None,
-    loaded_model: Optional[bytes] = None,
+    loaded_model: Optional[Any] = None,
 ) -> Any:
     """Выполняет кластеризацию данных с использованием DBSCAN."""
     if loaded_model is None and params is not None:
@@ -84,16 +211,14 @@ def data_dbscan_cluster(
             min_samples=params["min_samples"],
         )
         labels = model_cluster_dbscan.fit_predict(data)
-        return labels, model_cluster_dbscan
-    loaded_model = pickle.loads(loaded_model)
-    loaded_model_cluster_dbscan = loaded_model.fit_predict(data)
-    return loaded_model_cluster_dbscan
+        return labels, ClusterAssigner.from_dbscan(model_cluster_dbscan)
+    return predict_clusters(loaded_model, data)
 
 
 def data_affprop_cluster(
     data: np.ndarray,
     params: Optional[dict] = None,
-    loaded_model: Optional[bytes] = None,
+    loaded_model: Optional[Any] = None,
 ) -> Any:
     """Выполняет кластеризацию данных с использованием Affinity Propagation."""
     if loaded_model is None and params is not None:
@@ -104,6 +229,70 @@ def data_affprop_cluster(
         )
         labels = model_cluster_affinity.fit_predict(data)
         return labels, model_cluster_affinity
-    loaded_model = pickle.loads(loaded_model)
-    loaded_model_cluster_affinity = loaded_model.fit_predict(data)
-    return loaded_model_cluster_affinity
+    return predict_clusters(loaded_model, data)
+
+
+def iter_batches(data: np.ndarray,
+                 batch_rows: int = STREAM_BATCH_ROWS) -> Iterator[np.ndarray]:
+    """Делит массив на блоки по batch_rows строк."""
+    for start in range(0, len(data), batch_rows):
+        yield data[start:start + batch_rows]
+
+
+def predict_batches(model: Any, data: np.ndarray,
+                    batch_rows: int = STREAM_BATCH_ROWS) -> np.ndarray:
+    """Предсказывает кластеры по блокам, не создавая больших
+    промежуточных матриц расстояний."""
+    if len(data) == 0:
+        return np.array([], dtype=int)
+    return np.concatenate([
+        model.predict(batch) for batch in iter_batches(data, batch_rows)
+    ])
+
+
+def data_minibatch_kmeans_cluster(
+    data: np.ndarray,
+    params: Optional[dict] = None,
+    loaded_model: Optional[Any] = None,
+    batch_rows: int = STREAM_BATCH_ROWS,
+) -> Any:
+    """Выполняет кластеризацию данных с использованием MiniBatchKMeans,
+    обучая модель через partial_fit по блокам из batch_size строк
+    (partial_fit не делит блок сам, поэтому подобранный batch_size
+    задает размер блока). batch_rows - размер блока предсказания."""
+    if loaded_model is None and params is not None:
+        model_cluster_minibatch = MiniBatchKMeans(
+            n_clusters=params["n_clusters"],
+            batch_size=params["batch_size"],
+            **MINIBATCH_PARAMS,
+        )
+        for _ in range(MINIBATCH_EPOCHS):
+            for batch in iter_batches(data, params["batch_size"]):
+                model_cluster_minibatch.partial_fit(batch)
+        labels = predict_batches(model_cluster_minibatch, data, batch_rows)
+        return labels, model_cluster_minibatch
+    return predict_batches(deserialize_model(loaded_model), data, batch_rows)
+
+
+def data_birch_cluster(
+    data: np.ndarray,
+    params: Optional[dict] = None,
+    loaded_model: Optional[Any] = None,
+    batch_rows: int = STREAM_BATCH_ROWS,
+) -> Any:
+    """Выполняет кластеризацию данных с использованием Birch: дерево
+    CF строится через partial_fit по блокам, глобальная кластеризация
+    подкластеров выполняется один раз в конце."""
+    if loaded_model is None and params is not None:
+        model_cluster_birch = Birch(
+            threshold=params["threshold"],
+            branching_factor=params["branching_factor"],
+            n_clusters=None,
+        )
+        for batch in iter_batches(data, batch_rows):
+            model_cluster_birch.partial_fit(batch)
+        model_cluster_birch.set_params(n_clusters=params["n_clusters"])
+        model_cluster_birch.partial_fit()
+        labels = predict_batches(model_cluster_birch, data, batch_rows)
+        return labels, model_cluster_birch
+    return predict_batches(deserialize_model(loaded_model), data, batch_rows)
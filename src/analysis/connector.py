@@ -1,9 +1,337 @@
 import asyncpg
+import hashlib
 import pickle
-from typing import Optional, Dict, Any, List
+import re
+import zlib
+from datetime import timezone
+from typing import Optional, Dict, Any, List, AsyncIterator, NamedTuple, \
+    Tuple, Union
 
+import numpy as np
 from fastapi import HTTPException
 
+from src.analysis.model_cache import deserialize_model, model_cache
+from src.analysis.pool_registry import pool_registry
+
+
+class TableLayout(NamedTuple):
+    """
+    Раскладка столбцов таблицы датчика по ролям.
+    """
+    id_column: str
+    time_columns: List[str]
+    feature_columns: List[str]
+    label_column: Optional[str]
+
+
+class TableChunk(NamedTuple):
+    """
+    Блок строк таблицы датчика в виде массивов NumPy.
+    """
+    ids: np.ndarray
+    times: np.ndarray
+    features: np.ndarray
+    labels: Optional[np.ndarray]
+
+
+def split_table_columns(
+    columns: List[str], with_labels: bool = False
+) -> TableLayout:
+    """
+    Делит столбцы таблицы по тем же правилам, что и data_formater:
+    первый столбец - ID, столбцы с 'time' в имени - время,
+    последний столбец - метка (только при with_labels),
+    остальные - признаки.
+    """
+    id_column = columns[0]
+    time_columns = [
+        col for col in columns if 'time' in col.lower() and col != id_column
+    ]
+    label_column = columns[-1] if with_labels else None
+    feature_columns = [
+        col for col in columns
+        if col != id_column and col not in time_columns
+        and col != label_column
+    ]
+    return TableLayout(id_column, time_columns, feature_columns,
+                       label_column)
+
+
+def records_to_chunk(
+    rows: List[asyncpg.Record], layout: TableLayout
+) -> TableChunk:
+    """
+    Переводит блок записей asyncpg в массивы NumPy без построения
+    промежуточных словарей.
+    """
+    columns = list(rows[0].keys())
+    id_index = columns.index(layout.id_column)
+    time_index = [columns.index(col) for col in layout.time_columns]
+    feature_index = [columns.index(col) for col in layout.feature_columns]
+
+    ids = np.array([row[id_index] for row in rows])
+    times = np.empty((len(rows), len(time_index)), dtype=object)
+    for j, index in enumerate(time_index):
+        times[:, j] = [row[index] for row in rows]
+    features = np.array(
+        [[row[index] for index in feature_index] for row in rows],
+        dtype=np.float64,
+    ).reshape(len(rows), len(feature_index))
+    labels = None
+    if layout.label_column is not None:
+        label_index = columns.index(layout.label_column)
+        labels = np.array([row[label_index] for row in rows], dtype=object)
+    return TableChunk(ids, times, features, labels)
+
+
+# Сигнатура и размер заголовка бинарного формата COPY
+COPY_SIGNATURE = b"PGCOPY\n\xff\r\n\x00"
+COPY_HEADER_SIZE = len(COPY_SIGNATURE) + 8
+# Типы, которые выгружаются в COPY как 8-байтовые целые
+COPY_ID_TYPES = ("int2", "int4", "int8")
+COPY_TIME_TYPES = ("timestamp", "timestamptz", "date", "time")
+PG_EPOCH = np.datetime64("2000-01-01T00:00:00", "us")
+# Типы столбцов, которые могут быть признаками для моделей
+FEATURE_TYPES = ("int2", "int4", "int8", "float4", "float8", "numeric")
+
+# Кэш схем таблиц: (server, port, database, schema, table) ->
+# (версия каталога, [(столбец, тип), ...])
+_table_schema_cache: Dict[Tuple, Tuple[str, List[Tuple[str, str]]]] = {}
+
+# Таблицы моделей агента и их столбец с названием метода
+AGENT_MODEL_TABLES = {
+    "data_classif": "method_classif",
+    "data_claster": "method_claster",
+}
+# Таблицы агента, которые очищает задача DELETE
+AGENT_RESET_TABLES = (*AGENT_MODEL_TABLES, "active_model", "model_blobs",
+                      "watermarks")
+# Схемы агента, для которых таблицы и индексы уже созданы в процессе:
+# (server, port, database, schema) -> множество таблиц
+_agent_schema_tables: Dict[Tuple, set] = {}
+# Таблицы, существование которых уже подтверждено в процессе
+_known_tables: set = set()
+# Размер части сжатой модели в таблице model_blobs
+MODEL_BLOB_CHUNK_SIZE = 1024 * 1024
+# Столбцы таблиц с результатами предсказаний
+PREDICTION_COLUMNS = ["id", "ts", "cluster", "label", "model_id",
+                      "cluster_model_id"]
+
+
+def project_table_columns(
+    columns: List[Tuple[str, str]], with_labels: bool = False
+) -> TableLayout:
+    """
+    Строит раскладку столбцов по схеме таблицы, оставляя среди
+    признаков только числовые столбцы.
+    """
+    types = dict(columns)
+    layout = split_table_columns([name for name, _ in columns], with_labels)
+    feature_columns = [
+        col for col in layout.feature_columns if types[col] in FEATURE_TYPES
+    ]
+    return layout._replace(feature_columns=feature_columns)
+
+
+def projected_columns(layout: TableLayout) -> List[str]:
+    """
+    Возвращает столбцы раскладки в порядке ID, время, признаки, метка.
+    """
+    columns = [layout.id_column, *layout.time_columns,
+               *layout.feature_columns]
+    if layout.label_column is not None:
+        columns.append(layout.label_column)
+    return columns
+
+
+def machine_prefix_pattern(machine_name: str) -> str:
+    """
+    Возвращает шаблон LIKE для поиска оборудования по префиксу имени.
+    """
+    escaped = machine_name.replace("\\", "\\\\") \
+        .replace("%", "\\%").replace("_", "\\_")
+    return f"{escaped}%"
+
+
+def best_model_id_sql(table_name: str, schema: str = "public") -> str:
+    """
+    Возвращает SQL-выражение с ID текущей модели оборудования:
+    указатель из active_model, затем лучшая модель по точному имени
+    ($1) и лучшая модель по префиксу имени ($2). Каждый шаг - один
+    проход по индексу (machine, accuracy DESC, id DESC). Указатель
+    на удаленную модель пропускается.
+    """
+    return (
+        "COALESCE("
+        f"(SELECT a.model_id FROM {schema}.active_model a "
+        f"JOIN {schema}.{table_name} m "
+        "ON m.id = a.model_id AND m.machine = a.machine "
+        f"WHERE a.machine = $1 AND a.model_table = '{table_name}'), "
+        f"(SELECT id FROM {schema}.{table_name} WHERE machine = $1 "
+        "ORDER BY accuracy DESC, id DESC LIMIT 1), "
+        f"(SELECT id FROM {schema}.{table_name} WHERE machine LIKE $2 "
+        "ORDER BY accuracy DESC, id DESC LIMIT 1))"
+    )
+
+
+def predictions_table_name(machine_name: str) -> str:
+    """
+    Возвращает имя таблицы с результатами предсказаний оборудования.
+    """
+    suffix = re.sub(r"[^a-z0-9_]", "_", machine_name.lower())
+    return f"predictions_{suffix}"[:63]
+
+
+def build_row_filter(
+    layout: TableLayout,
+    types: Dict[str, str],
+    id_range: Optional[Tuple[Optional[int], Optional[int]]] = None,
+    time_range: Optional[Tuple[Optional[str], Optional[str]]] = None,
+    first_param: int = 1,
+) -> Tuple[str, List[Any]]:
+    """
+    Строит условие WHERE по диапазону ID и окну по первому столбцу
+    времени. Любая граница может быть None (открытый диапазон).
+    Границы времени передаются строками и приводятся к типу
+    столбца на стороне сервера.
+
+    Returns:
+        Кортеж (" WHERE ..." или "", список параметров).
+    """
+    conditions, args = [], []
+    if id_range is not None:
+        for operator, bound in zip((">=", "<="), id_range):
+            if bound is None:
+                continue
+            conditions.append(
+                f"{quote_ident(layout.id_column)} {operator} "
+                f"${first_param + len(args)}"
+            )
+            args.append(int(bound))
+    if time_range is not None and layout.time_columns:
+        time_column = layout.time_columns[0]
+        time_type = types.get(time_column, "timestamp")
+        for operator, bound in zip((">=", "<="), time_range):
+            if bound is None:
+                continue
+            conditions.append(
+                f"{quote_ident(time_column)} {operator} "
+                f"(${first_param + len(args)}::text)::{time_type}"
+            )
+            args.append(str(bound))
+    if not conditions:
+        return "", args
+    return " WHERE " + " AND ".join(conditions), args
+
+
+def quote_ident(name: str) -> str:
+    """
+    Экранирует имя столбца для подстановки в SQL.
+    """
+    return '"' + name.replace('"', '""') + '"'
+
+
+def build_copy_columns(
+    layout: TableLayout, types: Dict[str, str]
+) -> List[str]:
+    """
+    Строит список выражений SELECT, в котором каждое поле имеет
+    фиксированную ширину 8 байт и не может быть NULL. Это позволяет
+    разобрать бинарный поток COPY одним вызовом np.frombuffer.
+    """
+    expressions = [f"{quote_ident(layout.id_column)}::int8"]
+    for col in layout.time_columns:
+        if types[col] == "time":
+            expressions.append(f"COALESCE({quote_ident(col)}, '00:00')")
+        elif types[col] == "timestamptz":
+            expressions.append(
+                f"COALESCE({quote_ident(col)} AT TIME ZONE 'UTC', "
+                "'-infinity')"
+            )
+        else:
+            expressions.append(
+                f"COALESCE({quote_ident(col)}::timestamp, '-infinity')"
+            )
+    for col in layout.feature_columns:
+        expressions.append(
+            f"COALESCE({quote_ident(col)}::float8, 'NaN')"
+        )
+    if layout.label_column is not None:
+        expressions.append(
+            f"COALESCE(array_position($1::text[], "
+            f"{quote_ident(layout.label_column)}::text), 0)::int8"
+        )
+    return expressions
+
+
+def decode_binary_copy(
+    buffer: Union[bytes, bytearray, memoryview],
+    layout: TableLayout,
+    types: Dict[str, str],
+    label_values: Optional[List[str]] = None,
+) -> TableChunk:
+    """
+    Разбирает поток COPY ... (FORMAT binary), полученный по запросу
+    из build_copy_columns, в заранее выделенные массивы столбцов.
+    Буфер читается без копирования. Значения timestamptz, как и при
+    чтении курсором asyncpg, возвращаются с часовым поясом UTC.
+    """
+    view = memoryview(buffer)
+    if bytes(view[:len(COPY_SIGNATURE)]) != COPY_SIGNATURE:
+        raise ValueError("Неверный заголовок бинарного потока COPY.")
+    extension_size = int.from_bytes(
+        view[COPY_HEADER_SIZE - 4:COPY_HEADER_SIZE], "big"
+    )
+    body_start = COPY_HEADER_SIZE + extension_size
+    # Последние 2 байта - признак конца потока (-1)
+    body = view[body_start:len(view) - 2]
+
+    num_fields = 1 + len(layout.time_columns) \
+        + len(layout.feature_columns) \
+        + (1 if layout.label_column is not None else 0)
+    fields = [("count", ">i2")]
+    for j in range(num_fields):
+        fields.append((f"len{j}", ">i4"))
+        fields.append((f"val{j}", ">i8"))
+    row_dtype = np.dtype(fields)
+    if len(body) % row_dtype.itemsize:
+        raise ValueError("Поток COPY содержит поля переменной длины.")
+    records = np.frombuffer(body, dtype=row_dtype)
+    num_rows = len(records)
+
+    ids = records["val0"].astype(np.int64)
+    times = np.empty((num_rows, len(layout.time_columns)), dtype=object)
+    for j, col in enumerate(layout.time_columns, start=1):
+        micros = records[f"val{j}"].astype(np.int64).view("timedelta64[us]")
+        if types[col] == "time":
+            # Время суток хранится как микросекунды от полуночи
+            times[:, j - 1] = [
+                value.time() for value in (PG_EPOCH + micros).astype(object)
+            ]
+        elif types[col] == "timestamptz":
+            # Выгружено как UTC без часового пояса (AT TIME ZONE 'UTC')
+            times[:, j - 1] = [
+                None if value is None
+                else value.replace(tzinfo=timezone.utc)
+                for value in (PG_EPOCH + micros).astype(object)
+            ]
+        else:
+            times[:, j - 1] = (PG_EPOCH + micros).astype(object)
+
+    offset = 1 + len(layout.time_columns)
+    features = np.empty((num_rows, len(layout.feature_columns)),
+                        dtype=np.float64)
+    for j in range(len(layout.feature_columns)):
+        features[:, j] = records[f"val{offset + j}"].view(">f8")
+
+    labels = None
+    if layout.label_column is not None:
+        codes = records[f"val{num_fields - 1}"].astype(np.int64)
+        categories = np.array([None] + list(label_values or []),
+                              dtype=object)
+        labels = categories[codes]
+    return TableChunk(ids, times, features, labels)
+
 
 class DatabaseConnector:
     """
@@ -20,6 +348,7 @@ class DatabaseConnector:
         password: str,
         equipment: Optional[str] = None,
         equipment_predict: Optional[str] = None,
+        use_pool: bool = True,
     ):
         """
         Инициализирует объект DatabaseConnector с параметрами подключения.
@@ -33,6 +362,8 @@ class DatabaseConnector:
             equipment: Опциональное название оборудования.
             equipment_predict: Опциональное название оборудования
                 для предсказания.
+            use_pool: Брать соединение из общего пула процесса
+                вместо открытия нового соединения.
         """
         self.server = server
         self.port = port
@@ -41,20 +372,33 @@ class DatabaseConnector:
         self.password = password
         self.equipment = equipment
         self.equipment_predict = equipment_predict
+        self.use_pool = use_pool
         self.conn: Optional[asyncpg.Connection] = None
+        self._pool: Optional[asyncpg.Pool] = None
 
     async def connect(self) -> asyncpg.Connection:
         """
         Устанавливает соединение с базой данных.
+
+        При use_pool=True соединение берется из общего пула процесса.
         """
         try:
-            self.conn = await asyncpg.connect(
-                user=self.user,
-                password=self.password,
-                database=self.database,
-                host=self.server,
-                port=self.port,
-            )
+            if self.use_pool:
+                self._pool, self.conn = await pool_registry.acquire(
+                    self.server,
+                    self.port,
+                    self.database,
+                    self.user,
+                    self.password,
+                )
+            else:
+                self.conn = await asyncpg.connect(
+                    user=self.user,
+                    password=self.password,
+                    database=self.database,
+                    host=self.server,
+                    port=self.port,
+                )
             return self.conn
         except asyncpg.PostgresError as e:
             raise HTTPException(
@@ -67,7 +411,14 @@ class DatabaseConnector:
     ) -> bool:
         """
         Проверяет существование таблицы в базе данных.
+
+        Найденные таблицы запоминаются на время жизни процесса,
+        отсутствующие проверяются при каждом вызове.
         """
+        key = (self.server, self.port, self.database, schema,
+               table_name.lower())
+        if key in _known_tables:
+            return True
         try:
             query = (
                 "SELECT EXISTS ("
@@ -76,6 +427,8 @@ class DatabaseConnector:
             )
             exists = await self.conn.fetchval(query, schema,
                                               table_name.lower())
+            if exists:
+                _known_tables.add(key)
             return exists
         except asyncpg.PostgresError as e:
             print(
@@ -87,6 +440,41 @@ class DatabaseConnector:
                 detail=f"Database connection error: {str(e)}",
             )
 
+    def _schema_key(self, schema: str) -> Tuple:
+        """
+        Возвращает ключ базы данных и схемы для кэшей процесса.
+        """
+        return self.server, self.port, self.database, schema
+
+    async def bootstrap_agent_schema(
+        self, schema: str = "public", force: bool = False
+    ) -> None:
+        """
+        Создает таблицы и индексы агента один раз за время жизни
+        процесса. Повторно выполняется только после forget_table,
+        то есть когда запрос обнаружил отсутствующую таблицу.
+        """
+        key = self._schema_key(schema)
+        if not force and key in _agent_schema_tables:
+            return
+        for table_name, column_name in AGENT_MODEL_TABLES.items():
+            await self.create_model_table(table_name, column_name, schema)
+        await self.create_active_model_table(schema)
+        await self.create_model_blob_table(schema)
+        await self.create_watermark_table(schema)
+        _agent_schema_tables[key] = {*AGENT_MODEL_TABLES, "active_model",
+                                     "model_blobs", "watermarks"}
+
+    def forget_table(self, table_name: str, schema: str = "public") -> None:
+        """
+        Сбрасывает сведения о существовании таблицы после ошибки
+        "таблица не найдена".
+        """
+        key = self._schema_key(schema)
+        _known_tables.discard((*key, table_name.lower()))
+        if table_name in _agent_schema_tables.get(key, ()):
+            del _agent_schema_tables[key]
+
     async def check_exists_in_table(
         self,
         table_name: str,
@@ -95,15 +483,23 @@ class DatabaseConnector:
     ) -> bool:
         """
         Проверяет наличие оборудования (machine) в таблице.
+
+        Имя оборудования сравнивается по префиксу, чтобы модели,
+        обученные на таблице вида '<machine>_learn', находились
+        по имени таблицы предсказания.
         """
         try:
             query = (
                 f"SELECT EXISTS (SELECT 1 FROM {schema}.{table_name} "
                 "WHERE machine LIKE $1);"
             )
-            exists = await self.conn.fetchval(query, f"%{machine_name}%")
+            exists = await self.conn.fetchval(
+                query, machine_prefix_pattern(machine_name)
+            )
             return exists
         except asyncpg.PostgresError as e:
+            if isinstance(e, asyncpg.UndefinedTableError):
+                self.forget_table(table_name, schema)
             print(
                 "Ошибка при проверке наличия machine. "
                 "Повторите попытку и/или введите правильные данные."
@@ -120,7 +516,10 @@ class DatabaseConnector:
         schema: str = "public",
     ) -> None:
         """
-        Создает таблицу для хранения моделей.
+        Создает таблицу для хранения моделей и индексы для поиска
+        лучшей модели оборудования. Новые модели хранятся в model_blobs,
+        а в таблице остается только ссылка model_ref; fingerprint -
+        отпечаток данных, на которых обучена модель.
         """
         try:
             create_table_query = f"""
@@ -132,6 +531,14 @@ class DatabaseConnector:
                 method_param VARCHAR(30),
                 accuracy REAL
             );
+            ALTER TABLE {schema}.{table_name}
+                ADD COLUMN IF NOT EXISTS model_ref VARCHAR(64);
+            ALTER TABLE {schema}.{table_name}
+                ADD COLUMN IF NOT EXISTS fingerprint VARCHAR(128);
+            CREATE INDEX IF NOT EXISTS {table_name}_machine_best_idx
+                ON {schema}.{table_name} (machine, accuracy DESC, id DESC);
+            CREATE INDEX IF NOT EXISTS {table_name}_machine_prefix_idx
+                ON {schema}.{table_name} (machine varchar_pattern_ops);
             """
             await self.conn.execute(create_table_query)
         except asyncpg.PostgresError as e:
@@ -144,6 +551,505 @@ class DatabaseConnector:
                 detail=f"Error creating table: {str(e)}",
             )
 
+    async def create_active_model_table(
+        self, schema: str = "public"
+    ) -> None:
+        """
+        Создает таблицу указателей на активную модель оборудования.
+        """
+        try:
+            await self.conn.execute(f"""
+            CREATE TABLE IF NOT EXISTS {schema}.active_model (
+                machine VARCHAR(30),
+                model_table VARCHAR(30),
+                model_id INTEGER,
+                PRIMARY KEY (machine, model_table)
+            );
+            """)
+        except asyncpg.PostgresError as e:
+            print(
+                "Таблица не может быть создана. Повторите попытку и/или "
+                "введите правильные данные."
+            )
+            raise HTTPException(
+                status_code=500,
+                detail=f"Error creating table: {str(e)}",
+            )
+
+    async def create_model_blob_table(
+        self, schema: str = "public"
+    ) -> None:
+        """
+        Создает хранилище сжатых моделей, адресуемых по хэшу.
+        """
+        try:
+            await self.conn.execute(f"""
+            CREATE TABLE IF NOT EXISTS {schema}.model_blobs (
+                hash VARCHAR(64),
+                chunk_no INTEGER,
+                data BYTEA,
+                PRIMARY KEY (hash, chunk_no)
+            );
+            """)
+        except asyncpg.PostgresError as e:
+            print(
+                "Таблица не может быть создана. Повторите попытку и/или "
+                "введите правильные данные."
+            )
+            raise HTTPException(
+                status_code=500,
+                detail=f"Error creating table: {str(e)}",
+            )
+
+    async def create_watermark_table(
+        self, schema: str = "public"
+    ) -> None:
+        """
+        Создает таблицу отметок последней обработанной строки
+        оборудования по задачам.
+        """
+        try:
+            await self.conn.execute(f"""
+            CREATE TABLE IF NOT EXISTS {schema}.watermarks (
+                machine VARCHAR(30),
+                task VARCHAR(30),
+                last_id BIGINT,
+                last_ts TEXT,
+                updated_at TIMESTAMP DEFAULT now(),
+                PRIMARY KEY (machine, task)
+            );
+            """)
+        except asyncpg.PostgresError as e:
+            print(
+                "Таблица не может быть создана. Повторите попытку и/или "
+                "введите правильные данные."
+            )
+            raise HTTPException(
+                status_code=500,
+                detail=f"Error creating table: {str(e)}",
+            )
+
+    async def store_model_blob(
+        self, blob: bytes, schema: str = "public"
+    ) -> str:
+        """
+        Сохраняет сериализованную модель в model_blobs и возвращает
+        ее хэш. Модель сжимается и делится на части; одинаковые модели
+        хранятся один раз.
+        """
+        model_hash = hashlib.sha256(blob).hexdigest()
+        try:
+            exists = await self.conn.fetchval(
+                f"SELECT EXISTS (SELECT 1 FROM {schema}.model_blobs "
+                "WHERE hash = $1);",
+                model_hash,
+            )
+            if exists:
+                return model_hash
+            compressed = zlib.compress(blob)
+            chunks = [
+                (model_hash, number, compressed[start:start
+                                                + MODEL_BLOB_CHUNK_SIZE])
+                for number, start in enumerate(
+                    range(0, len(compressed), MODEL_BLOB_CHUNK_SIZE)
+                )
+            ]
+            await self.conn.executemany(
+                f"INSERT INTO {schema}.model_blobs (hash, chunk_no, data) "
+                "VALUES ($1, $2, $3) ON CONFLICT DO NOTHING;",
+                chunks,
+            )
+            return model_hash
+        except asyncpg.PostgresError as e:
+            if isinstance(e, asyncpg.UndefinedTableError):
+                self.forget_table("model_blobs", schema)
+            print(f"Ошибка сохранения модели: {e}")
+            raise HTTPException(
+                status_code=500,
+                detail=f"Error storing model blob: {str(e)}",
+            )
+
+    async def load_model_blobs(
+        self, model_refs: List[str], schema: str = "public"
+    ) -> Dict[str, bytes]:
+        """
+        Загружает и распаковывает модели из model_blobs одним запросом.
+
+        Returns:
+            Словарь {хэш: сериализованная модель}.
+        """
+        try:
+            rows = await self.conn.fetch(
+                f"SELECT hash, data FROM {schema}.model_blobs "
+                "WHERE hash = ANY($1::varchar[]) ORDER BY hash, chunk_no;",
+                list(model_refs),
+            )
+            parts: Dict[str, List[bytes]] = {}
+            for row in rows:
+                parts.setdefault(row["hash"], []).append(row["data"])
+            return {
+                model_hash: zlib.decompress(b"".join(chunks))
+                for model_hash, chunks in parts.items()
+            }
+        except asyncpg.PostgresError as e:
+            if isinstance(e, asyncpg.UndefinedTableError):
+                self.forget_table("model_blobs", schema)
+            print(
+                "Ошибка при получении модели. Повторите попытку и/или "
+                "введите правильные данные."
+            )
+            raise HTTPException(
+                status_code=500,
+                detail=f"Error fetching model blob: {str(e)}",
+            )
+
+    def model_cache_key(self, table_name: str, model_id: int,
+                        model_ref: Optional[str] = None) -> Tuple:
+        """
+        Возвращает ключ модели в кэше десериализованных моделей.
+        Модели из model_blobs кэшируются по хэшу содержимого: ключ
+        меняется вместе с моделью, даже если строку обновил другой
+        процесс или ID строки выдан повторно.
+        """
+        return (self.server, self.port, self.database, table_name,
+                model_ref or model_id)
+
+    async def _resolve_models(
+        self, rows: List[Optional[Dict[str, Any]]], schema: str
+    ) -> None:
+        """
+        Подставляет в строки моделей готовый объект модели по ключу
+        "model". Модель берется из кэша процесса, а при промахе
+        загружается из model_blobs по ссылке model_ref (или из старого
+        столбца model) и десериализуется.
+        """
+        rows = [row for row in rows if row is not None]
+        # Модели из кэша подставляются до ожидания загрузки: за время
+        # await другой запрос может вытеснить их из кэша
+        missing = []
+        for row in rows:
+            model = model_cache.get(self.model_cache_key(
+                row["model_table"], row["id"], row.get("model_ref")))
+            if model is None:
+                missing.append(row)
+            else:
+                row["model"] = model
+        refs = [row["model_ref"] for row in missing if row.get("model_ref")]
+        blobs = await self.load_model_blobs(refs, schema) if refs else {}
+        for row in missing:
+            blob = blobs.get(row.get("model_ref"), row.get("model"))
+            if blob is None:
+                row["model"] = None
+                continue
+            row["model"] = deserialize_model(blob)
+            model_cache.put(
+                self.model_cache_key(row["model_table"], row["id"],
+                                     row.get("model_ref")),
+                row["model"], len(blob), row.get("machine")
+            )
+
+    async def set_active_model(
+        self,
+        table_name: str,
+        machine_name: str,
+        model_id: int,
+        schema: str = "public",
+    ) -> bool:
+        """
+        Назначает активную модель оборудования в таблице моделей.
+
+        Returns:
+            False, если модели с таким ID у оборудования нет.
+        """
+        try:
+            query = (
+                f"INSERT INTO {schema}.active_model "
+                "(machine, model_table, model_id) "
+                f"SELECT $1, $2, id FROM {schema}.{table_name} "
+                "WHERE id = $3 AND machine = $1 "
+                "ON CONFLICT (machine, model_table) "
+                "DO UPDATE SET model_id = EXCLUDED.model_id;"
+            )
+            status = await self.conn.execute(query, machine_name,
+                                             table_name, model_id)
+            return status.split()[-1] != "0"
+        except asyncpg.PostgresError as e:
+            if isinstance(e, asyncpg.UndefinedTableError):
+                self.forget_table("active_model", schema)
+                self.forget_table(table_name, schema)
+            print(f"Ошибка назначения активной модели: {e}")
+            raise HTTPException(
+                status_code=500,
+                detail=f"Error setting active model: {str(e)}",
+            )
+
+    async def clear_active_model(
+        self,
+        table_name: str,
+        machine_name: str,
+        schema: str = "public",
+    ) -> bool:
+        """
+        Снимает назначение активной модели оборудования: снова
+        используется лучшая модель по точности.
+
+        Returns:
+            False, если активная модель не была назначена.
+        """
+        try:
+            status = await self.conn.execute(
+                f"DELETE FROM {schema}.active_model "
+                "WHERE machine = $1 AND model_table = $2;",
+                machine_name, table_name
+            )
+            return status.split()[-1] != "0"
+        except asyncpg.PostgresError as e:
+            if isinstance(e, asyncpg.UndefinedTableError):
+                self.forget_table("active_model", schema)
+            print(f"Ошибка снятия активной модели: {e}")
+            raise HTTPException(
+                status_code=500,
+                detail=f"Error clearing active model: {str(e)}",
+            )
+
+    async def get_best_model(
+        self,
+        table_name: str,
+        machine_name: str,
+        schema: str = "public",
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Возвращает строку текущей модели оборудования с готовым
+        объектом модели по ключу "model".
+
+        Порядок выбора описан в best_model_id_sql.
+        """
+        try:
+            query = (
+                f"SELECT * FROM {schema}.{table_name} WHERE id = "
+                f"{best_model_id_sql(table_name, schema)};"
+            )
+            row = await self.conn.fetchrow(
+                query, machine_name, machine_prefix_pattern(machine_name)
+            )
+            model_row = dict(row) if row is not None else None
+        except asyncpg.PostgresError as e:
+            if isinstance(e, asyncpg.UndefinedTableError):
+                self.forget_table(table_name, schema)
+            print(
+                "Ошибка при получении модели. Повторите попытку и/или "
+                "введите правильные данные."
+            )
+            raise HTTPException(
+                status_code=500,
+                detail=f"Error fetching model from table: {str(e)}",
+            )
+        if model_row is not None:
+            model_row["model_table"] = table_name
+        await self._resolve_models([model_row], schema)
+        return model_row
+
+    async def get_best_models(
+        self, machine_name: str, schema: str = "public"
+    ) -> Dict[str, Optional[Dict[str, Any]]]:
+        """
+        Возвращает текущие модели кластеризации и классификации
+        оборудования одним запросом.
+
+        Returns:
+            Словарь {"data_claster": строка, "data_classif": строка};
+            значение None, если модель не найдена. Название метода
+            в строке доступно по ключу "method", готовый объект
+            модели - по ключу "model".
+        """
+        try:
+            parts = [
+                f"SELECT '{table_name}' AS model_table, id, machine, "
+                f"{column_name} AS method, model, model_ref, "
+                "method_param, accuracy "
+                f"FROM {schema}.{table_name} WHERE id = "
+                f"{best_model_id_sql(table_name, schema)}"
+                for table_name, column_name in AGENT_MODEL_TABLES.items()
+            ]
+            rows = await self.conn.fetch(
+                " UNION ALL ".join(parts) + ";",
+                machine_name, machine_prefix_pattern(machine_name)
+            )
+            models = {table_name: None for table_name in AGENT_MODEL_TABLES}
+            for row in rows:
+                models[row["model_table"]] = dict(row)
+        except asyncpg.PostgresError as e:
+            if isinstance(e, asyncpg.UndefinedTableError):
+                self.forget_table("data_claster", schema)
+            print(
+                "Ошибка при получении моделей. Повторите попытку и/или "
+                "введите правильные данные."
+            )
+            raise HTTPException(
+                status_code=500,
+                detail=f"Error fetching models from tables: {str(e)}",
+            )
+        await self._resolve_models(list(models.values()), schema)
+        return models
+
+    async def create_predictions_table(
+        self, machine_name: str, schema: str = "public"
+    ) -> str:
+        """
+        Создает таблицу результатов предсказаний оборудования
+        и возвращает ее имя.
+        """
+        table_name = predictions_table_name(machine_name)
+        key = (*self._schema_key(schema), table_name)
+        if key in _known_tables:
+            return table_name
+        try:
+            await self.conn.execute(f"""
+            CREATE TABLE IF NOT EXISTS {schema}.{table_name} (
+                id BIGINT,
+                ts TEXT,
+                cluster INTEGER,
+                label VARCHAR(30),
+                model_id INTEGER,
+                cluster_model_id INTEGER,
+                created_at TIMESTAMP DEFAULT now()
+            );
+            CREATE INDEX IF NOT EXISTS {table_name}_id_idx
+                ON {schema}.{table_name} (id);
+            """)
+            _known_tables.add(key)
+            return table_name
+        except asyncpg.PostgresError as e:
+            print(
+                "Таблица не может быть создана. Повторите попытку и/или "
+                "введите правильные данные."
+            )
+            raise HTTPException(
+                status_code=500,
+                detail=f"Error creating table: {str(e)}",
+            )
+
+    async def copy_predictions(
+        self,
+        machine_name: str,
+        records: List[Tuple],
+        batch_rows: int = 50000,
+        schema: str = "public",
+    ) -> int:
+        """
+        Записывает результаты предсказаний пакетами через COPY.
+
+        Args:
+            machine_name: Название оборудования.
+            records: Кортежи (id, ts, cluster, label, model_id,
+                cluster_model_id).
+            batch_rows: Число строк в одном COPY.
+            schema: Схема базы данных.
+
+        Returns:
+            Количество записанных строк.
+        """
+        table_name = await self.create_predictions_table(machine_name,
+                                                         schema)
+        try:
+            for start in range(0, len(records), batch_rows):
+                await self.conn.copy_records_to_table(
+                    table_name,
+                    records=records[start:start + batch_rows],
+                    columns=PREDICTION_COLUMNS,
+                    schema_name=schema,
+                )
+            return len(records)
+        except asyncpg.PostgresError as e:
+            if isinstance(e, asyncpg.UndefinedTableError):
+                self.forget_table(table_name, schema)
+            print(f"Ошибка записи предсказаний: {e}")
+            raise HTTPException(
+                status_code=500,
+                detail=f"Error copying predictions into table: {str(e)}",
+            )
+
+    async def get_watermark(
+        self, machine_name: str, task: str = "predict",
+        schema: str = "public"
+    ) -> Optional[int]:
+        """
+        Возвращает ID последней обработанной строки оборудования
+        или None, если задача еще не выполнялась.
+        """
+        try:
+            return await self.conn.fetchval(
+                f"SELECT last_id FROM {schema}.watermarks "
+                "WHERE machine = $1 AND task = $2;",
+                machine_name, task
+            )
+        except asyncpg.PostgresError as e:
+            if isinstance(e, asyncpg.UndefinedTableError):
+                self.forget_table("watermarks", schema)
+            print(f"Ошибка получения отметки: {e}")
+            raise HTTPException(
+                status_code=500,
+                detail=f"Error fetching watermark: {str(e)}",
+            )
+
+    async def set_watermark(
+        self,
+        machine_name: str,
+        last_id: int,
+        last_ts: Optional[str] = None,
+        task: str = "predict",
+        schema: str = "public",
+    ) -> None:
+        """
+        Сохраняет ID последней обработанной строки оборудования.
+        Отметка только растет.
+        """
+        try:
+            await self.conn.execute(
+                f"INSERT INTO {schema}.watermarks "
+                "(machine, task, last_id, last_ts) VALUES ($1, $2, $3, $4) "
+                "ON CONFLICT (machine, task) DO UPDATE SET "
+                "last_id = GREATEST(watermarks.last_id, EXCLUDED.last_id), "
+                "last_ts = CASE WHEN EXCLUDED.last_id >= watermarks.last_id "
+                "THEN EXCLUDED.last_ts ELSE watermarks.last_ts END, "
+                "updated_at = now();",
+                machine_name, task, int(last_id), last_ts
+            )
+        except asyncpg.PostgresError as e:
+            if isinstance(e, asyncpg.UndefinedTableError):
+                self.forget_table("watermarks", schema)
+            print(f"Ошибка сохранения отметки: {e}")
+            raise HTTPException(
+                status_code=500,
+                detail=f"Error saving watermark: {str(e)}",
+            )
+
+    async def get_predictions(
+        self, machine_name: str, schema: str = "public"
+    ) -> List[List[Any]]:
+        """
+        Возвращает сохраненные предсказания оборудования строками
+        [id, ts, cluster, label]. Для повторно оцененных ID берется
+        последний результат.
+        """
+        table_name = await self.create_predictions_table(machine_name,
+                                                         schema)
+        try:
+            rows = await self.conn.fetch(
+                f"SELECT DISTINCT ON (id) id, ts, cluster, label "
+                f"FROM {schema}.{table_name} "
+                "ORDER BY id, created_at DESC;"
+            )
+            return [list(row) for row in rows]
+        except asyncpg.PostgresError as e:
+            if isinstance(e, asyncpg.UndefinedTableError):
+                self.forget_table(table_name, schema)
+            print(f"Ошибка получения предсказаний: {e}")
+            raise HTTPException(
+                status_code=500,
+                detail=f"Error fetching predictions: {str(e)}",
+            )
+
     async def insert_data(
         self,
         table_name: str,
@@ -151,11 +1057,14 @@ class DatabaseConnector:
         schema: str = "public",
     ) -> None:
         """
-        Вставляет данные в таблицу.
+        Вставляет данные в таблицу. Модель из ключа "model" сохраняется
+        в model_blobs, а в строку записывается ссылка model_ref.
         """
         try:
             if "model" in data:
-                data["model"] = pickle.dumps(data["model"])
+                data["model_ref"] = await self.store_model_blob(
+                    pickle.dumps(data.pop("model")), schema
+                )
 
             columns = ", ".join(data.keys())
             placeholders = ", ".join([f"${i + 1}" for i in range(len(data))])
@@ -164,13 +1073,69 @@ class DatabaseConnector:
                 f"({columns}) VALUES ({placeholders});"
             )
             await self.conn.execute(query, *data.values())
+            if table_name in AGENT_MODEL_TABLES and "machine" in data:
+                # Старые модели оборудования больше не нужны в кэше
+                model_cache.invalidate_machine(
+                    (self.server, self.port, self.database),
+                    table_name, data["machine"]
+                )
         except asyncpg.PostgresError as e:
+            if isinstance(e, asyncpg.UndefinedTableError):
+                self.forget_table(table_name, schema)
             print(f"Ошибка вставки данных: {e}")
             raise HTTPException(
                 status_code=500,
                 detail=f"Error inserting data into table: {str(e)}",
             )
 
+    async def update_model(
+        self,
+        table_name: str,
+        model_id: int,
+        machine_name: str,
+        model: Optional[Any] = None,
+        fingerprint: Optional[str] = None,
+        method_param: Optional[str] = None,
+        schema: str = "public",
+    ) -> None:
+        """
+        Обновляет строку модели на месте: новая модель сохраняется
+        в model_blobs и заменяет ссылку model_ref, отпечаток
+        и method_param записываются, если переданы.
+        """
+        try:
+            values: Dict[str, Any] = {}
+            if model is not None:
+                values["model_ref"] = await self.store_model_blob(
+                    pickle.dumps(model), schema
+                )
+            if fingerprint is not None:
+                values["fingerprint"] = fingerprint
+            if method_param is not None:
+                values["method_param"] = method_param
+            if not values:
+                return
+            assignments = ", ".join(
+                f"{column} = ${i + 1}" for i, column in enumerate(values)
+            )
+            await self.conn.execute(
+                f"UPDATE {schema}.{table_name} SET {assignments} "
+                f"WHERE id = ${len(values) + 1};",
+                *values.values(), model_id
+            )
+            model_cache.invalidate_machine(
+                (self.server, self.port, self.database),
+                table_name, machine_name
+            )
+        except asyncpg.PostgresError as e:
+            if isinstance(e, asyncpg.UndefinedTableError):
+                self.forget_table(table_name, schema)
+            print(f"Ошибка обновления модели: {e}")
+            raise HTTPException(
+                status_code=500,
+                detail=f"Error updating model: {str(e)}",
+            )
+
     async def get_data_table(
         self, table_name: str, schema: str = "public"
     ) -> List[Dict[str, Any]]:
@@ -182,6 +1147,8 @@ class DatabaseConnector:
             rows = await self.conn.fetch(query)
             return [dict(row) for row in rows]
         except asyncpg.PostgresError as e:
+            if isinstance(e, asyncpg.UndefinedTableError):
+                self.forget_table(table_name, schema)
             print(
                 "Ошибка при получении данных. Повторите попытку и/или "
                 "введите правильные данные."
@@ -191,6 +1158,336 @@ class DatabaseConnector:
                 detail=f"Error fetching data from table: {str(e)}",
             )
 
+    async def get_table_schema(
+        self, table_name: str, schema: str = "public"
+    ) -> List[Tuple[str, str]]:
+        """
+        Возвращает столбцы таблицы и их типы. Схема кэшируется
+        и перечитывается только при изменении версии каталога таблицы.
+        """
+        try:
+            version_query = (
+                "SELECT c.xmin::text || ':' || string_agg("
+                "a.attnum::text || '.' || a.xmin::text, ',' "
+                "ORDER BY a.attnum) "
+                "FROM pg_catalog.pg_class c "
+                "JOIN pg_catalog.pg_namespace n ON n.oid = c.relnamespace "
+                "JOIN pg_catalog.pg_attribute a ON a.attrelid = c.oid "
+                "AND a.attnum > 0 AND NOT a.attisdropped "
+                "WHERE n.nspname = $1 AND c.relname = $2 "
+                "GROUP BY c.xmin"
+            )
+            version = await self.conn.fetchval(version_query, schema,
+                                               table_name.lower())
+            key = (self.server, self.port, self.database, schema,
+                   table_name.lower())
+            cached = _table_schema_cache.get(key)
+            if cached is not None and cached[0] == version:
+                return cached[1]
+            columns_query = (
+                "SELECT a.attname, t.typname "
+                "FROM pg_catalog.pg_attribute a "
+                "JOIN pg_catalog.pg_class c ON c.oid = a.attrelid "
+                "JOIN pg_catalog.pg_namespace n ON n.oid = c.relnamespace "
+                "JOIN pg_catalog.pg_type t ON t.oid = a.atttypid "
+                "WHERE n.nspname = $1 AND c.relname = $2 "
+                "AND a.attnum > 0 AND NOT a.attisdropped "
+                "ORDER BY a.attnum"
+            )
+            rows = await self.conn.fetch(columns_query, schema,
+                                         table_name.lower())
+            columns = [(row[0], row[1]) for row in rows]
+            _table_schema_cache[key] = (version, columns)
+            return columns
+        except asyncpg.PostgresError as e:
+            print(
+                "Ошибка при чтении схемы таблицы. Повторите попытку и/или "
+                "введите правильные данные."
+            )
+            raise HTTPException(
+                status_code=500,
+                detail=f"Error reading table schema: {str(e)}",
+            )
+
+    async def get_table_layout(
+        self,
+        table_name: str,
+        with_labels: bool = False,
+        schema: str = "public",
+    ) -> Tuple[TableLayout, Dict[str, str]]:
+        """
+        Возвращает раскладку столбцов таблицы и словарь их типов.
+        """
+        columns = await self.get_table_schema(table_name, schema)
+        if not columns:
+            raise HTTPException(
+                status_code=500,
+                detail=f"Table {schema}.{table_name} has no columns",
+            )
+        return project_table_columns(columns, with_labels), dict(columns)
+
+    async def table_fingerprint(
+        self,
+        table_name: str,
+        with_labels: bool = True,
+        schema: str = "public",
+    ) -> str:
+        """
+        Вычисляет на стороне сервера отпечаток таблицы: число строк,
+        максимальный ID и сумму хэшей строк по столбцам, которые
+        используются при обучении.
+        """
+        layout, _ = await self.get_table_layout(table_name, with_labels,
+                                                schema)
+        columns = ", ".join(
+            quote_ident(col) for col in projected_columns(layout)
+        )
+        id_column = quote_ident(layout.id_column)
+        query = (
+            f"SELECT count(*)::text || ':' "
+            f"|| coalesce(max({id_column})::text, '') || ':' "
+            f"|| coalesce(sum(hashtextextended(ROW({columns})::text, 0))"
+            f"::text, '0') "
+            f"FROM {schema}.{table_name};"
+        )
+        try:
+            return await self.conn.fetchval(query)
+        except asyncpg.PostgresError as e:
+            if isinstance(e, asyncpg.UndefinedTableError):
+                self.forget_table(table_name, schema)
+            print(f"Ошибка вычисления отпечатка таблицы: {e}")
+            raise HTTPException(
+                status_code=500,
+                detail=f"Error computing table fingerprint: {str(e)}",
+            )
+
+    async def find_models_by_fingerprint(
+        self, machine_name: str, fingerprint: str, schema: str = "public"
+    ) -> Optional[Dict[str, int]]:
+        """
+        Возвращает ID последних моделей кластеризации и классификации
+        оборудования, обученных на данных с тем же отпечатком,
+        или None, если хотя бы одной такой модели нет.
+        """
+        subqueries = ", ".join(
+            f"(SELECT id FROM {schema}.{table} WHERE machine = $1 "
+            f"AND fingerprint = $2 ORDER BY id DESC LIMIT 1) AS {table}"
+            for table in AGENT_MODEL_TABLES
+        )
+        try:
+            row = await self.conn.fetchrow(f"SELECT {subqueries};",
+                                           machine_name, fingerprint)
+        except asyncpg.PostgresError as e:
+            if isinstance(e, asyncpg.UndefinedTableError):
+                for table in AGENT_MODEL_TABLES:
+                    self.forget_table(table, schema)
+            print(f"Ошибка поиска моделей по отпечатку: {e}")
+            raise HTTPException(
+                status_code=500,
+                detail=f"Error fetching models by fingerprint: {str(e)}",
+            )
+        if row is None or None in (row[table] for table in
+                                   AGENT_MODEL_TABLES):
+            return None
+        return {table: row[table] for table in AGENT_MODEL_TABLES}
+
+    async def ensure_filter_indexes(
+        self, table_name: str, schema: str = "public"
+    ) -> None:
+        """
+        Создает индексы для фильтров PREDICT: btree по столбцу ID
+        и BRIN по первому столбцу времени.
+        """
+        layout, _ = await self.get_table_layout(table_name, False, schema)
+        queries = [
+            f"CREATE INDEX IF NOT EXISTS {table_name}_id_btree "
+            f"ON {schema}.{table_name} ({quote_ident(layout.id_column)});"
+        ]
+        if layout.time_columns:
+            queries.append(
+                f"CREATE INDEX IF NOT EXISTS {table_name}_time_brin "
+                f"ON {schema}.{table_name} USING brin "
+                f"({quote_ident(layout.time_columns[0])});"
+            )
+        try:
+            for query in queries:
+                await self.conn.execute(query)
+        except asyncpg.PostgresError as e:
+            print(f"Ошибка создания индексов: {e}")
+            raise HTTPException(
+                status_code=500,
+                detail=f"Error creating indexes: {str(e)}",
+            )
+
+    async def iter_table_chunks(
+        self,
+        table_name: str,
+        chunk_rows: int = 10000,
+        with_labels: bool = False,
+        schema: str = "public",
+        id_range: Optional[Tuple[Optional[int], Optional[int]]] = None,
+        time_range: Optional[Tuple[Optional[str], Optional[str]]] = None,
+    ) -> AsyncIterator[TableChunk]:
+        """
+        Потоково читает таблицу через серверный курсор и отдает блоки
+        по chunk_rows строк в виде массивов NumPy. Запрашиваются только
+        столбцы ID, времени, числовых признаков и метки; id_range
+        и time_range передаются в запрос как условие WHERE.
+        """
+        layout, types = await self.get_table_layout(table_name, with_labels,
+                                                    schema)
+        try:
+            columns = ", ".join(
+                quote_ident(col) for col in projected_columns(layout)
+            )
+            where, args = build_row_filter(layout, types, id_range,
+                                           time_range)
+            query = f"SELECT {columns} FROM {schema}.{table_name}{where}"
+            async with self.conn.transaction():
+                cursor = await self.conn.cursor(query, *args)
+                while True:
+                    rows = await cursor.fetch(chunk_rows)
+                    if not rows:
+                        break
+                    yield records_to_chunk(rows, layout)
+        except asyncpg.PostgresError as e:
+            if isinstance(e, asyncpg.UndefinedTableError):
+                self.forget_table(table_name, schema)
+            print(
+                "Ошибка при получении данных. Повторите попытку и/или "
+                "введите правильные данные."
+            )
+            raise HTTPException(
+                status_code=500,
+                detail=f"Error fetching data from table: {str(e)}",
+            )
+
+    async def export_table_binary(
+        self,
+        table_name: str,
+        with_labels: bool = False,
+        schema: str = "public",
+        id_range: Optional[Tuple[Optional[int], Optional[int]]] = None,
+        time_range: Optional[Tuple[Optional[str], Optional[str]]] = None,
+    ) -> TableChunk:
+        """
+        Выгружает таблицу через COPY ... TO STDOUT (FORMAT binary)
+        и разбирает поток сразу в массивы столбцов. Фильтры id_range
+        и time_range применяются на стороне сервера.
+
+        Если типы столбцов не позволяют выгрузить строки фиксированной
+        ширины, таблица читается через iter_table_chunks.
+        """
+        layout, types = await self.get_table_layout(table_name,
+                                                    with_labels, schema)
+        try:
+            if types[layout.id_column] not in COPY_ID_TYPES or any(
+                types[col] not in COPY_TIME_TYPES
+                for col in layout.time_columns
+            ):
+                print("\tТипы столбцов не поддерживают бинарную "
+                      "выгрузку. Используется потоковое чтение.")
+                return await self._collect_table_chunks(
+                    table_name, with_labels, schema, id_range, time_range
+                )
+
+            args = []
+            label_values = None
+            if layout.label_column is not None:
+                label = quote_ident(layout.label_column)
+                label_values = [
+                    row[0] for row in await self.conn.fetch(
+                        f"SELECT DISTINCT {label}::text "
+                        f"FROM {schema}.{table_name} "
+                        f"WHERE {label} IS NOT NULL ORDER BY 1"
+                    )
+                ]
+                args.append(label_values)
+            columns = ", ".join(build_copy_columns(layout, types))
+            where, filter_args = build_row_filter(
+                layout, types, id_range, time_range,
+                first_param=len(args) + 1
+            )
+            args.extend(filter_args)
+            query = f"SELECT {columns} FROM {schema}.{table_name}{where}"
+
+            buffer = bytearray()
+
+            async def write_buffer(data: bytes) -> None:
+                buffer.extend(data)
+
+            await self.conn.copy_from_query(
+                query, *args, output=write_buffer, format="binary"
+            )
+            # Массивы столбцов копируются из буфера при разборе,
+            # поэтому сам поток не дублируется
+            return decode_binary_copy(buffer, layout, types, label_values)
+        except asyncpg.PostgresError as e:
+            if isinstance(e, asyncpg.UndefinedTableError):
+                self.forget_table(table_name, schema)
+            print(
+                "Ошибка при выгрузке данных. Повторите попытку и/или "
+                "введите правильные данные."
+            )
+            raise HTTPException(
+                status_code=500,
+                detail=f"Error exporting data from table: {str(e)}",
+            )
+
+    async def _collect_table_chunks(
+        self,
+        table_name: str,
+        with_labels: bool,
+        schema: str,
+        id_range: Optional[Tuple[Optional[int], Optional[int]]] = None,
+        time_range: Optional[Tuple[Optional[str], Optional[str]]] = None,
+    ) -> TableChunk:
+        """
+        Читает таблицу через iter_table_chunks и склеивает блоки в один.
+        """
+        chunks = [
+            chunk async for chunk in self.iter_table_chunks(
+                table_name, with_labels=with_labels, schema=schema,
+                id_range=id_range, time_range=time_range
+            )
+        ]
+        if not chunks:
+            return TableChunk(np.array([]), np.empty((0, 0), dtype=object),
+                              np.empty((0, 0)),
+                              np.array([], dtype=object)
+                              if with_labels else None)
+        return TableChunk(
+            np.concatenate([chunk.ids for chunk in chunks]),
+            np.concatenate([chunk.times for chunk in chunks]),
+            np.concatenate([chunk.features for chunk in chunks]),
+            np.concatenate([chunk.labels for chunk in chunks])
+            if with_labels else None,
+        )
+
+    async def table_chunks(
+        self,
+        table_name: str,
+        with_labels: bool = False,
+        fetch_mode: Optional[str] = None,
+        schema: str = "public",
+        id_range: Optional[Tuple[Optional[int], Optional[int]]] = None,
+        time_range: Optional[Tuple[Optional[str], Optional[str]]] = None,
+    ) -> AsyncIterator[TableChunk]:
+        """
+        Отдает блоки таблицы выбранным способом:
+        "COPY" - бинарная выгрузка одним блоком,
+        иначе - потоковое чтение курсором.
+        """
+        if fetch_mode == "COPY":
+            yield await self.export_table_binary(
+                table_name, with_labels, schema, id_range, time_range
+            )
+            return
+        async for chunk in self.iter_table_chunks(
+                table_name, with_labels=with_labels, schema=schema,
+                id_range=id_range, time_range=time_range):
+            yield chunk
+
     async def get_data_table_in_coloumn(
         self,
         table_name: str,
@@ -209,6 +1506,8 @@ class DatabaseConnector:
             rows = await self.conn.fetch(query, f"%{machine_name}%")
             return [dict(row) for row in rows]
         except asyncpg.PostgresError as e:
+            if isinstance(e, asyncpg.UndefinedTableError):
+                self.forget_table(table_name, schema)
             print(
                 "Ошибка при получении данных. Повторите попытку и/или "
                 "введите правильные данные."
@@ -230,6 +1529,41 @@ class DatabaseConnector:
             )
             await self.conn.execute(query)
         except asyncpg.PostgresError as e:
+            if isinstance(e, asyncpg.UndefinedTableError):
+                self.forget_table(table_name, schema)
+            print(
+                "Удаление данных не может быть выполнено. "
+                "Повторите попытку и/или введите правильные данные."
+            )
+            raise HTTPException(
+                status_code=500,
+                detail=f"Error deleting data from table: {str(e)}",
+            )
+
+    async def clear_agent_tables(self, schema: str = "public") -> None:
+        """
+        Очищает таблицы агента и таблицы предсказаний оборудования
+        одной командой TRUNCATE: таблицы очищаются все вместе или ни
+        одна. Отсутствующие таблицы (база агента еще не
+        подготавливалась) предварительно создаются.
+        """
+        await self.bootstrap_agent_schema(schema)
+        try:
+            rows = await self.conn.fetch(
+                "SELECT tablename FROM pg_tables WHERE schemaname = $1 "
+                "AND tablename LIKE 'predictions\\_%';",
+                schema,
+            )
+            tables = ", ".join(
+                f"{schema}.{table_name}" for table_name in
+                [*AGENT_RESET_TABLES, *(row["tablename"] for row in rows)]
+            )
+            await self.conn.execute(
+                f"TRUNCATE TABLE {tables} RESTART IDENTITY;"
+            )
+        except asyncpg.PostgresError as e:
+            if isinstance(e, asyncpg.UndefinedTableError):
+                self.forget_table("data_claster", schema)
             print(
                 "Удаление данных не может быть выполнено. "
                 "Повторите попытку и/или введите правильные данные."
@@ -241,7 +1575,13 @@ class DatabaseConnector:
 
     async def close(self) -> None:
         """
-        Закрывает соединение с базой данных.
+        Закрывает соединение с базой данных
+        или возвращает его в пул.
         """
         if self.conn:
-            await self.conn.close()
+            if self._pool is not None:
+                await pool_registry.release(self._pool, self.conn)
+            else:
+                await self.conn.close()
+            self.conn = None
+            self._pool = None
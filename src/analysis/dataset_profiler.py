@@ -0,0 +1,175 @@
+import hashlib
+from collections import OrderedDict
+from typing import Hashable, NamedTuple, Optional
+
+import numpy as np
+
+from src.analysis import classification_methods
+from src.analysis.cluster_scoring import stratified_sample
+
+
+# Размер блока строк при проходе по данным
+PROFILE_CHUNK_ROWS = 100000
+# Размер равномерной выборки для IQR и выбросов по z-оценке
+PROFILE_SAMPLE_SIZE = 20000
+# Граница стратифицированной выборки для проверки линейности
+LINEARITY_MAX_SAMPLES = 5000
+# Число профилей, которые хранятся в кэше
+PROFILE_CACHE_SIZE = 32
+
+
+class DatasetProfile(NamedTuple):
+    """Статистики набора данных, по которым выбирается алгоритм."""
+    n_rows: int
+    n_features: int
+    mean: np.ndarray
+    std: np.ndarray
+    cv: float
+    iqr: float
+    outliers_zscore: float
+
+
+class RunningProfile:
+    """
+    Накопитель статистик по блокам строк за один проход: среднее
+    и дисперсия объединяются по формулам Чана, а для квантилей
+    и выбросов хранится равномерная выборка фиксированного размера
+    (строкам присваиваются случайные ключи, остаются наименьшие).
+    """
+
+    def __init__(self, sample_size: int = PROFILE_SAMPLE_SIZE,
+                 random_state: int = 42):
+        self.sample_size = sample_size
+        self.rng = np.random.default_rng(random_state)
+        self.count = 0
+        self.mean: Optional[np.ndarray] = None
+        self.m2: Optional[np.ndarray] = None
+        self.sample: Optional[np.ndarray] = None
+        self.sample_keys: Optional[np.ndarray] = None
+
+    def update(self, chunk: np.ndarray) -> None:
+        """Добавляет блок строк."""
+        chunk = np.asarray(chunk, dtype=np.float64)
+        n = len(chunk)
+        if n == 0:
+            return
+        chunk_mean = chunk.mean(axis=0)
+        chunk_m2 = ((chunk - chunk_mean) ** 2).sum(axis=0)
+        if self.count == 0:
+            self.mean, self.m2 = chunk_mean, chunk_m2
+        else:
+            total = self.count + n
+            delta = chunk_mean - self.mean
+            self.mean = self.mean + delta * n / total
+            self.m2 = self.m2 + chunk_m2 + delta ** 2 * self.count * n / total
+        self.count += n
+
+        keys = self.rng.random(n)
+        if self.sample is not None:
+            chunk = np.concatenate((self.sample, chunk))
+            keys = np.concatenate((self.sample_keys, keys))
+        if len(keys) > self.sample_size:
+            keep = np.argpartition(keys, self.sample_size)[:self.sample_size]
+            chunk, keys = chunk[keep], keys[keep]
+        self.sample, self.sample_keys = chunk, keys
+
+    def result(self) -> DatasetProfile:
+        """Возвращает профиль по накопленным данным."""
+        std = np.sqrt(self.m2 / self.count)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            cv = float(np.mean(std / self.mean))
+            z_scores = np.abs((self.sample - self.mean) / std)
+        q75, q25 = np.percentile(self.sample, [75, 25], axis=0)
+        return DatasetProfile(
+            n_rows=self.count,
+            n_features=len(self.mean),
+            mean=self.mean,
+            std=std,
+            cv=cv,
+            iqr=float(np.mean(q75 - q25)),
+            outliers_zscore=float(np.mean(z_scores > 3)),
+        )
+
+
+def data_hash(*arrays: np.ndarray) -> str:
+    """Хэш содержимого массивов для кэширования профилей."""
+    digest = hashlib.blake2b(digest_size=16)
+    for array in arrays:
+        array = np.ascontiguousarray(array)
+        digest.update(str((array.shape, array.dtype.str)).encode())
+        if array.dtype == object:
+            digest.update(repr(array.tolist()).encode())
+        else:
+            digest.update(array.view(np.uint8).reshape(-1))
+    return digest.hexdigest()
+
+
+class ProfileCache:
+    """Небольшой LRU-кэш результатов профилирования по хэшу данных."""
+
+    def __init__(self, max_entries: int = PROFILE_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Hashable, object]" = OrderedDict()
+
+    def get(self, key: Hashable) -> Optional[object]:
+        value = self._entries.get(key)
+        if value is not None:
+            self._entries.move_to_end(key)
+        return value
+
+    def put(self, key: Hashable, value: object) -> None:
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+
+# Общий для процесса кэш профилей
+profile_cache = ProfileCache()
+
+
+def profile_dataset(
+    X: np.ndarray,
+    chunk_rows: int = PROFILE_CHUNK_ROWS,
+    sample_size: int = PROFILE_SAMPLE_SIZE,
+) -> DatasetProfile:
+    """
+    Вычисляет std, CV, IQR и долю выбросов по z-оценке за один проход
+    по блокам. Для наборов не больше sample_size строк результат
+    совпадает с точным расчетом.
+    """
+    key = ("profile", data_hash(X), sample_size)
+    profile = profile_cache.get(key)
+    if profile is not None:
+        return profile
+    running = RunningProfile(sample_size)
+    for start in range(0, len(X), chunk_rows):
+        running.update(X[start:start + chunk_rows])
+    profile = running.result()
+    profile_cache.put(key, profile)
+    return profile
+
+
+def profile_linearity(
+    X: np.ndarray,
+    y: np.ndarray,
+    max_samples: int = LINEARITY_MAX_SAMPLES,
+) -> str:
+    """
+    Оценивает линейную разделимость на стратифицированной выборке
+    не больше max_samples строк. Результат кэшируется.
+    """
+    key = ("linearity", data_hash(X, y), max_samples)
+    linearity = profile_cache.get(key)
+    if linearity is not None:
+        return linearity
+    X, y = np.asarray(X), np.asarray(y)
+    if len(X) > max_samples:
+        idx = stratified_sample(y, max_samples, np.random.default_rng(42))
+        X, y = X[idx], y[idx]
+    linearity = classification_methods.determine_linearity(X, y)
+    profile_cache.put(key, linearity)
+    return linearity
@@ -0,0 +1,103 @@
+from typing import Any, Dict, Optional, Tuple, Type
+
+import numpy as np
+from sklearn.metrics import pairwise_distances
+from sklearn.neighbors import NearestNeighbors
+
+
+# До этого размера строится полная матрица расстояний (float64, n x n)
+PRECOMPUTED_DENSE_MAX_ROWS = 4000
+# Число соседей графа для SpectralClustering (как в sklearn)
+SPECTRAL_N_NEIGHBORS = 10
+
+
+def _grid_max(param_range: Any) -> float:
+    """Наибольшее значение диапазона или списка вариантов."""
+    return float(max(param_range))
+
+
+class PrecomputedDistances:
+    """
+    Расстояния, вычисленные один раз на исследование и общие для всех
+    испытаний: полная матрица (для небольших наборов), разреженный
+    граф соседей в радиусе (DBSCAN) и граф k ближайших соседей
+    (SpectralClustering с affinity='nearest_neighbors').
+    """
+
+    def __init__(
+        self,
+        dense: Optional[np.ndarray] = None,
+        radius_graph: Optional[Any] = None,
+        radius: Optional[float] = None,
+        knn_graph: Optional[Any] = None,
+    ):
+        self.dense = dense
+        self.radius_graph = radius_graph
+        self.radius = radius
+        self.knn_graph = knn_graph
+
+    def fit_input(
+        self,
+        model_class: Type[Any],
+        params: Dict[str, Any],
+        X: np.ndarray,
+    ) -> Tuple[Dict[str, Any], Any]:
+        """
+        Возвращает параметры модели и входные данные для fit:
+        при наличии подходящих расстояний модель получает
+        metric/affinity='precomputed', иначе - исходные X и params.
+        """
+        name = model_class.__name__
+        params = dict(params)
+        if name == "DBSCAN" and self.radius_graph is not None \
+                and params.get("eps", np.inf) <= self.radius:
+            return {**params, "metric": "precomputed"}, self.radius_graph
+        if name == "AgglomerativeClustering" and self.dense is not None \
+                and params.get("linkage", "ward") != "ward":
+            return {**params, "metric": "precomputed"}, self.dense
+        if name == "SpectralClustering":
+            affinity = params.get("affinity", "rbf")
+            if affinity == "nearest_neighbors" \
+                    and self.knn_graph is not None:
+                params.pop("gamma", None)
+                params["affinity"] = "precomputed_nearest_neighbors"
+                params.setdefault("n_neighbors", SPECTRAL_N_NEIGHBORS)
+                return params, self.knn_graph
+            if affinity == "rbf" and self.dense is not None:
+                gamma = params.pop("gamma", 1.0)
+                params["affinity"] = "precomputed"
+                return params, np.exp(-gamma * self.dense ** 2)
+        return params, X
+
+
+def precompute_distances(
+    model_class: Type[Any],
+    param_grid: Dict[str, Any],
+    X: np.ndarray,
+    dense_max_rows: int = PRECOMPUTED_DENSE_MAX_ROWS,
+) -> Optional[PrecomputedDistances]:
+    """
+    Строит расстояния, нужные испытаниям алгоритма, или возвращает
+    None, если алгоритму они не нужны.
+    """
+    name = model_class.__name__
+    if name not in ("DBSCAN", "AgglomerativeClustering",
+                    "SpectralClustering"):
+        return None
+    precomputed = PrecomputedDistances()
+    if len(X) <= dense_max_rows:
+        precomputed.dense = pairwise_distances(X)
+    if name == "DBSCAN" and "eps" in param_grid:
+        # Граф в наибольшем радиусе сетки подходит для любого eps
+        precomputed.radius = _grid_max(param_grid["eps"])
+        precomputed.radius_graph = NearestNeighbors(
+            radius=precomputed.radius
+        ).fit(X).radius_neighbors_graph(X, mode="distance",
+                                        sort_results=True)
+    if name == "SpectralClustering" \
+            and "nearest_neighbors" in param_grid.get("affinity", ()):
+        n_neighbors = min(SPECTRAL_N_NEIGHBORS, len(X))
+        precomputed.knn_graph = NearestNeighbors(
+            n_neighbors=n_neighbors
+        ).fit(X).kneighbors_graph(X, mode="distance")
+    return precomputed
@@ -0,0 +1,201 @@
+import asyncio
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from optuna.trial import TrialState
+
+from src.analysis.training_pool import current_progress, \
+    training_context, training_pool
+
+
+# Число завершенных задач, сведения о которых хранятся
+MAX_FINISHED_JOBS = 1000
+
+
+class JobProgress:
+    """
+    Наблюдатель за испытаниями Optuna задачи обучения.
+
+    Передается в процессы пула обучения (и в процессы подбора
+    гиперпараметров) и записывает число испытаний и лучшую оценку
+    текущего исследования в общий словарь менеджера процессов.
+    """
+
+    def __init__(self, store: Any, lock: Any, job_id: str):
+        self.store = store
+        self.lock = lock
+        self.job_id = job_id
+
+    def __call__(self, study: Any, trial: Any) -> None:
+        with self.lock:
+            progress = dict(self.store.get(self.job_id, {}))
+            if progress.get("study") != study.study_name:
+                # Началось следующее исследование (классификация
+                # после кластеризации)
+                progress.update(study=study.study_name, study_trials=0,
+                                best_value=None)
+            progress["trials_completed"] = \
+                progress.get("trials_completed", 0) + 1
+            progress["study_trials"] += 1
+            if trial.state == TrialState.COMPLETE and (
+                    progress["best_value"] is None
+                    or trial.value > progress["best_value"]):
+                progress["best_value"] = float(trial.value)
+            self.store[self.job_id] = progress
+
+
+class JobQueue:
+    """
+    Очередь фоновых задач обучения, общая для всего процесса.
+
+    Задача получает идентификатор сразу после постановки в очередь
+    и выполняется как задача asyncio. Чтобы не занимать цикл событий,
+    задача должна передавать работу в training_pool (задачи обучения
+    выполняются в процессе пула целиком). Одновременно выполняется
+    не больше max_running задач (по умолчанию - число процессов
+    пула), остальные ждут со статусом "queued".
+    """
+
+    def __init__(self, max_running: Optional[int] = None,
+                 max_finished: int = MAX_FINISHED_JOBS):
+        self.max_running = max_running
+        self.max_finished = max_finished
+        self._jobs: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._manager = None
+        self._progress = None
+        self._lock = None
+
+    def _progress_store(self) -> Any:
+        """
+        Возвращает общий для процессов словарь прогресса, запуская
+        менеджер процессов при первом обращении.
+        """
+        if self._manager is None:
+            self._manager = training_context().Manager()
+            self._progress = self._manager.dict()
+            self._lock = self._manager.Lock()
+        return self._progress
+
+    def submit(self, function: Callable[..., Awaitable[Any]],
+               *args: Any, kind: str = "LEARN",
+               machine: Optional[str] = None) -> str:
+        """
+        Ставит корутинную функцию в очередь и возвращает
+        идентификатор задачи.
+        """
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(
+                max(1, self.max_running or training_pool.workers))
+        self._progress_store()
+        job_id = uuid.uuid4().hex
+        self._jobs[job_id] = {
+            "job_id": job_id,
+            "kind": kind,
+            "machine": machine,
+            "status": "queued",
+            "created_at": time.time(),
+            "started_at": None,
+            "finished_at": None,
+            "result": None,
+            "error": None,
+        }
+        self._tasks[job_id] = asyncio.ensure_future(
+            self._run(job_id, function, args))
+        return job_id
+
+    async def _run(self, job_id: str,
+                   function: Callable[..., Awaitable[Any]],
+                   args: tuple) -> None:
+        job = self._jobs[job_id]
+        async with self._semaphore:
+            job["status"] = "running"
+            job["started_at"] = time.time()
+            current_progress.set(
+                JobProgress(self._progress, self._lock, job_id))
+            try:
+                job["result"] = await function(*args)
+                job["status"] = "done" if job["result"] else "error"
+                if not job["result"]:
+                    job["error"] = "Задача не вернула результат"
+            except Exception as e:
+                job["status"] = "error"
+                job["error"] = str(e)
+            finally:
+                job["finished_at"] = time.time()
+                self._tasks.pop(job_id, None)
+                self._forget_finished()
+
+    def _forget_finished(self) -> None:
+        """Удаляет сведения о самых старых завершенных задачах."""
+        finished = [job_id for job_id, job in self._jobs.items()
+                    if job["finished_at"] is not None]
+        for job_id in finished[:max(0, len(finished) - self.max_finished)]:
+            del self._jobs[job_id]
+            self._progress.pop(job_id, None)
+
+    def status(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Возвращает статус задачи без результата или None, если
+        задача неизвестна.
+        """
+        job = self._jobs.get(job_id)
+        if job is None:
+            return None
+        status = {key: value for key, value in job.items()
+                  if key != "result"}
+        finished = job["finished_at"] or time.time()
+        status["seconds"] = round(
+            finished - (job["started_at"] or finished), 2)
+        return status
+
+    def progress(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Возвращает ход обучения задачи: число выполненных испытаний,
+        текущее исследование и лучшую оценку в нем.
+        """
+        job = self._jobs.get(job_id)
+        if job is None:
+            return None
+        progress = {"trials_completed": 0, "study": None,
+                    "study_trials": 0, "best_value": None}
+        progress.update(self._progress.get(job_id, {}))
+        return {"job_id": job_id, "status": job["status"], **progress}
+
+    def result(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Возвращает задачу вместе с результатом или None, если
+        задача неизвестна.
+        """
+        job = self._jobs.get(job_id)
+        return None if job is None else dict(job)
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Возвращает число задач по статусам.
+        """
+        stats = {"queued": 0, "running": 0, "done": 0, "error": 0}
+        for job in self._jobs.values():
+            stats[job["status"]] += 1
+        return stats
+
+    async def shutdown(self) -> None:
+        """
+        Отменяет незавершенные задачи и останавливает менеджер
+        процессов.
+        """
+        for task in list(self._tasks.values()):
+            task.cancel()
+        if self._tasks:
+            await asyncio.gather(*self._tasks.values(),
+                                 return_exceptions=True)
+        if self._manager is not None:
+            self._manager.shutdown()
+            self._manager = None
+
+
+# Общая для процесса очередь задач обучения
+job_queue = JobQueue()
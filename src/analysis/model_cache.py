@@ -0,0 +1,120 @@
+import pickle
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple, Union
+
+
+ModelKey = Tuple[str, int, str, str, Union[str, int]]
+
+
+def deserialize_model(loaded_model: Any) -> Any:
+    """
+    Возвращает объект модели: байты десериализуются через pickle,
+    готовый объект возвращается как есть.
+    """
+    if isinstance(loaded_model, (bytes, bytearray, memoryview)):
+        return pickle.loads(loaded_model)
+    return loaded_model
+
+
+class ModelCache:
+    """
+    LRU-кэш десериализованных моделей, ограниченный суммарным
+    размером сериализованных моделей в байтах.
+
+    Ключ - (server, port, база агента, таблица моделей, хэш
+    содержимого модели из model_blobs или ID строки для моделей
+    из старого столбца model).
+    """
+
+    def __init__(self, max_bytes: int = 512 * 1024 * 1024):
+        """
+        Инициализирует кэш.
+
+        Args:
+            max_bytes: Максимальный суммарный размер моделей в байтах.
+        """
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        # ключ -> (модель, размер, оборудование)
+        self._entries: "OrderedDict[ModelKey, Tuple[Any, int, str]]" = \
+            OrderedDict()
+
+    def __contains__(self, key: ModelKey) -> bool:
+        return key in self._entries
+
+    def get(self, key: ModelKey) -> Optional[Any]:
+        """
+        Возвращает модель из кэша или None.
+        """
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[0]
+
+    def put(self, key: ModelKey, model: Any, size: int,
+            machine: str) -> None:
+        """
+        Помещает модель в кэш и вытесняет давно не используемые модели.
+        """
+        if key in self._entries:
+            self.current_bytes -= self._entries.pop(key)[1]
+        if size > self.max_bytes:
+            return
+        self._entries[key] = (model, size, machine)
+        self.current_bytes += size
+        while self.current_bytes > self.max_bytes:
+            _, (_, evicted_size, _) = self._entries.popitem(last=False)
+            self.current_bytes -= evicted_size
+
+    def get_or_load(self, key: ModelKey, machine: str,
+                    blob: Optional[bytes]) -> Any:
+        """
+        Возвращает модель из кэша, а при промахе десериализует blob
+        и сохраняет результат.
+        """
+        model = self.get(key)
+        if model is not None or blob is None:
+            return model
+        model = deserialize_model(blob)
+        self.put(key, model, len(blob), machine)
+        return model
+
+    def invalidate_machine(self, database: Tuple[str, int, str],
+                           table_name: str, machine: str) -> None:
+        """
+        Удаляет из кэша модели оборудования из указанной таблицы.
+        """
+        for key in [
+            key for key, entry in self._entries.items()
+            if key[:3] == database and key[3] == table_name
+            and entry[2] == machine
+        ]:
+            self.current_bytes -= self._entries.pop(key)[1]
+
+    def clear(self) -> None:
+        """
+        Очищает кэш.
+        """
+        self._entries.clear()
+        self.current_bytes = 0
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Возвращает статистику кэша.
+        """
+        return {
+            "entries": len(self._entries),
+            "bytes": self.current_bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+# Общий для процесса кэш моделей
+model_cache = ModelCache()
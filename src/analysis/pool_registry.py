@@ -0,0 +1,154 @@
+import asyncio
+import hashlib
+import os
+from typing import Dict, Any, Tuple
+
+import asyncpg
+
+
+PoolKey = Tuple[str, int, str, str, str]
+
+# Соль хэша пароля в ключе пула; меняется при каждом запуске процесса
+_PASSWORD_SALT = os.urandom(16)
+
+
+class PoolRegistry:
+    """
+    Реестр пулов соединений asyncpg, общий для всего процесса.
+
+    Пулы создаются лениво и хранятся по ключу
+    (server, port, database, user, хэш пароля), поэтому повторные
+    запросы к API используют уже прогретые соединения, а запрос
+    с неверным паролем не получает чужое соединение.
+    """
+
+    def __init__(
+        self,
+        min_size: int = 1,
+        max_size: int = 10,
+        max_inactive_connection_lifetime: float = 300.0,
+    ):
+        """
+        Инициализирует реестр с настройками создаваемых пулов.
+
+        Args:
+            min_size: Минимальное число соединений в пуле.
+            max_size: Максимальное число соединений в пуле.
+            max_inactive_connection_lifetime: Время (в секундах),
+                после которого простаивающее соединение закрывается.
+        """
+        self.min_size = min_size
+        self.max_size = max_size
+        self.max_inactive_connection_lifetime = \
+            max_inactive_connection_lifetime
+        self._pools: Dict[PoolKey, asyncpg.Pool] = {}
+        self._stats: Dict[PoolKey, Dict[str, int]] = {}
+        self._lock = asyncio.Lock()
+
+    @staticmethod
+    def make_key(server: str, port: int, database: str,
+                 user: str, password: str) -> PoolKey:
+        """
+        Формирует ключ пула по параметрам подключения. Пароль входит
+        в ключ в виде соленого хэша.
+        """
+        password_hash = hashlib.sha256(
+            _PASSWORD_SALT + password.encode()
+        ).hexdigest()
+        return server, int(port), database, user, password_hash
+
+    async def get_pool(
+        self,
+        server: str,
+        port: int,
+        database: str,
+        user: str,
+        password: str,
+    ) -> asyncpg.Pool:
+        """
+        Возвращает пул для указанной базы данных, создавая его при
+        первом обращении.
+        """
+        key = self.make_key(server, port, database, user, password)
+        pool = self._pools.get(key)
+        if pool is not None and not pool.is_closing():
+            return pool
+        async with self._lock:
+            pool = self._pools.get(key)
+            if pool is None or pool.is_closing():
+                pool = await asyncpg.create_pool(
+                    user=user,
+                    password=password,
+                    database=database,
+                    host=server,
+                    port=port,
+                    min_size=self.min_size,
+                    max_size=self.max_size,
+                    max_inactive_connection_lifetime=(
+                        self.max_inactive_connection_lifetime
+                    ),
+                )
+                self._pools[key] = pool
+                self._stats.setdefault(
+                    key, {"created": 0, "acquired": 0, "released": 0}
+                )
+                self._stats[key]["created"] += 1
+        return pool
+
+    async def acquire(
+        self,
+        server: str,
+        port: int,
+        database: str,
+        user: str,
+        password: str,
+    ) -> Tuple[asyncpg.Pool, asyncpg.Connection]:
+        """
+        Берет соединение из пула. Возвращает пару (пул, соединение).
+        """
+        pool = await self.get_pool(server, port, database, user, password)
+        conn = await pool.acquire()
+        key = self.make_key(server, port, database, user, password)
+        self._stats[key]["acquired"] += 1
+        return pool, conn
+
+    async def release(self, pool: asyncpg.Pool,
+                      conn: asyncpg.Connection) -> None:
+        """
+        Возвращает соединение в пул.
+        """
+        await pool.release(conn)
+        for key, known_pool in self._pools.items():
+            if known_pool is pool:
+                self._stats[key]["released"] += 1
+                break
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Возвращает статистику по всем пулам реестра.
+        """
+        result = {}
+        for key, pool in self._pools.items():
+            server, port, database, user, _ = key
+            result[f"{user}@{server}:{port}/{database}"] = {
+                "size": pool.get_size(),
+                "idle": pool.get_idle_size(),
+                "min_size": pool.get_min_size(),
+                "max_size": pool.get_max_size(),
+                **self._stats.get(key, {}),
+            }
+        return result
+
+    async def close_all(self) -> None:
+        """
+        Закрывает все пулы реестра.
+        """
+        async with self._lock:
+            pools = list(self._pools.values())
+            self._pools.clear()
+        for pool in pools:
+            await pool.close()
+
+
+# Общий для процесса реестр пулов
+pool_registry = PoolRegistry()
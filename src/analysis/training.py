@@ -0,0 +1,738 @@
+import json
+import warnings
+from collections import OrderedDict
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+from sklearn.cluster import KMeans, DBSCAN, \
+    AgglomerativeClustering, \
+    AffinityPropagation, \
+    SpectralClustering, \
+    MiniBatchKMeans, \
+    Birch
+from sklearn.naive_bayes import GaussianNB
+from sklearn.neighbors import KNeighborsClassifier
+from sklearn.svm import SVC
+from sklearn.linear_model import LogisticRegression, SGDClassifier
+from sklearn.tree import DecisionTreeClassifier
+from sklearn.ensemble import RandomForestClassifier, \
+    GradientBoostingClassifier
+from sklearn.metrics import precision_score, \
+    recall_score, accuracy_score
+
+from src.analysis import classification_methods, \
+    cluster_scoring, \
+    clusterization_methods, \
+    dataset_profiler, \
+    two_methods_included
+
+
+# Начиная с этого числа строк кластеризация идет потоковыми методами
+HUGE_DATA_ROWS = 100000
+# Наибольшее число соседей KNN при подборе параметров. Сетка не зависит
+# от размера классов, чтобы исследование оборудования продолжалось
+# при следующем обучении
+KNN_MAX_NEIGHBORS = 30
+
+
+class TrainedModels(NamedTuple):
+    """Модели кластеризации и классификации, обученные
+    train_claster_classif_models, с их оценками."""
+    name_claster: str
+    model_claster: Any
+    claster_accuracy: float
+    name_classif: str
+    model_classif: Any
+    classif_accuracy: float
+
+
+# Обучение моделей кластеризации и классификации (в процессе пула)
+def train_claster_classif_models(
+        data: Tuple,
+        task_manager: str,
+        machine: str
+) -> TrainedModels:
+    """Обучает модели кластеризации и классификации.
+
+    Функция не обращается к базе данных и выполняется в процессе
+    training_pool, чтобы обучение не блокировало цикл событий.
+
+    Args:
+        data: Tuple.
+        Данные для обучения, собранные data_formater_chunks
+        (признаки, число кластеров, ID, метки).
+        task_manager: str.
+        Идентификатор задачи обучения.
+        machine: str.
+        Оборудование, для которого сохраняется история подбора
+        гиперпараметров.
+
+    Returns:
+        TrainedModels. Названия, модели и оценки обеих моделей.
+    """
+    data_for_clustering, num_clusters, id_column, label_column = data
+    (
+        labels_cluster,
+        name_model_clusterization,
+        model_clusterization,
+        hyper_accuracy
+    ) = data_clasterization(
+        data_for_clustering,
+        num_clusters,
+        machine=machine
+    )
+    data_with_labels = two_methods_included.concatenate_data_with_labels(
+        data_for_clustering, labels_cluster, "behind"
+    )
+    data_for_classification = two_methods_included.data_formater(
+        data_with_labels, task_manager, "classification"
+    )
+    name_model_classification, model_classification, \
+        model_accuracy = data_classification(
+            data_for_classification, label_column,
+            machine=machine
+        )
+    return TrainedModels(name_model_clusterization, model_clusterization,
+                         hyper_accuracy, name_model_classification,
+                         model_classification, model_accuracy)
+
+
+# Модуль выбора метода классификации
+def data_classification(
+        data_for_classification: List[Dict],
+        label_column: List[Dict],
+        rules_classification_file: str = "rules/classification_rules.json",
+        machine: Optional[str] = None
+) -> Tuple[str, str, float]:
+    """Выполняет классификацию данных
+    на основе заданных правил и
+    возвращает модель и ее точность.
+
+    Args:
+        data_for_classification: List[Dict].
+         Список словарей, содержащих данные для классификации.
+        label_column: List[Dict].
+        Список столбцов с метками для классификации.
+        rules_classification_file: str.
+        Путь к файлу с правилами классификации
+        (по умолчанию "rules/classification_rules.json").
+        machine: Optional[str]. Оборудование, для которого
+        сохраняется история подбора гиперпараметров.
+
+    Returns:
+        Tuple[str, str, float]. Кортеж, содержащий:
+            - str: Название использованного
+            алгоритма классификации.
+            - str: Модель классификации.
+            - float: Точность модели классификации.
+
+    Raises:
+        FileNotFoundError:
+        Если файл с правилами классификации не найден.
+        Exception:
+        Если произошла ошибка во время классификации.
+    """
+    # Извлечение данных из кортежа
+    labels = label_column
+    best_score = 0
+    # Обработка нужных данных перед классификацией
+    X = data_for_classification.to_numpy()
+    y = labels.to_numpy()
+    # Получение файла с правилами
+    try:
+        with open(rules_classification_file, "r") as f:
+            rules_classification = json.load(f)
+    except FileNotFoundError:
+        raise FileNotFoundError(f"Rules file not found")
+    except json.JSONDecodeError:
+        raise ValueError(f"Invalid JSON format"
+                         f" in rules file")
+    # Анализ данных
+    num_samples, num_features = data_for_classification.shape
+    dimensionality = "Low" \
+        if num_features < 10 else "High"
+    data_volume = "Small" \
+        if num_samples < 1000 else "Large"
+    # Определение линейности данных
+    linearity = dataset_profiler.profile_linearity(X, y)
+    # Определение баланса классов
+    unique, counts = np.unique(labels, return_counts=True)
+    class_balance_ratio = counts.min() / counts.max()
+    class_balance = "Balanced" \
+        if class_balance_ratio > 0.8 else "Imbalanced"
+    analysis_classification_results = {
+        "dimensionality": dimensionality,
+        "data_volume": data_volume,
+        "linearity": linearity,
+        "class_balance": class_balance,
+    }
+    # Выбор метода
+    algorithm_name = \
+        two_methods_included.method_selector_by_analysis(
+            analysis_classification_results, rules_classification
+        )
+    # Вызов алгоритма
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore",
+                              category=UserWarning)
+        warnings.simplefilter("ignore",
+                              category=RuntimeWarning)
+        if algorithm_name == "NaiveBayes":
+            print("\tВыбранный метод классификации"
+                  " - NaiveBayes")
+            param_grid = {
+                'var_smoothing': [1e-9, 1e-8, 1e-7,
+                                  1e-6, 1e-5]
+            }
+            result = \
+                two_methods_included.optimize_hyperparameters_classif(
+                    GaussianNB, param_grid,
+                    X, y, n_trials=100,
+                    study_key=machine
+                )
+            if not result:
+                print("\tОптимизация не была выполнена, "
+                      "используем стандартные параметры.")
+                best_params = OrderedDict([('var_smoothing',
+                                            1e-9)])
+            else:
+                best_params, best_score = result
+            y_pred, model_classification, y_test = \
+                classification_methods.data_naiveb_classif(
+                    None, None, X, y, best_params
+                )
+        elif algorithm_name == "KNN":
+            print("\tВыбранный метод классификации"
+                  " - KNN")
+            param_grid = {
+                'n_neighbors': list(range(1, KNN_MAX_NEIGHBORS + 1)),
+                'weights': ['uniform', 'distance'],
+                'metric': ['euclidean', 'manhattan',
+                           'minkowski']
+            }
+            result = \
+                two_methods_included.optimize_hyperparameters_classif(
+                    KNeighborsClassifier, param_grid,
+                    X, y, n_trials=100,
+                    study_key=machine
+                )
+            if not result:
+                print("\tОптимизация не была выполнена, "
+                      "используем стандартные параметры.")
+                best_params = OrderedDict([('n_neighbors', 5),
+                                           ('weights', 'uniform'),
+                                           ('metric', 'minkowski')])
+            else:
+                best_params, best_score = result
+            # Классификация данным
+            y_pred, model_classification, y_test = \
+                classification_methods.data_knn_classif(
+                    None, None, X, y, best_params
+                )
+        elif algorithm_name == "SVM":
+            print("\tВыбранный метод классификации"
+                  " - SVM")
+            param_grid = {
+                'C': [0.1, 1, 10, 100],
+                'kernel': ['linear', 'poly',
+                           'rbf', 'sigmoid'],
+                'gamma': ['scale', 'auto']
+            }
+            result = \
+                two_methods_included.optimize_hyperparameters_classif(
+                    SVC, param_grid,
+                    X, y, n_trials=100,
+                    study_key=machine
+                )
+            if not result:
+                print("\tОптимизация не была выполнена, "
+                      "используем стандартные параметры.")
+                best_params = OrderedDict([('C', 1),
+                                           ('kernel', 'rbf'),
+                                           ('gamma', 'scale')])
+            else:
+                best_params, best_score = result
+            # Классификация данным
+            y_pred, model_classification, y_test = \
+                classification_methods.data_svm_classif(
+                    None, None, X, y, best_params
+                )
+        elif algorithm_name == "LogisticRegression":
+            print("\tВыбранный метод классификации"
+                  " - LogisticRegression")
+            param_grid = {
+                'C': (1, 100),
+                'solver': ['newton-cg', 'lbfgs',
+                           'liblinear', 'sag',
+                           'saga'],
+                'max_iter': (100, 1000)
+            }
+            result = \
+                two_methods_included.optimize_hyperparameters_classif(
+                    LogisticRegression, param_grid,
+                    X, y, n_trials=100,
+                    study_key=machine
+                )
+            if not result or None in result:
+                print("\tОптимизация не была выполнена, "
+                      "используем стандартные параметры.")
+                best_params = OrderedDict([('C', 1),
+                                           ('solver', 'lbfgs'),
+                                           ('max_iter', 100)])
+            else:
+                best_params, best_score = result
+            # Классификация данным
+            y_pred, model_classification, y_test = \
+                classification_methods.data_logregress_classif(
+                    None, None, X, y, best_params
+                )
+        elif algorithm_name == "DecisionTree":
+            print("\tВыбранный метод классификации"
+                  " - DecisionTree")
+            param_grid = {
+                'criterion': ['gini', 'entropy'],
+                'splitter': ['best', 'random'],
+                'max_depth': list(range(1, 21)),
+                'min_samples_split': [2, 5, 10],
+                'min_samples_leaf': [1, 2, 4]
+            }
+            result = \
+                two_methods_included.optimize_hyperparameters_classif(
+                    DecisionTreeClassifier, param_grid,
+                    X, y, n_trials=100,
+                    study_key=machine
+                )
+            if not result:
+                print("\tОптимизация не была выполнена, "
+                      "используем стандартные параметры.")
+                best_params = OrderedDict(
+                    [('criterion', 'gini'),
+                     ('splitter', 'best'),
+                     ('max_depth', None),
+                     ('min_samples_split', 2),
+                     ('min_samples_leaf', 1)])
+            else:
+                best_params, best_score = result
+            # Классификация данным
+            y_pred, model_classification, y_test = \
+                classification_methods.data_dectree_classif(
+                    None, None, X, y, best_params
+                )
+        elif algorithm_name == "RandomForest":
+            print("\tВыбранный метод классификации"
+                  " - RandomForest")
+            param_grid = {
+                'n_estimators': [50, 100, 200],
+                'criterion': ['gini', 'entropy'],
+                'max_depth': list(range(1, 21)),
+                'min_samples_split': [2, 5, 10],
+                'min_samples_leaf': [1, 2, 4]
+            }
+            result = \
+                two_methods_included.optimize_hyperparameters_classif(
+                    RandomForestClassifier, param_grid,
+                    X, y, n_trials=100,
+                    study_key=machine
+                )
+            if not result:
+                print("\tОптимизация не была выполнена, "
+                      "используем стандартные параметры.")
+                best_params = OrderedDict(
+                    [('n_estimators', 100),
+                     ('criterion', 'gini'),
+                     ('max_depth', None),
+                     ('min_samples_split', 2),
+                     ('min_samples_leaf', 1)])
+            else:
+                best_params, best_score = result
+            # Классификация данным
+            y_pred, model_classification, y_test = \
+                classification_methods.data_randforest_classif(
+                    None, None, X, y, best_params
+                )
+        elif algorithm_name == "GradientBoosting":
+            print("\tВыбранный метод классификации"
+                  " - GradientBoosting")
+            param_grid = {
+                'n_estimators': [50, 100, 200],
+                'learning_rate': [0.01, 0.1, 0.2],
+                'max_depth': list(range(1, 6)),
+                'min_samples_split': [2, 5, 10],
+                'min_samples_leaf': [1, 2, 4]
+            }
+            result = \
+                two_methods_included.optimize_hyperparameters_classif(
+                    GradientBoostingClassifier, param_grid,
+                    X, y, n_trials=100,
+                    study_key=machine
+                )
+            if not result:
+                print("\tОптимизация не была выполнена, "
+                      "используем стандартные параметры.")
+                best_params = OrderedDict(
+                    [('n_estimators', 100),
+                     ('learning_rate', 0.1),
+                     ('max_depth', 3),
+                     ('min_samples_split', 2),
+                     ('min_samples_leaf', 1)])
+            else:
+                best_params, best_score = result
+            # Классификация данным
+            y_pred, model_classification, y_test = \
+                classification_methods.data_gradboost_classif(
+                    None, None, X, y, best_params
+                )
+        elif algorithm_name == "SGD":
+            print("\tВыбранный метод классификации"
+                  " - SGD")
+            param_grid = {
+                'loss': ['hinge', 'log_loss', 'modified_huber'],
+                'penalty': ['l2', 'l1', 'elasticnet'],
+                'alpha': [1e-5, 1e-4, 1e-3, 1e-2]
+            }
+            result = \
+                two_methods_included.optimize_hyperparameters_classif(
+                    SGDClassifier, param_grid,
+                    X, y, n_trials=100,
+                    study_key=machine
+                )
+            if not result:
+                print("\tОптимизация не была выполнена, "
+                      "используем стандартные параметры.")
+                best_params = OrderedDict(
+                    [('loss', 'hinge'),
+                     ('penalty', 'l2'),
+                     ('alpha', 1e-4)])
+            else:
+                best_params, best_score = result
+            # Классификация данным
+            y_pred, model_classification, y_test = \
+                classification_methods.data_sgd_classif(
+                    None, None, X, y, best_params
+                )
+        else:
+            raise ValueError(f"Ошибка выбора алгоритма.")
+    # Результаты классификации
+    precision = precision_score(y_test, y_pred, average='macro')
+    recall = recall_score(y_test, y_pred, average='macro')
+    accuracy = round(accuracy_score(y_test, y_pred), 2)
+    print(f"\tТочность модели {algorithm_name}: {accuracy}")
+    print(f"\tТочность модели precision {algorithm_name}: {precision}")
+    print(f"\tТочность модели recall {algorithm_name}: {recall}")
+    return algorithm_name, model_classification, accuracy
+
+
+# Модуль выбора метода кластеризации
+def data_clasterization(
+        data_for_clustering: List[Dict],
+        num_clusters: int,
+        rules_claster_file: str = "rules/clusterization_rules.json",
+        machine: Optional[str] = None
+) -> Tuple[List[Dict], str, str, float]:
+    """Выполняет кластеризацию данных и
+    возвращает результаты, название алгоритма,
+    модель и оценку качества кластеризации.
+
+    Args:
+        data_for_clustering: List[Dict].
+        Список словарей, содержащих данные для кластеризации.
+        num_clusters: int.
+        Количество кластеров, на которые нужно разделить данные.
+        rules_claster_file: str.
+        Путь к файлу с правилами кластеризации
+        (по умолчанию "rules/clusterization_rules.json").
+        machine: Optional[str]. Оборудование, для которого
+        сохраняется история подбора гиперпараметров.
+
+    Returns:
+        Tuple[List[Dict], str, str, float]. Кортеж, содержащий:
+            - List[Dict]: Список словарей
+            с метками кластеров для каждого элемента данных.
+            - str: Название использованного
+            алгоритма кластеризации.
+            - str: Модель кластеризации.
+            - float: Силуэт итоговой модели
+            (cluster_scoring.final_score).
+
+    Raises:
+        FileNotFoundError:
+        Если файл с правилами кластеризации не найден.
+        ValueError:
+        Если количество кластеров недопустимо.
+        Exception:
+        Если произошла ошибка во время кластеризации.
+    """
+    # Получение файла с правилами
+    try:
+        with open(rules_claster_file, "r") as f:
+            rules_claster = json.load(f)
+    except FileNotFoundError:
+        raise FileNotFoundError(f"Rules file not found")
+    except json.JSONDecodeError:
+        raise ValueError(f"Invalid JSON format "
+                         f"in rules file")
+    # Анализ данных
+    best_score = 0
+    num_samples, num_features = data_for_clustering.shape
+    data_size = "Low" \
+        if num_samples < 100 \
+        else ("Average" if num_samples < 1000
+              else ("High" if num_samples < HUGE_DATA_ROWS
+                    else "Huge"))
+    data_set = "Low" \
+        if num_features < 5 else "High"
+    num_clusters_status = "Known" \
+        if num_clusters != -1 else "Unknown"
+    # Статистический анализ за один проход по данным
+    profile = dataset_profiler.profile_dataset(data_for_clustering)
+    cv = profile.cv
+    outliers_zscore = profile.outliers_zscore
+    # Определение уровня шума
+    noise = "Low" if cv < 0.5 and outliers_zscore < 0.05 \
+        else ("Medium"
+              if cv < 1.0 and outliers_zscore < 0.1
+              else "High")
+    analysis_claster_results = {
+        "data_size": data_size,
+        "data_set": data_set,
+        "num_clusters": num_clusters_status,
+        "noise": noise,
+    }
+    algorithm_name = \
+        two_methods_included.method_selector_by_analysis(
+            analysis_claster_results, rules_claster
+        )
+    print("METHOD:", algorithm_name)
+    # Выбор одного метода из множества
+    max_n_clusters = min(6, num_samples - 1)
+    # Вызов алгоритма по выбранному методу
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore",
+                              category=UserWarning)
+        warnings.simplefilter("ignore",
+                              category=RuntimeWarning)
+        if algorithm_name == "KMeans":
+            print("\tВыбранный метод кластеризации"
+                  " - KMeans")
+            # Определение лучших гиперпараметров
+            param_grid = {
+                'n_clusters': list(range(2, max_n_clusters-1)),
+                'init': ['k-means++', 'random'],
+                'max_iter': list(range(100, 301, 50))
+            }
+            result = \
+                two_methods_included.optimize_hyperparameters_claster(
+                    KMeans, param_grid,
+                    data_for_clustering, n_trials=100,
+                    study_key=machine
+                )
+            # Если данных слишком мало
+            if not result:
+                print("\tОптимизация не была выполнена, "
+                      "используем стандартные параметры.")
+                best_params = OrderedDict([
+                    ('n_clusters', 3),
+                    ('init', 'k-means++'),
+                    ('max_iter', 300)])
+            else:
+                best_params, best_score = result
+            # Кластеризация данным
+            labels, model_clusterization = \
+                clusterization_methods.data_kmean_cluster(
+                    data_for_clustering, best_params
+                )
+        elif algorithm_name == "AgglomerativeClustering":
+            print("\tВыбранный метод кластеризации"
+                  " - AgglomerativeClustering")
+            # Определение лучших гиперпараметров
+            param_grid = {
+                'n_clusters': list(range(2,  max_n_clusters-1)),
+                'linkage': ['ward', 'complete', 'average']
+            }
+            result = \
+                two_methods_included.optimize_hyperparameters_claster(
+                    AgglomerativeClustering, param_grid,
+                    data_for_clustering, n_trials=100,
+                    study_key=machine
+                )
+            # Если данных слишком мало
+            if not result:
+                print("\tОптимизация не была выполнена, "
+                      "используем стандартные параметры.")
+                best_params = OrderedDict([(
+                    'n_clusters', num_clusters),
+                    ('linkage', 'ward')])
+            else:
+                best_params, best_score = result
+            # Кластеризация данным
+            labels, model_clusterization = \
+                clusterization_methods.data_agglclust_cluster(
+                    data_for_clustering,
+                    best_params
+                )
+        elif algorithm_name == "SpectralClustering":
+            print("\tВыбранный метод кластеризации - SpectralClustering")
+            # Определение лучших гиперпараметров
+            param_grid = {
+                'n_clusters': list(range(2, max_n_clusters-1)),
+                'affinity': ['rbf', 'nearest_neighbors'],
+                'gamma': np.arange(0.1, 1.0, 0.1)
+            }
+            result = \
+                two_methods_included.optimize_hyperparameters_claster(
+                    SpectralClustering, param_grid,
+                    data_for_clustering, n_trials=100,
+                    study_key=machine
+                )
+            # Если данных слишком мало
+            if not result:
+                print("\tОптимизация не была выполнена, "
+                      "используем стандартные параметры.")
+                best_params = OrderedDict([('n_clusters', 3),
+                                           ('affinity', 'rbf'),
+                                           ('gamma', 0.5)])
+            else:
+                best_params, best_score = result
+            # Кластеризация данным
+            labels, model_clusterization = \
+                clusterization_methods.data_specclust_clust(
+                    data_for_clustering, best_params
+                )
+        elif algorithm_name == "DBSCAN":
+            print("\tВыбранный метод кластеризации - DBSCAN")
+            # Определение лучших гиперпараметров
+            param_grid = {
+                'eps': np.arange(0.1, 0.7, 0.1),
+                'min_samples': list(range(2,
+                                          max_n_clusters-1))
+            }
+            # Если данных слишком мало
+            result = \
+                two_methods_included.optimize_hyperparameters_claster(
+                    DBSCAN, param_grid,
+                    data_for_clustering, n_trials=100,
+                    study_key=machine
+                )
+            if not result:
+                print("\tОптимизация не была выполнена, "
+                      "используем стандартные параметры.")
+                best_params = OrderedDict([('eps', 0.5),
+                                           ('min_samples', 5)])
+            else:
+                best_params, best_score = result
+            # Кластеризация данным
+            labels, model_clusterization = \
+                clusterization_methods.data_dbscan_cluster(
+                    data_for_clustering, best_params
+                )
+        elif algorithm_name == "AffinityPropagation":
+            print("\tВыбранный метод кластеризации"
+                  " - AffinityPropagation")
+            # Определение лучших гиперпараметров
+            param_grid = {
+                'damping': np.arange(0.5, 1.0, 0.1),
+                'preference': np.arange(-50, 50, 10)
+            }
+            result = two_methods_included.optimize_hyperparameters_claster(
+                AffinityPropagation, param_grid,
+                data_for_clustering, n_trials=100,
+                study_key=machine
+            )
+            # Если данных слишком мало
+            if not result:
+                print("\tОптимизация не была выполнена, "
+                      "используем стандартные параметры.")
+                best_params = OrderedDict([('damping', 0.5),
+                                           ('preference', -10)])
+            else:
+                best_params, best_score = result
+            # Кластеризация данным
+            labels, model_clusterization = \
+                clusterization_methods.data_affprop_cluster(
+                    data_for_clustering, best_params
+                )
+        elif algorithm_name == "MiniBatchKMeans":
+            print("\tВыбранный метод кластеризации"
+                  " - MiniBatchKMeans")
+            # Определение лучших гиперпараметров
+            param_grid = {
+                'n_clusters': list(range(2, max_n_clusters-1)),
+                'batch_size': [1024, 2048, 4096]
+            }
+            result = \
+                two_methods_included.optimize_hyperparameters_claster(
+                    MiniBatchKMeans, param_grid,
+                    data_for_clustering, n_trials=100,
+                    study_key=machine
+                )
+            # Если данных слишком мало
+            if not result:
+                print("\tОптимизация не была выполнена, "
+                      "используем стандартные параметры.")
+                best_params = OrderedDict([('n_clusters', 3),
+                                           ('batch_size', 2048)])
+            else:
+                best_params, best_score = result
+            # Кластеризация данных блоками
+            labels, model_clusterization = \
+                clusterization_methods.data_minibatch_kmeans_cluster(
+                    data_for_clustering, best_params
+                )
+        elif algorithm_name == "Birch":
+            print("\tВыбранный метод кластеризации - Birch")
+            # Определение лучших гиперпараметров
+            param_grid = {
+                'n_clusters': list(range(2, max_n_clusters-1)),
+                'threshold': [0.1, 0.25, 0.5, 1.0],
+                'branching_factor': [25, 50, 100]
+            }
+            result = \
+                two_methods_included.optimize_hyperparameters_claster(
+                    Birch, param_grid,
+                    data_for_clustering, n_trials=100,
+                    study_key=machine
+                )
+            # Если данных слишком мало
+            if not result:
+                print("\tОптимизация не была выполнена, "
+                      "используем стандартные параметры.")
+                best_params = OrderedDict([('n_clusters', 3),
+                                           ('threshold', 0.5),
+                                           ('branching_factor', 50)])
+            else:
+                best_params, best_score = result
+            # Кластеризация данных блоками
+            labels, model_clusterization = \
+                clusterization_methods.data_birch_cluster(
+                    data_for_clustering, best_params
+                )
+        else:
+            raise ValueError(f"Ошибка выбора алгоритма.")
+    best_score = round(best_score, 2)
+    print("\tЛучшая оценка при подборе гиперпараметров:", best_score)
+
+    # Финальная оценка кластеризации
+    final_score = -1
+    try:
+        if len(set(labels)) > 1 and len(set(labels)) \
+                < len(data_for_clustering):
+            score = cluster_scoring.final_score(data_for_clustering,
+                                                labels)
+            final_score = round(score.value, 2)
+            print(f"\tФинальный Silhouette Score: {final_score}"
+                  f" ({score.method})")
+            if score.ci_low is not None:
+                print(f"\t95% интервал: [{score.ci_low:.2f}, "
+                      f"{score.ci_high:.2f}]")
+        else:
+            print("\tНевозможно рассчитать финальный "
+                  "Silhouette Score: кластеров слишком мало "
+                  "или они одинаковы.")
+    except Exception as e:
+        print(f"\tОшибка при вычислении финальной метрики: {e}")
+
+    # В таблицу моделей записывается силуэт (полный или по
+    # стратифицированной выборке) при любом размере данных: модели
+    # сравниваются по этому значению. Оценка подбора может быть
+    # другой метрикой (Calinski-Harabasz для больших таблиц).
+    return labels, algorithm_name, model_clusterization, final_score
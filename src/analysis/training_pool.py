@@ -0,0 +1,132 @@
+import asyncio
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Optional
+
+from src.analysis import two_methods_included
+
+
+# Число процессов обучения по умолчанию
+DEFAULT_TRAINING_WORKERS = 2
+# Способ запуска процессов: spawn не копирует потоки и цикл событий
+# работающего сервера и доступен на всех платформах
+TRAINING_START_METHOD = "spawn"
+
+# Наблюдатель за испытаниями Optuna для обучения, запущенного
+# из текущей задачи asyncio (задается очередью задач JobQueue)
+current_progress: ContextVar[Optional[Callable]] = ContextVar(
+    "current_progress", default=None
+)
+
+
+def default_training_workers() -> int:
+    """Число процессов обучения из переменной окружения
+    TRAINING_WORKERS (по умолчанию 2)."""
+    value = os.environ.get("TRAINING_WORKERS")
+    if value is None:
+        return DEFAULT_TRAINING_WORKERS
+    return max(1, int(value))
+
+
+# Признак процесса пула: функции выполняются в нем без вложенного пула
+_in_worker = False
+
+
+def _mark_worker() -> None:
+    """Инициализатор процессов пула."""
+    global _in_worker
+    _in_worker = True
+
+
+def training_context() -> multiprocessing.context.BaseContext:
+    """Контекст multiprocessing для процессов обучения."""
+    return multiprocessing.get_context(TRAINING_START_METHOD)
+
+
+def _run_with_progress(progress: Callable,
+                       function: Callable[..., Any], *args: Any) -> Any:
+    """Выполняет функцию в процессе пула, сообщая progress
+    о каждом испытании Optuna."""
+    two_methods_included.set_trial_callback(progress)
+    try:
+        return function(*args)
+    finally:
+        two_methods_included.set_trial_callback(None)
+
+
+class TrainingPool:
+    """
+    Пул процессов для обучения моделей, общий для всего процесса.
+
+    Обучение sklearn/Optuna занимает процессор на минуты, поэтому
+    выполняется вне цикла событий: запросы к API (в том числе
+    предсказания) обслуживаются, пока модели обучаются. Процессы
+    создаются при первом обращении.
+    """
+
+    def __init__(self, max_workers: Optional[int] = None):
+        self.max_workers = max_workers
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._stats: Dict[str, int] = {"submitted": 0, "running": 0}
+
+    @property
+    def workers(self) -> int:
+        """Число процессов пула."""
+        return self.max_workers or default_training_workers()
+
+    def executor(self) -> ProcessPoolExecutor:
+        """
+        Возвращает пул процессов, создавая его при первом обращении.
+        Функции, которые выполняются в пуле, должны импортироваться
+        по имени модуля (например, из src.analysis.training).
+        """
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=training_context(),
+                initializer=_mark_worker,
+            )
+        return self._executor
+
+    async def run(self, function: Callable[..., Any], *args: Any) -> Any:
+        """
+        Выполняет функцию в процессе пула и ожидает результат,
+        не блокируя цикл событий. Если задан current_progress,
+        он получает сведения об испытаниях Optuna. Внутри процесса
+        пула (задача целиком выполняется в нем) функция вызывается
+        напрямую.
+        """
+        if _in_worker:
+            return function(*args)
+        loop = asyncio.get_running_loop()
+        progress = current_progress.get()
+        if progress is not None:
+            function, args = _run_with_progress, (progress, function, *args)
+        self._stats["submitted"] += 1
+        self._stats["running"] += 1
+        try:
+            return await loop.run_in_executor(
+                self.executor(), function, *args
+            )
+        finally:
+            self._stats["running"] -= 1
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Возвращает статистику пула.
+        """
+        return {"workers": self.workers, **self._stats}
+
+    def shutdown(self) -> None:
+        """
+        Останавливает процессы пула.
+        """
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+# Общий для процесса пул обучения
+training_pool = TrainingPool()
@@ -1,13 +1,45 @@
+import functools
+import hashlib
 import logging
+import os
+import re
+import shutil
+import tempfile
 import warnings
 from collections import Counter
-from typing import List, Dict, Any, Type, Tuple
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Dict, Any, Type, Tuple, AsyncIterator, \
+    Callable, Optional
 
 import numpy as np
 import pandas as pd
 import optuna
-from sklearn.metrics import silhouette_score
-from sklearn.model_selection import StratifiedKFold, cross_val_score
+from optuna.storages import JournalStorage
+from optuna.storages.journal import JournalFileBackend
+from optuna.trial import TrialState
+from sklearn.base import clone
+from sklearn.model_selection import StratifiedKFold
+
+from src.analysis import cluster_scoring, clusterization_methods, \
+    training_pool
+from src.analysis.distance_graph import PrecomputedDistances, \
+    precompute_distances
+
+
+# Каталог постоянных исследований Optuna по оборудованию (в корне
+# проекта, чтобы не зависеть от текущего каталога)
+STUDY_DIR = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.dirname(
+        os.path.abspath(__file__)))),
+    "optuna_studies"
+)
+# Продолженное исследование выполняет n_trials // 4, но не меньше 10
+WARM_START_TRIALS_DIVISOR = 4
+WARM_START_MIN_TRIALS = 10
+# Размер выборки для подбора параметров потоковых методов кластеризации
+STREAM_SEARCH_ROWS = 50000
+# Наблюдатель за испытаниями Optuna (см. set_trial_callback)
+trial_callback: Optional[Callable] = None
 
 
 # Склеивает список словарей data и столбец labels
@@ -96,12 +128,77 @@ def data_formater(data: List[Dict], task_manager: str, method: str) -> Any:
         return np.array([])
 
 
+# Сборка потоковых блоков таблицы в формат data_formater
+async def data_formater_chunks(
+        chunks: AsyncIterator[Any],
+        task_manager: str
+) -> Tuple[np.ndarray, int, np.ndarray, Any]:
+    """Собирает блоки TableChunk в тот же кортеж, что возвращает
+    data_formater для метода 'clasterization', не строя список словарей.
+
+    Для LEARN возвращает (признаки, число кластеров, ID, метки),
+    для PREDICT - (признаки, -1, ID, столбцы времени).
+    """
+    ids, times, features, labels = [], [], [], []
+    async for chunk in chunks:
+        ids.append(chunk.ids)
+        times.append(chunk.times)
+        features.append(chunk.features)
+        if chunk.labels is not None:
+            labels.append(chunk.labels)
+    if not features:
+        return np.array([]), -1, np.array([]), np.array([])
+
+    id_column = np.concatenate(ids)
+    data = np.concatenate(features)
+    if task_manager == "LEARN":
+        label_column = pd.Series(np.concatenate(labels))
+        num_clusters = len(label_column.unique())
+        return data, num_clusters, id_column, label_column
+    return data, -1, id_column, np.concatenate(times)
+
+
+# Подготовка строк результатов предсказания для записи в БД
+def build_prediction_records(
+        id_column: np.ndarray,
+        time_col: np.ndarray,
+        labels_cluster: np.ndarray,
+        y_pred: np.ndarray,
+        model_id: Any,
+        cluster_model_id: Any
+) -> List[Tuple]:
+    """Собирает кортежи (id, ts, cluster, label, model_id,
+    cluster_model_id) для DatabaseConnector.copy_predictions.
+    Время берется из первого столбца времени и хранится как текст."""
+    if time_col.ndim == 2 and time_col.shape[1] > 0:
+        times = time_col[:, 0]
+    else:
+        times = [None] * len(id_column)
+    return [
+        (
+            int(row_id),
+            value.isoformat() if hasattr(value, "isoformat")
+            else (None if value is None else str(value)),
+            int(cluster),
+            str(label),
+            model_id,
+            cluster_model_id,
+        )
+        for row_id, value, cluster, label in zip(
+            id_column, times, labels_cluster, y_pred
+        )
+    ]
+
+
 # Общая функция для выбора метода по анализу
 def method_selector_by_analysis(
         analysis_results: Dict[str, str],
         rules: Dict
 ) -> str:
-    """Выбирает метод анализа на основе результатов анализа и правил."""
+    """Выбирает метод анализа на основе результатов анализа и правил.
+
+    Раздел правил "restrict" ограничивает выбор: если значение
+    критерия указано в нем, голосуют только перечисленные методы."""
     method_counts = Counter()
 
     for criterion, value in analysis_results.items():
@@ -110,6 +207,13 @@ def method_selector_by_analysis(
             if possible_methods:
                 method_counts.update(possible_methods)
 
+    for criterion, value in analysis_results.items():
+        allowed = rules.get('restrict', {}).get(criterion, {}).get(value)
+        if allowed:
+            method_counts = Counter({
+                method: method_counts[method] for method in allowed
+            })
+
     if not method_counts:
         return rules['defaults']['algorithm']
 
@@ -117,14 +221,251 @@ def method_selector_by_analysis(
     return most_common_method
 
 
+# Число процессов для подбора гиперпараметров по умолчанию
+def default_n_jobs() -> int:
+    """Возвращает число процессов из переменной OPTUNA_N_JOBS (1,
+    если она не задана)."""
+    return max(1, int(os.environ.get("OPTUNA_N_JOBS", "1")))
+
+
+# Выбор прунера Optuna по имени
+def make_pruner(name: Optional[str]) -> optuna.pruners.BasePruner:
+    """Возвращает прунер: "median" - MedianPruner, "halving" -
+    SuccessiveHalvingPruner, None - без отсечения испытаний."""
+    if name is None:
+        return optuna.pruners.NopPruner()
+    if name == "median":
+        return optuna.pruners.MedianPruner(n_startup_trials=5,
+                                           n_warmup_steps=1)
+    if name == "halving":
+        return optuna.pruners.SuccessiveHalvingPruner()
+    raise ValueError(
+        "Значение параметра pruner должно быть 'median', 'halving' или None."
+    )
+
+
+# Запуск части испытаний исследования в отдельном процессе
+def _optimize_worker(
+        storage_path: str,
+        study_name: str,
+        objective: Any,
+        n_trials: int,
+        pruner: Optional[str] = None,
+        callbacks: Optional[List[Callable]] = None
+) -> None:
+    """Загружает исследование из общего файлового хранилища
+    и выполняет в нем n_trials испытаний."""
+    optuna.logging.get_logger("optuna").setLevel(logging.WARNING)
+    storage = JournalStorage(JournalFileBackend(storage_path))
+    study = optuna.load_study(study_name=study_name, storage=storage,
+                              pruner=make_pruner(pruner))
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", category=UserWarning)
+        warnings.simplefilter("ignore", category=RuntimeWarning)
+        study.optimize(objective, n_trials=n_trials, callbacks=callbacks)
+
+
+# Наблюдатель за испытаниями текущего процесса
+def set_trial_callback(callback: Optional[Callable]) -> None:
+    """Задает функцию callback(study, trial), которая вызывается после
+    каждого испытания исследований этого процесса (например, для
+    отчета о ходе обучения). None отключает наблюдение."""
+    global trial_callback
+    trial_callback = callback
+
+
+# Приведение сетки параметров к типам Python
+def plain_param_grid(param_grid: Dict[str, Any]) -> Dict[str, Any]:
+    """Заменяет массивы и скаляры NumPy в сетке параметров на списки
+    и значения Python: файловое хранилище Optuna сохраняет
+    варианты в JSON."""
+    plain = {}
+    for param_name, param_range in param_grid.items():
+        if isinstance(param_range, tuple):
+            plain[param_name] = param_range
+        else:
+            plain[param_name] = [
+                value.item() if isinstance(value, np.generic) else value
+                for value in param_range
+            ]
+    return plain
+
+
+# Каталог исследований
+def study_dir() -> str:
+    """Каталог исследований из переменной окружения OPTUNA_STUDY_DIR
+    (по умолчанию optuna_studies в корне проекта)."""
+    return os.environ.get("OPTUNA_STUDY_DIR", STUDY_DIR)
+
+
+# Путь к постоянному хранилищу исследований оборудования
+def study_storage_path(study_key: str) -> str:
+    """Возвращает путь к файлу JournalStorage оборудования."""
+    os.makedirs(study_dir(), exist_ok=True)
+    file_name = re.sub(r"[^0-9a-z_]+", "_", study_key.lower())
+    return os.path.join(study_dir(), f"{file_name}.log")
+
+
+# Имя исследования для алгоритма и сетки параметров
+def study_name_for(
+        task: str,
+        model_class: Type[Any],
+        param_grid: Dict[str, Any]
+) -> str:
+    """Имя исследования включает хэш сетки параметров, чтобы история
+    не смешивалась после изменения сетки. Сетка не должна зависеть
+    от данных, иначе каждое обучение начинает новое исследование."""
+    grid_hash = hashlib.sha1(
+        repr(sorted(param_grid.items())).encode()
+    ).hexdigest()[:12]
+    return f"{task}_{model_class.__name__}_{grid_hash}"
+
+
+# Удаление истории исследований
+def clear_study_history() -> None:
+    """Удаляет сохраненные исследования всех оборудований."""
+    shutil.rmtree(study_dir(), ignore_errors=True)
+
+
+# Число испытаний при продолжении исследования
+def warm_start_trials(n_trials: int) -> int:
+    """При наличии истории исследования достаточно части испытаний."""
+    return min(n_trials, max(WARM_START_MIN_TRIALS,
+                             n_trials // WARM_START_TRIALS_DIVISOR))
+
+
+# Выполнение испытаний в текущем процессе или в пуле процессов
+def _optimize_study(
+        study: optuna.Study,
+        storage_path: Optional[str],
+        objective: Any,
+        n_trials: int,
+        n_jobs: int,
+        pruner: Optional[str]
+) -> None:
+    """Выполняет n_trials испытаний исследования. Для n_jobs > 1
+    исследование должно храниться в файле storage_path."""
+    n_jobs = min(n_jobs, n_trials)
+    callbacks = [trial_callback] if trial_callback is not None else None
+    if n_jobs <= 1:
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", category=UserWarning)
+            warnings.simplefilter("ignore", category=RuntimeWarning)
+            study.optimize(objective, n_trials=n_trials,
+                           callbacks=callbacks)
+        return
+    # Испытания делятся между процессами поровну. Процессы запускаются
+    # тем же способом, что и пул обучения: исследование может
+    # выполняться внутри его процесса
+    trials_per_job = [
+        n_trials // n_jobs + (1 if i < n_trials % n_jobs else 0)
+        for i in range(n_jobs)
+    ]
+    with ProcessPoolExecutor(
+            max_workers=n_jobs,
+            mp_context=training_pool.training_context()
+    ) as executor:
+        futures = [
+            executor.submit(_optimize_worker, storage_path,
+                            study.study_name, objective, job_trials,
+                            pruner, callbacks)
+            for job_trials in trials_per_job
+        ]
+        for future in futures:
+            future.result()
+
+
+# Продолжение постоянного исследования оборудования
+def _run_persistent_study(
+        objective: Any,
+        n_trials: int,
+        n_jobs: int,
+        pruner: Optional[str],
+        storage_path: str,
+        study_name: str
+) -> Tuple[Dict[str, Any], float]:
+    """Продолжает исследование из файла storage_path: прошлые испытания
+    используются сэмплером, прошлые лучшие параметры проверяются первыми.
+    Лучший результат выбирается среди испытаний текущего запуска,
+    так как прошлые оценки получены на других данных."""
+    storage = JournalStorage(JournalFileBackend(storage_path))
+    study = optuna.create_study(direction='maximize', storage=storage,
+                                study_name=study_name, load_if_exists=True,
+                                pruner=make_pruner(pruner))
+    if study.get_trials(deepcopy=False, states=(TrialState.COMPLETE,)):
+        study.enqueue_trial(study.best_params)
+        n_trials = warm_start_trials(n_trials)
+        print(f"\tИсследование {study_name} продолжено: "
+              f"{n_trials} испытаний.")
+    first_number = len(study.get_trials(deepcopy=False))
+    _optimize_study(study, storage_path, objective, n_trials, n_jobs,
+                    pruner)
+    study = optuna.load_study(study_name=study_name, storage=storage)
+    current = [
+        trial for trial in study.get_trials(
+            deepcopy=False, states=(TrialState.COMPLETE,))
+        if trial.number >= first_number
+    ]
+    if not current:
+        return study.best_params, study.best_value
+    best = max(current, key=lambda trial: trial.value)
+    return best.params, best.value
+
+
+# Запуск исследования Optuna последовательно или в пуле процессов
+def run_study(
+        objective: Any,
+        n_trials: int,
+        n_jobs: Optional[int] = None,
+        pruner: Optional[str] = None,
+        storage_path: Optional[str] = None,
+        study_name: Optional[str] = None
+) -> Tuple[Dict[str, Any], float]:
+    """Выполняет n_trials испытаний objective и возвращает лучшие
+    параметры и значение. pruner - имя прунера для make_pruner.
+
+    При n_jobs > 1 испытания распределяются по пулу процессов, которые
+    разделяют состояние сэмплера через файловое хранилище
+    (JournalStorage). objective должна сериализоваться pickle.
+    Если задан storage_path, исследование study_name сохраняется
+    и продолжается при следующих запусках.
+    """
+    optuna.logging.get_logger("optuna").setLevel(logging.WARNING)
+    n_jobs = default_n_jobs() if n_jobs is None else max(1, n_jobs)
+    if storage_path is not None:
+        return _run_persistent_study(objective, n_trials, n_jobs, pruner,
+                                     storage_path, study_name)
+    if min(n_jobs, n_trials) <= 1:
+        study = optuna.create_study(direction='maximize',
+                                    pruner=make_pruner(pruner))
+        _optimize_study(study, None, objective, n_trials, 1, pruner)
+        return study.best_params, study.best_value
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        storage_path = os.path.join(tmp_dir, "study.log")
+        storage = JournalStorage(JournalFileBackend(storage_path))
+        study = optuna.create_study(direction='maximize', storage=storage,
+                                    pruner=make_pruner(pruner))
+        _optimize_study(study, storage_path, objective, n_trials, n_jobs,
+                        pruner)
+        # Итоги читаются до удаления файла хранилища
+        study = optuna.load_study(study_name=study.study_name,
+                                  storage=storage)
+        return study.best_params, study.best_value
+
+
 # Objective для кластеризации
 def objective_claster(
         trial: optuna.Trial,
         model_class: Type[Any],
         param_grid: Dict[str, Any],
-        X: np.ndarray
+        X: np.ndarray,
+        scoring: Optional[str] = None,
+        precomputed: Optional[PrecomputedDistances] = None
 ) -> float:
-    """Objective-функция для подбора гиперпараметров кластеризации."""
+    """Objective-функция для подбора гиперпараметров кластеризации.
+    scoring - метрика из cluster_scoring (по умолчанию - по размеру
+    данных), precomputed - расстояния, общие для всех испытаний."""
     optuna.logging.get_logger("optuna").setLevel(logging.WARNING)
     params = {}
 
@@ -138,13 +479,21 @@ def objective_claster(
                 param_name, param_range
             )
 
-    model = model_class(**params)
-    model.fit(X)
+    distances = None
+    fit_params, X_fit = params, X
+    if precomputed is not None:
+        fit_params, X_fit = precomputed.fit_input(model_class, params, X)
+        distances = precomputed.dense
+    fit_params = {**fit_params,
+                  **clusterization_methods.search_model_params(model_class)}
+    model = model_class(**fit_params)
+    model.fit(X_fit)
     labels = model.labels_
-    score = silhouette_score(X, labels)
-    if np.isnan(score):
-        return -1
-    return score
+    score = cluster_scoring.score_clustering(X, labels, scoring, distances)
+    trial.set_user_attr("score_method", score.method)
+    if score.ci_low is not None:
+        trial.set_user_attr("score_ci", [score.ci_low, score.ci_high])
+    return score.value
 
 
 # Оптимизация гиперпараметров кластеризации
@@ -152,20 +501,37 @@ def optimize_hyperparameters_claster(
         model_class: Type[Any],
         param_grid: Dict[str, Any],
         X: np.ndarray,
-        n_trials: int = 50
+        n_trials: int = 50,
+        n_jobs: Optional[int] = None,
+        scoring: Optional[str] = None,
+        study_key: Optional[str] = None
 ) -> Tuple[Dict[str, Any], float]:
-    """Оптимизация гиперпараметров для кластеризации."""
-    optuna.logging.get_logger("optuna").setLevel(logging.WARNING)
-    study = optuna.create_study(direction='maximize')
-
-    with warnings.catch_warnings():
-        warnings.simplefilter("ignore", category=UserWarning)
-        warnings.simplefilter("ignore", category=RuntimeWarning)
-        study.optimize(
-            lambda trial: objective_claster(trial, model_class, param_grid, X),
-            n_trials=n_trials,
-        )
-    return study.best_params, study.best_value
+    """Оптимизация гиперпараметров для кластеризации.
+    n_jobs - число процессов (по умолчанию OPTUNA_N_JOBS),
+    scoring - метрика испытаний (по умолчанию - по размеру данных),
+    study_key - оборудование, история исследований которого
+    сохраняется и используется при следующем обучении."""
+    param_grid = plain_param_grid(param_grid)
+    # Потоковые методы подбираются на равномерной выборке строк
+    if hasattr(model_class, "partial_fit") and len(X) > STREAM_SEARCH_ROWS:
+        rng = np.random.default_rng(42)
+        X = X[rng.choice(len(X), size=STREAM_SEARCH_ROWS, replace=False)]
+    # Метрика фиксируется до запуска: оценки разных метрик
+    # несравнимы и хранятся в разных исследованиях
+    scoring = scoring or cluster_scoring.select_scorer(len(X))
+    # Расстояния вычисляются один раз на все испытания
+    precomputed = precompute_distances(model_class, param_grid, X)
+    objective = functools.partial(
+        objective_claster, model_class=model_class,
+        param_grid=param_grid, X=X, scoring=scoring,
+        precomputed=precomputed
+    )
+    if study_key is None:
+        return run_study(objective, n_trials, n_jobs)
+    return run_study(objective, n_trials, n_jobs,
+                     storage_path=study_storage_path(study_key),
+                     study_name=study_name_for(f"claster_{scoring}",
+                                               model_class, param_grid))
 
 
 # Objective для классификации
@@ -192,7 +558,18 @@ def objective_classif(
 
     model = model_class(**params)
     cv = StratifiedKFold(n_splits=5, shuffle=True, random_state=42)
-    score = cross_val_score(model, X, y, scoring='accuracy', cv=cv).mean()
+    # Оценка по фолдам: промежуточная точность передается прунеру
+    fold_scores = []
+    for step, (train_idx, test_idx) in enumerate(cv.split(X, y)):
+        try:
+            fold_model = clone(model).fit(X[train_idx], y[train_idx])
+            fold_scores.append(fold_model.score(X[test_idx], y[test_idx]))
+        except Exception:
+            return -1
+        trial.report(float(np.mean(fold_scores)), step)
+        if trial.should_prune():
+            raise optuna.TrialPruned()
+    score = np.mean(fold_scores)
     if np.isnan(score):
         return -1
     return score
@@ -204,22 +581,36 @@ def optimize_hyperparameters_classif(
         param_grid: Dict[str, Any],
         X: np.ndarray,
         y: np.ndarray,
-        n_trials: int = 50
+        n_trials: int = 50,
+        n_jobs: Optional[int] = None,
+        pruner: Optional[str] = "median",
+        study_key: Optional[str] = None
 ) -> Tuple[Dict[str, Any], float]:
-    """Оптимизация гиперпараметров для классификации."""
-    optuna.logging.get_logger("optuna").setLevel(logging.WARNING)
-    study = optuna.create_study(direction='maximize')
-
-    with warnings.catch_warnings():
-        warnings.simplefilter("ignore", category=UserWarning)
-        warnings.simplefilter("ignore", category=RuntimeWarning)
-        study.optimize(
-            lambda trial: objective_classif(
-                trial, model_class, param_grid, X, y
-            ),
-            n_trials=n_trials,
-        )
-    return study.best_params, study.best_value
+    """Оптимизация гиперпараметров для классификации.
+    n_jobs - число процессов (по умолчанию OPTUNA_N_JOBS),
+    pruner - отсечение слабых испытаний по первым фолдам,
+    study_key - оборудование, история исследований которого
+    сохраняется и используется при следующем обучении."""
+    param_grid = plain_param_grid(param_grid)
+    objective = functools.partial(
+        objective_classif, model_class=model_class,
+        param_grid=param_grid, X=np.asarray(X), y=np.asarray(y)
+    )
+    if study_key is None:
+        return run_study(objective, n_trials, n_jobs, pruner)
+    return run_study(objective, n_trials, n_jobs, pruner,
+                     storage_path=study_storage_path(study_key),
+                     study_name=study_name_for("classif", model_class,
+                                               param_grid))
+
+
+# Разбор ограничения строк
+def parse_str_limit(str_limit: Optional[str]) -> Optional[Tuple[int, int]]:
+    """Преобразует ограничение вида "1:21" в кортеж (начало, конец)."""
+    if not str_limit:
+        return None
+    start_index, end_index = map(int, str_limit.split(':'))
+    return start_index, end_index
 
 
 # Обработка ограничений строк
@@ -228,7 +619,7 @@ async def processing_limit_str(
         str_limit: str
 ) -> List[List[Any]]:
     """Фильтрует список строк на основе диапазона и наличия строки 'Предел'."""
-    start_index, end_index = map(int, str_limit.split(':'))
+    start_index, end_index = parse_str_limit(str_limit)
     filtered_data = [
         row for row in data
         if start_index <= row[0] <= end_index or row[-1] == "Предел"
@@ -124,3 +124,54 @@ def test_delete(mock_delete, base_data, mock_post_response):
         f"{BASE_URL}/delete",
         json=data,
     )
+
+
+@patch("requests.post")
+def test_train_batch(mock_post, base_data, mock_post_response):
+    mock_post.return_value = mock_post_response(json_data={
+        "data": [{"machine": "bake_cooling_system_learn",
+                  "status": "done", "seconds": 12.5}],
+        "failed": 0,
+        "seconds": 12.6,
+    })
+    data = base_data.copy()
+    data.update({
+        "name_database_data": "bake_data",
+        "tables_for_learn": ["bake_cooling_system_learn",
+                             "bake_heating_system_learn"],
+        "max_concurrency": 2,
+    })
+    response = requests.post(f"{BASE_URL}/train_batch", json=data)
+    assert response.status_code == 200
+    assert response.json()["failed"] == 0
+
+    # Проверяем на верный адрес запроса
+    mock_post.assert_called_once_with(
+        f"{BASE_URL}/train_batch",
+        json=data,
+    )
+
+
+@patch("requests.get")
+@patch("requests.post")
+def test_train_job_polling(mock_post, mock_get, base_data,
+                           mock_post_response, mock_get_response):
+    mock_post.return_value = mock_post_response(
+        json_data={"job_id": "abc", "status": "queued"})
+    mock_get.return_value = mock_get_response(
+        json_data={"job_id": "abc", "status": "running",
+                   "trials_completed": 12, "best_value": 0.71})
+    data = base_data.copy()
+    data.update({
+        "name_database_data": "bake_data",
+        "name_table_for_learn": "bake_cooling_system_learn",
+        "task_manager": "LEARN",
+    })
+    response = requests.post(f"{BASE_URL}/jobs/train", json=data)
+    job_id = response.json()["job_id"]
+    progress = requests.get(f"{BASE_URL}/jobs/{job_id}/progress")
+    assert progress.json()["trials_completed"] == 12
+
+    # Проверяем на верный адрес запроса
+    mock_post.assert_called_once_with(f"{BASE_URL}/jobs/train", json=data)
+    mock_get.assert_called_once_with(f"{BASE_URL}/jobs/abc/progress")
@@ -0,0 +1,56 @@
+import pickle
+
+import numpy as np
+import pytest
+from sklearn.naive_bayes import GaussianNB
+from sklearn.tree import DecisionTreeClassifier
+
+from src.analysis import classification_methods
+
+
+@pytest.fixture
+def two_classes():
+    rng = np.random.default_rng(0)
+    X = np.vstack([
+        rng.normal(0.0, 0.5, size=(50, 2)),
+        rng.normal(4.0, 0.5, size=(50, 2)),
+    ])
+    y = np.array([0] * 50 + [1] * 50)
+    return X, y
+
+
+def test_partial_fit_updates_copy(two_classes):
+    X, y = two_classes
+    model = GaussianNB().fit(X[::2], y[::2])
+
+    updated, accuracy = classification_methods.partial_fit_classif(
+        pickle.dumps(model), X[1::2], y[1::2]
+    )
+
+    assert accuracy == 1.0
+    assert updated is not model
+    assert updated.class_count_.sum() == 100
+    assert model.class_count_.sum() == 50
+
+
+def test_partial_fit_rejects_unseen_classes(two_classes):
+    X, y = two_classes
+    model = GaussianNB().fit(X, y)
+
+    with pytest.raises(ValueError):
+        classification_methods.partial_fit_classif(
+            model, X[:3], np.array([0, 1, 2])
+        )
+
+
+def test_supports_partial_fit(two_classes):
+    X, y = two_classes
+    y_pred, model, y_test = classification_methods.data_sgd_classif(
+        None, None, X, y, {"loss": "hinge", "alpha": 1e-4}
+    )
+
+    assert (y_pred == y_test).mean() > 0.9
+    assert classification_methods.supports_partial_fit(model)
+    assert not classification_methods.supports_partial_fit(
+        DecisionTreeClassifier().fit(X, y)
+    )
@@ -0,0 +1,53 @@
+import numpy as np
+import pytest
+from sklearn.metrics import silhouette_score
+
+from src.analysis import cluster_scoring
+
+
+@pytest.fixture
+def blobs():
+    rng = np.random.default_rng(0)
+    X = np.vstack([
+        rng.normal(0.0, 0.3, size=(900, 2)),
+        rng.normal(4.0, 0.3, size=(100, 2)),
+    ])
+    labels = np.array([0] * 900 + [1] * 100)
+    return X, labels
+
+
+def test_select_scorer_by_size():
+    assert cluster_scoring.select_scorer(500) == "silhouette"
+    assert cluster_scoring.select_scorer(50000) == "stratified_silhouette"
+    assert cluster_scoring.select_scorer(10 ** 6) == "calinski_harabasz"
+
+
+def test_sampled_scores_are_close_to_full(blobs):
+    X, labels = blobs
+    full = silhouette_score(X, labels)
+    for method in ("sampled_silhouette", "stratified_silhouette"):
+        score = cluster_scoring.SCORERS[method](X, labels, sample_size=200)
+        assert score.method == method
+        assert score.ci_low <= score.value <= score.ci_high
+        assert abs(score.value - full) < 0.05
+
+
+def test_stratified_sample_keeps_small_clusters():
+    labels = np.array([0] * 1000 + [1] * 3)
+    idx = cluster_scoring.stratified_sample(
+        labels, 50, np.random.default_rng(0))
+    assert (labels[idx] == 1).sum() >= 2
+
+
+def test_bounded_linear_scores(blobs):
+    X, labels = blobs
+    for method in ("calinski_harabasz", "davies_bouldin"):
+        score = cluster_scoring.score_clustering(X, labels, method)
+        assert 0 < score.value <= 1
+
+
+def test_degenerate_labels_score_minus_one(blobs):
+    X, _ = blobs
+    score = cluster_scoring.score_clustering(X, np.zeros(len(X)))
+    assert score.value == -1
+    assert cluster_scoring.final_score(X, np.zeros(len(X))).value == -1
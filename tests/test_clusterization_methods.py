@@ -0,0 +1,122 @@
+import pickle
+
+import numpy as np
+import pytest
+from sklearn.cluster import AgglomerativeClustering, MiniBatchKMeans
+
+from src.analysis import clusterization_methods, two_methods_included
+from src.analysis.clusterization_methods import ClusterAssigner
+
+
+@pytest.fixture
+def blobs():
+    rng = np.random.default_rng(0)
+    return np.vstack([
+        rng.normal(0.0, 0.1, size=(20, 2)),
+        rng.normal(5.0, 0.1, size=(20, 2)),
+    ])
+
+
+def test_dbscan_predict_uses_core_samples(blobs):
+    labels, model = clusterization_methods.data_dbscan_cluster(
+        blobs, {"eps": 0.5, "min_samples": 3}
+    )
+    assert isinstance(model, ClusterAssigner)
+
+    new_points = np.array([[0.05, 0.0], [5.0, 5.05], [20.0, 20.0]])
+    predicted = clusterization_methods.data_dbscan_cluster(
+        new_points, None, pickle.dumps(model)
+    )
+    assert predicted[0] == labels[0]
+    assert predicted[1] == labels[-1]
+    assert predicted[2] == -1
+
+
+def test_agglomerative_predict_keeps_training_labels(blobs):
+    labels, model = clusterization_methods.data_agglclust_cluster(
+        blobs, {"n_clusters": 2, "linkage": "ward"}
+    )
+    predicted = clusterization_methods.data_agglclust_cluster(
+        blobs, None, model
+    )
+    assert np.array_equal(predicted, labels)
+    assert model.params["n_clusters"] == 2
+
+
+def test_legacy_model_without_predict_is_refitted(blobs):
+    legacy = AgglomerativeClustering(n_clusters=2)
+    predicted = clusterization_methods.data_agglclust_cluster(
+        blobs, None, pickle.dumps(legacy)
+    )
+    assert len(set(predicted)) == 2
+
+
+def test_agglomerative_tree_is_built_once(blobs, monkeypatch, tmp_path):
+    monkeypatch.setenv("AGGLOMERATIVE_CACHE_DIR", str(tmp_path))
+    for n_clusters in (2, 3, 4):
+        labels, model = clusterization_methods.data_agglclust_cluster(
+            blobs, {"n_clusters": n_clusters, "linkage": "ward"}
+        )
+        assert len(set(labels)) == n_clusters
+        assert "memory" not in model.params
+
+    cached_trees = list(tmp_path.rglob("output.pkl"))
+    assert len(cached_trees) == 1
+
+
+@pytest.mark.parametrize("linkage", ["ward", "complete", "average"])
+def test_agglomerative_final_fit_reuses_search_tree(blobs, monkeypatch,
+                                                    tmp_path, linkage):
+    monkeypatch.setenv("AGGLOMERATIVE_CACHE_DIR", str(tmp_path))
+    best_params, _ = two_methods_included.optimize_hyperparameters_claster(
+        AgglomerativeClustering,
+        {"n_clusters": [2, 3, 4], "linkage": [linkage]},
+        blobs, n_trials=5, n_jobs=1
+    )
+    trees_after_search = len(list(tmp_path.rglob("output.pkl")))
+
+    labels, _ = clusterization_methods.data_agglclust_cluster(
+        blobs, best_params
+    )
+
+    assert trees_after_search == 1
+    assert len(list(tmp_path.rglob("output.pkl"))) == 1
+    assert len(set(labels)) == best_params["n_clusters"]
+
+
+@pytest.mark.parametrize("cluster_function, params", [
+    (clusterization_methods.data_minibatch_kmeans_cluster,
+     {"n_clusters": 2, "batch_size": 16}),
+    (clusterization_methods.data_birch_cluster,
+     {"n_clusters": 2, "threshold": 0.5, "branching_factor": 50}),
+])
+def test_streaming_methods_fit_in_batches(blobs, cluster_function, params):
+    labels, model = cluster_function(blobs, params, batch_rows=7)
+
+    assert len(set(labels[:20])) == 1 and len(set(labels[20:])) == 1
+    assert labels[0] != labels[-1]
+    predicted = cluster_function(blobs, None, pickle.dumps(model),
+                                 batch_rows=7)
+    assert np.array_equal(predicted, labels)
+
+
+def test_minibatch_kmeans_fits_tuned_batch_size(blobs, monkeypatch):
+    sizes = []
+    partial_fit = MiniBatchKMeans.partial_fit
+
+    def record_partial_fit(self, X, *args, **kwargs):
+        sizes.append(len(X))
+        return partial_fit(self, X, *args, **kwargs)
+
+    monkeypatch.setattr(MiniBatchKMeans, "partial_fit", record_partial_fit)
+    _, model = clusterization_methods.data_minibatch_kmeans_cluster(
+        blobs, {"n_clusters": 2, "batch_size": 16}, batch_rows=7
+    )
+
+    assert max(sizes) == 16
+    # Испытания создают модель с той же инициализацией
+    search_params = clusterization_methods.search_model_params(
+        MiniBatchKMeans)
+    assert model.get_params()["n_init"] == search_params["n_init"]
+    assert model.get_params()["random_state"] == \
+        search_params["random_state"]
@@ -1,7 +1,14 @@
 import pytest
+import datetime
 import pickle
-from unittest.mock import AsyncMock, patch, ANY
-from src.analysis.connector import DatabaseConnector
+import struct
+import zlib
+import numpy as np
+from unittest.mock import AsyncMock, MagicMock, patch, ANY
+from src.analysis.connector import DatabaseConnector, \
+    best_model_id_sql, decode_binary_copy, split_table_columns
+from src.analysis.pool_registry import PoolRegistry
+from src.analysis.model_cache import model_cache
 from fastapi import HTTPException
 import asyncpg
 
@@ -11,14 +18,21 @@ def connector():
     return DatabaseConnector("localhost", 5432, "db", "user", "pass")
 
 
+@pytest.fixture
+def direct_connector():
+    return DatabaseConnector("localhost", 5432, "db", "user", "pass",
+                             use_pool=False)
+
+
 # CONNECT
 @pytest.mark.asyncio
 @patch("src.analysis.connector.asyncpg.connect", new_callable=AsyncMock)
-async def test_connect_passes_required_params(mock_connect, connector):
+async def test_connect_passes_required_params(mock_connect,
+                                              direct_connector):
     mock_conn = AsyncMock()
     mock_connect.return_value = mock_conn
 
-    conn = await connector.connect()
+    conn = await direct_connector.connect()
 
     assert conn is mock_conn
     mock_connect.assert_awaited_once_with(
@@ -32,13 +46,74 @@ async def test_connect_passes_required_params(mock_connect, connector):
 
 @pytest.mark.asyncio
 @patch("src.analysis.connector.asyncpg.connect", new_callable=AsyncMock)
-async def test_connect_error(mock_connect, connector):
+async def test_connect_error(mock_connect, direct_connector):
     mock_connect.side_effect = asyncpg.PostgresError("boom")
     with pytest.raises(HTTPException) as ei:
-        await connector.connect()
+        await direct_connector.connect()
     assert "Database connection error" in ei.value.detail
 
 
+# CONNECT через пул
+@pytest.mark.asyncio
+@patch("src.analysis.connector.pool_registry.acquire", new_callable=AsyncMock)
+@patch("src.analysis.connector.pool_registry.release", new_callable=AsyncMock)
+async def test_connect_and_close_use_pool(mock_release, mock_acquire,
+                                          connector):
+    mock_pool = AsyncMock()
+    mock_conn = AsyncMock()
+    mock_acquire.return_value = (mock_pool, mock_conn)
+
+    conn = await connector.connect()
+    assert conn is mock_conn
+    mock_acquire.assert_awaited_once_with(
+        "localhost", 5432, "db", "user", "pass"
+    )
+
+    await connector.close()
+    mock_release.assert_awaited_once_with(mock_pool, mock_conn)
+    mock_conn.close.assert_not_awaited()
+    assert connector.conn is None
+
+
+@pytest.mark.asyncio
+@patch("src.analysis.pool_registry.asyncpg.create_pool",
+       new_callable=AsyncMock)
+async def test_pool_registry_reuses_pool(mock_create_pool):
+    mock_pool = AsyncMock()
+    mock_pool.is_closing = lambda: False
+    mock_create_pool.return_value = mock_pool
+    registry = PoolRegistry(min_size=1, max_size=4)
+
+    pool_a, _ = await registry.acquire("h", 5432, "db", "u", "p")
+    pool_b, _ = await registry.acquire("h", 5432, "db", "u", "p")
+
+    assert pool_a is pool_b
+    mock_create_pool.assert_awaited_once_with(
+        user="u", password="p", database="db", host="h", port=5432,
+        min_size=1, max_size=4,
+        max_inactive_connection_lifetime=300.0,
+    )
+    key = registry.make_key("h", 5432, "db", "u", "p")
+    assert registry._stats[key]["acquired"] == 2
+
+
+@pytest.mark.asyncio
+@patch("src.analysis.pool_registry.asyncpg.create_pool",
+       new_callable=AsyncMock)
+async def test_pool_registry_separates_passwords(mock_create_pool):
+    mock_create_pool.side_effect = lambda **kwargs: MagicMock(
+        is_closing=lambda: False, acquire=AsyncMock())
+    registry = PoolRegistry()
+
+    pool_a, _ = await registry.acquire("h", 5432, "db", "u", "right")
+    pool_b, _ = await registry.acquire("h", 5432, "db", "u", "wrong")
+
+    assert pool_a is not pool_b
+    assert mock_create_pool.await_args_list[1].kwargs["password"] == \
+        "wrong"
+    assert "right" not in repr(registry._pools)
+
+
 # check_table_exists
 @pytest.mark.asyncio
 async def test_check_table_exists(connector):
@@ -123,6 +198,25 @@ async def test_delete_table_agent(connector):
     mock_conn.execute.assert_awaited_once()
 
 
+# clear_agent_tables
+@pytest.mark.asyncio
+async def test_clear_agent_tables_single_truncate():
+    connector = DatabaseConnector("clear-host", 5432, "agent",
+                                  "user", "pass")
+    mock_conn = AsyncMock()
+    connector.conn = mock_conn
+    mock_conn.fetch.return_value = [{"tablename": "predictions_bake_1"}]
+
+    await connector.clear_agent_tables()
+
+    query = mock_conn.execute.call_args[0][0]
+    assert mock_conn.execute.await_count == 6  # 5 bootstrap + TRUNCATE
+    assert query.startswith("TRUNCATE TABLE public.data_classif, ")
+    for table_name in ("active_model", "model_blobs", "watermarks",
+                       "predictions_bake_1"):
+        assert f"public.{table_name}" in query
+
+
 # close
 @pytest.mark.asyncio
 async def test_close_calls(connector):
@@ -131,3 +225,556 @@ async def test_close_calls(connector):
 
     await connector.close()
     mock_conn.close.assert_awaited_once()
+
+
+class FakeRecord(tuple):
+    """Упрощенная запись asyncpg: доступ по индексу и keys()."""
+    columns = ("id", "time", "temp", "press", "label")
+
+    def keys(self):
+        return list(self.columns)
+
+
+# iter_table_chunks
+@pytest.mark.asyncio
+async def test_iter_table_chunks(connector):
+    rows = [FakeRecord((i, f"t{i}", float(i), None, "Норма"))
+            for i in range(5)]
+    cursor = AsyncMock()
+    cursor.fetch.side_effect = [rows[:3], rows[3:], []]
+    mock_conn = MagicMock()
+    mock_conn.cursor = AsyncMock(return_value=cursor)
+    mock_conn.transaction.return_value.__aenter__ = AsyncMock()
+    mock_conn.transaction.return_value.__aexit__ = AsyncMock(
+        return_value=False)
+    connector.conn = mock_conn
+    connector.get_table_layout = AsyncMock(return_value=(
+        split_table_columns(list(FakeRecord.columns), with_labels=True),
+        {},
+    ))
+
+    chunks = [chunk async for chunk in connector.iter_table_chunks(
+        "sensor", chunk_rows=3, with_labels=True)]
+
+    assert [len(chunk.ids) for chunk in chunks] == [3, 2]
+    assert chunks[0].features.shape == (3, 2)
+    assert chunks[0].features.dtype == np.float64
+    assert np.isnan(chunks[0].features[0, 1])
+    assert list(chunks[1].times[:, 0]) == ["t3", "t4"]
+    assert list(chunks[1].labels) == ["Норма", "Норма"]
+    cursor.fetch.assert_awaited_with(3)
+    assert '"temp", "press"' in mock_conn.cursor.call_args[0][0]
+
+
+@pytest.mark.asyncio
+async def test_iter_table_chunks_filters_in_sql(connector):
+    cursor = AsyncMock()
+    cursor.fetch.side_effect = [[]]
+    mock_conn = MagicMock()
+    mock_conn.cursor = AsyncMock(return_value=cursor)
+    mock_conn.transaction.return_value.__aenter__ = AsyncMock()
+    mock_conn.transaction.return_value.__aexit__ = AsyncMock(
+        return_value=False)
+    connector.conn = mock_conn
+    connector.get_table_layout = AsyncMock(return_value=(
+        split_table_columns(list(FakeRecord.columns), with_labels=False),
+        {"time": "timestamp"},
+    ))
+
+    chunks = [chunk async for chunk in connector.iter_table_chunks(
+        "sensor", id_range=(1, 21), time_range=("2024-01-01", None))]
+
+    assert chunks == []
+    query, *args = mock_conn.cursor.call_args[0]
+    assert '"id" >= $1 AND "id" <= $2' in query
+    assert '"time" >= ($3::text)::timestamp' in query
+    assert args == [1, 21, "2024-01-01"]
+
+
+# get_table_schema
+@pytest.mark.asyncio
+async def test_get_table_schema_is_cached_by_catalog_version(connector):
+    mock_conn = AsyncMock()
+    connector.conn = mock_conn
+    mock_conn.fetchval.side_effect = ["v1", "v1", "v2"]
+    mock_conn.fetch.return_value = [("id", "int4"), ("temp", "float8")]
+
+    first = await connector.get_table_schema("Cached_Table")
+    second = await connector.get_table_schema("Cached_Table")
+    assert first == second == [("id", "int4"), ("temp", "float8")]
+    assert mock_conn.fetch.await_count == 1
+
+    await connector.get_table_schema("Cached_Table")
+    assert mock_conn.fetch.await_count == 2
+
+
+# get_table_layout
+@pytest.mark.asyncio
+async def test_get_table_layout_projects_numeric_features(connector):
+    connector.get_table_schema = AsyncMock(return_value=[
+        ("id", "int4"), ("event_time", "timestamp"), ("temp", "float8"),
+        ("comment", "text"), ("pressure", "numeric"), ("label", "text"),
+    ])
+
+    layout, types = await connector.get_table_layout("sensor",
+                                                     with_labels=True)
+
+    assert layout.feature_columns == ["temp", "pressure"]
+    assert layout.time_columns == ["event_time"]
+    assert layout.label_column == "label"
+    assert types["comment"] == "text"
+
+
+def _binary_copy_stream(rows):
+    """Собирает поток COPY (FORMAT binary) из строк 8-байтовых полей."""
+    out = bytearray(b"PGCOPY\n\xff\r\n\x00")
+    out += struct.pack(">ii", 0, 0)
+    for row in rows:
+        out += struct.pack(">h", len(row))
+        for fmt, value in row:
+            out += struct.pack(">i" + fmt, 8, value)
+    out += struct.pack(">h", -1)
+    return bytes(out)
+
+
+# decode_binary_copy
+def test_decode_binary_copy():
+    layout = split_table_columns(["id", "time", "temp", "label"],
+                                 with_labels=True)
+    types = {"id": "int4", "time": "timestamp", "temp": "float8",
+             "label": "text"}
+    stream = _binary_copy_stream([
+        [("q", 1), ("q", 1_000_000), ("d", 1.5), ("q", 2)],
+        [("q", 2), ("q", -2 ** 63), ("d", float("nan")), ("q", 0)],
+    ])
+
+    chunk = decode_binary_copy(stream, layout, types, ["Норма", "Предел"])
+
+    assert list(chunk.ids) == [1, 2]
+    assert chunk.times[0, 0] == datetime.datetime(2000, 1, 1, 0, 0, 1)
+    assert chunk.times[1, 0] is None
+    assert chunk.features[0, 0] == 1.5
+    assert np.isnan(chunk.features[1, 0])
+    assert list(chunk.labels) == ["Предел", None]
+
+
+def test_decode_binary_copy_timestamptz_is_utc():
+    layout = split_table_columns(["id", "time", "temp"])
+    types = {"id": "int8", "time": "timestamptz", "temp": "float8"}
+    stream = bytearray(_binary_copy_stream([
+        [("q", 1), ("q", 1_000_000), ("d", 1.5)],
+        [("q", 2), ("q", -2 ** 63), ("d", 2.5)],
+    ]))
+
+    chunk = decode_binary_copy(stream, layout, types)
+
+    assert chunk.times[0, 0] == datetime.datetime(
+        2000, 1, 1, 0, 0, 1, tzinfo=datetime.timezone.utc)
+    assert chunk.times[0, 0].tzinfo is datetime.timezone.utc
+    assert chunk.times[1, 0] is None
+
+
+# export_table_binary
+@pytest.mark.asyncio
+async def test_export_table_binary(connector):
+    connector.get_table_schema = AsyncMock(
+        return_value=[("id", "int8"), ("temp", "float8")]
+    )
+    stream = _binary_copy_stream([[("q", 7), ("d", 2.5)]])
+
+    async def copy_from_query(query, *args, output, format):
+        assert format == "binary"
+        await output(stream)
+
+    mock_conn = AsyncMock()
+    mock_conn.copy_from_query.side_effect = copy_from_query
+    connector.conn = mock_conn
+
+    chunk = await connector.export_table_binary("sensor")
+
+    assert list(chunk.ids) == [7]
+    assert chunk.features.tolist() == [[2.5]]
+    assert chunk.labels is None
+
+
+# table_fingerprint / find_models_by_fingerprint
+@pytest.mark.asyncio
+async def test_table_fingerprint(connector):
+    mock_conn = AsyncMock()
+    connector.conn = mock_conn
+    connector.get_table_layout = AsyncMock(return_value=(
+        split_table_columns(list(FakeRecord.columns), with_labels=True),
+        {},
+    ))
+    mock_conn.fetchval.return_value = "5:4:123"
+
+    assert await connector.table_fingerprint("sensor") == "5:4:123"
+    query = mock_conn.fetchval.call_args[0][0]
+    assert "count(*)" in query and 'max("id")' in query
+    assert 'hashtextextended(ROW("id", "time", "temp", "press", "label")' \
+        in query
+
+
+@pytest.mark.asyncio
+async def test_find_models_by_fingerprint(connector):
+    mock_conn = AsyncMock()
+    connector.conn = mock_conn
+    mock_conn.fetchrow.return_value = {"data_classif": 7, "data_claster": 3}
+
+    models = await connector.find_models_by_fingerprint("bake_1", "5:4:1")
+    assert models == {"data_classif": 7, "data_claster": 3}
+    assert mock_conn.fetchrow.call_args[0][1:] == ("bake_1", "5:4:1")
+
+    mock_conn.fetchrow.return_value = {"data_classif": 7,
+                                       "data_claster": None}
+    assert await connector.find_models_by_fingerprint(
+        "bake_1", "5:4:1") is None
+
+
+# ensure_filter_indexes
+@pytest.mark.asyncio
+async def test_ensure_filter_indexes(connector):
+    mock_conn = AsyncMock()
+    connector.conn = mock_conn
+    connector.get_table_layout = AsyncMock(return_value=(
+        split_table_columns(["id", "time", "temp"], with_labels=False),
+        {},
+    ))
+
+    await connector.ensure_filter_indexes("sensor")
+
+    queries = [c[0][0] for c in mock_conn.execute.call_args_list]
+    assert "sensor_id_btree" in queries[0]
+    assert "USING brin" in queries[1] and '"time"' in queries[1]
+
+
+# get_best_model
+@pytest.mark.asyncio
+async def test_get_best_model(connector):
+    mock_conn = AsyncMock()
+    connector.conn = mock_conn
+    mock_conn.fetchrow.return_value = {"id": 3, "machine": "bake_1"}
+
+    res = await connector.get_best_model("data_claster", "bake_1")
+    assert res["id"] == 3 and res["machine"] == "bake_1"
+    assert res["model_table"] == "data_claster"
+
+    # args: (sql, machine, prefix_pattern)
+    args = mock_conn.fetchrow.call_args[0]
+    assert "LIMIT 1" in args[0]
+    assert args[1:] == ("bake_1", "bake\\_1%")
+
+
+@pytest.mark.asyncio
+async def test_get_best_model_missing(connector):
+    mock_conn = AsyncMock()
+    connector.conn = mock_conn
+    mock_conn.fetchrow.return_value = None
+
+    assert await connector.get_best_model("data_classif", "none") is None
+
+
+# get_best_models
+@pytest.mark.asyncio
+async def test_get_best_models_single_query(connector):
+    mock_conn = AsyncMock()
+    connector.conn = mock_conn
+    mock_conn.fetch.return_value = [
+        {"model_table": "data_claster", "id": 1, "method": "KMeans"},
+    ]
+
+    models = await connector.get_best_models("bake_1")
+
+    mock_conn.fetch.assert_awaited_once()
+    assert "UNION ALL" in mock_conn.fetch.call_args[0][0]
+    assert models["data_claster"]["method"] == "KMeans"
+    assert models["data_classif"] is None
+
+
+# set_active_model
+@pytest.mark.asyncio
+async def test_set_active_model(connector):
+    mock_conn = AsyncMock()
+    connector.conn = mock_conn
+    mock_conn.execute.return_value = "INSERT 0 1"
+
+    assert await connector.set_active_model("data_classif", "bake_1", 7)
+    args = mock_conn.execute.call_args[0]
+    assert args[1:] == ("bake_1", "data_classif", 7)
+    # Указатель записывается только на модель этого оборудования
+    assert "WHERE id = $3 AND machine = $1" in args[0]
+
+    mock_conn.execute.return_value = "INSERT 0 0"
+    assert not await connector.set_active_model("data_classif",
+                                                "bake_1", 8)
+
+
+# clear_active_model
+@pytest.mark.asyncio
+async def test_clear_active_model(connector):
+    mock_conn = AsyncMock()
+    connector.conn = mock_conn
+    mock_conn.execute.return_value = "DELETE 1"
+
+    assert await connector.clear_active_model("data_classif", "bake_1")
+    assert mock_conn.execute.call_args[0][1:] == ("bake_1", "data_classif")
+
+    mock_conn.execute.return_value = "DELETE 0"
+    assert not await connector.clear_active_model("data_classif", "bake_1")
+
+
+# Указатель на удаленную модель не мешает выбору лучшей модели
+def test_best_model_id_sql_skips_dangling_pointer():
+    sql = best_model_id_sql("data_classif")
+    pointer = sql[:sql.index("), (")]
+    assert "JOIN public.data_classif m" in pointer
+    assert "m.machine = a.machine" in pointer
+
+
+# bootstrap_agent_schema
+@pytest.mark.asyncio
+async def test_bootstrap_agent_schema_runs_once():
+    connector = DatabaseConnector("bootstrap-host", 5432, "agent",
+                                  "user", "pass")
+    mock_conn = AsyncMock()
+    connector.conn = mock_conn
+
+    await connector.bootstrap_agent_schema()
+    first_calls = mock_conn.execute.await_count
+    await connector.bootstrap_agent_schema()
+    assert first_calls == 5
+    assert mock_conn.execute.await_count == first_calls
+
+    # После ошибки "таблица не найдена" схема создается заново
+    connector.forget_table("data_claster")
+    await connector.bootstrap_agent_schema()
+    assert mock_conn.execute.await_count == 2 * first_calls
+
+
+@pytest.mark.asyncio
+async def test_get_best_model_missing_table_resets_bootstrap():
+    connector = DatabaseConnector("missing-host", 5432, "agent",
+                                  "user", "pass")
+    mock_conn = AsyncMock()
+    connector.conn = mock_conn
+    await connector.bootstrap_agent_schema()
+    mock_conn.fetchrow.side_effect = asyncpg.UndefinedTableError("gone")
+
+    with pytest.raises(HTTPException):
+        await connector.get_best_model("data_classif", "bake_1")
+
+    await connector.bootstrap_agent_schema()
+    assert mock_conn.execute.await_count == 10
+
+
+# check_table_exists кэширует найденные таблицы
+@pytest.mark.asyncio
+async def test_check_table_exists_is_cached():
+    connector = DatabaseConnector("cache-host", 5432, "data",
+                                  "user", "pass")
+    mock_conn = AsyncMock()
+    connector.conn = mock_conn
+    mock_conn.fetchval.return_value = True
+
+    assert await connector.check_table_exists("sensor") is True
+    assert await connector.check_table_exists("sensor") is True
+    assert mock_conn.fetchval.await_count == 1
+
+
+# copy_predictions
+@pytest.mark.asyncio
+async def test_copy_predictions_in_batches(connector):
+    mock_conn = AsyncMock()
+    connector.conn = mock_conn
+    records = [(i, None, 0, "Норма", 1, 2) for i in range(5)]
+
+    saved = await connector.copy_predictions("Bake-1", records,
+                                             batch_rows=2)
+
+    assert saved == 5
+    assert mock_conn.copy_records_to_table.await_count == 3
+    args, kwargs = mock_conn.copy_records_to_table.call_args
+    assert args[0] == "predictions_bake_1"
+    assert kwargs["records"] == records[4:]
+    assert kwargs["columns"][:4] == ["id", "ts", "cluster", "label"]
+
+
+# get_watermark / set_watermark
+@pytest.mark.asyncio
+async def test_watermark_roundtrip(connector):
+    mock_conn = AsyncMock()
+    connector.conn = mock_conn
+    mock_conn.fetchval.return_value = 41
+
+    assert await connector.get_watermark("bake_1") == 41
+    assert mock_conn.fetchval.call_args[0][1:] == ("bake_1", "predict")
+
+    await connector.set_watermark("bake_1", 57, "2024-01-01T10:00:00")
+    query, *args = mock_conn.execute.call_args[0]
+    assert "ON CONFLICT (machine, task)" in query
+    assert "GREATEST" in query
+    assert args == ["bake_1", "predict", 57, "2024-01-01T10:00:00"]
+
+
+@pytest.mark.asyncio
+async def test_iter_table_chunks_open_id_range(connector):
+    cursor = AsyncMock()
+    cursor.fetch.side_effect = [[]]
+    mock_conn = MagicMock()
+    mock_conn.cursor = AsyncMock(return_value=cursor)
+    mock_conn.transaction.return_value.__aenter__ = AsyncMock()
+    mock_conn.transaction.return_value.__aexit__ = AsyncMock(
+        return_value=False)
+    connector.conn = mock_conn
+    connector.get_table_layout = AsyncMock(return_value=(
+        split_table_columns(list(FakeRecord.columns), with_labels=False),
+        {},
+    ))
+
+    _ = [chunk async for chunk in connector.iter_table_chunks(
+        "sensor", id_range=(42, None))]
+
+    query, *args = mock_conn.cursor.call_args[0]
+    assert query.endswith('WHERE "id" >= $1')
+    assert args == [42]
+
+
+# store_model_blob / load_model_blobs
+@pytest.mark.asyncio
+async def test_store_and_load_model_blob(connector, monkeypatch):
+    monkeypatch.setattr("src.analysis.connector.MODEL_BLOB_CHUNK_SIZE", 16)
+    mock_conn = AsyncMock()
+    connector.conn = mock_conn
+    mock_conn.fetchval.return_value = False
+    blob = pickle.dumps(list(range(200)))
+
+    model_hash = await connector.store_model_blob(blob)
+
+    chunks = mock_conn.executemany.call_args[0][1]
+    assert len(chunks) > 1
+    assert all(chunk[0] == model_hash for chunk in chunks)
+
+    mock_conn.fetch.return_value = [
+        {"hash": model_hash, "data": chunk[2]} for chunk in chunks
+    ]
+    blobs = await connector.load_model_blobs([model_hash])
+    assert blobs[model_hash] == blob
+
+
+@pytest.mark.asyncio
+async def test_store_model_blob_deduplicates(connector):
+    mock_conn = AsyncMock()
+    connector.conn = mock_conn
+    mock_conn.fetchval.return_value = True
+
+    await connector.store_model_blob(b"same model")
+    mock_conn.executemany.assert_not_awaited()
+
+
+# insert_data
+@pytest.mark.asyncio
+async def test_insert_data_stores_model_reference(connector):
+    mock_conn = AsyncMock()
+    connector.conn = mock_conn
+    mock_conn.fetchval.return_value = True
+
+    await connector.insert_data("data_claster",
+                                {"machine": "bake_1", "model": {"k": 3}})
+
+    query, *values = mock_conn.execute.call_args[0]
+    assert "model_ref" in query
+    assert values[0] == "bake_1"
+    assert len(values[1]) == 64
+
+
+# update_model
+@pytest.mark.asyncio
+async def test_update_model_replaces_reference(connector):
+    mock_conn = AsyncMock()
+    connector.conn = mock_conn
+    mock_conn.fetchval.return_value = True
+
+    await connector.update_model("data_classif", 7, "bake_1",
+                                 {"k": 3}, "fp", "Incremental")
+
+    query, *values = mock_conn.execute.call_args[0]
+    assert query.startswith("UPDATE public.data_classif SET model_ref = $1")
+    assert "WHERE id = $4" in query
+    assert len(values[0]) == 64
+    assert values[1:] == ["fp", "Incremental", 7]
+
+
+@pytest.mark.asyncio
+async def test_update_model_fingerprint_only(connector):
+    mock_conn = AsyncMock()
+    connector.conn = mock_conn
+
+    await connector.update_model("data_claster", 3, "bake_1",
+                                 fingerprint="fp")
+
+    query, *values = mock_conn.execute.call_args[0]
+    assert "SET fingerprint = $1 WHERE id = $2" in query
+    assert values == ["fp", 3]
+    mock_conn.fetchval.assert_not_awaited()
+
+
+def test_model_cache_key_follows_model_ref(connector):
+    assert connector.model_cache_key("data_classif", 1, "a" * 64) != \
+        connector.model_cache_key("data_classif", 1, "b" * 64)
+    assert connector.model_cache_key("data_classif", 1)[-1] == 1
+
+
+# get_best_models берет модели из кэша процесса
+@pytest.mark.asyncio
+async def test_get_best_models_uses_model_cache():
+    connector = DatabaseConnector("model-cache-host", 5432, "agent",
+                                  "user", "pass")
+    mock_conn = AsyncMock()
+    connector.conn = mock_conn
+    blob = pickle.dumps({"model": "kmeans"})
+    model_hash = "a" * 64
+    row = {"model_table": "data_claster", "id": 11, "machine": "bake_1",
+           "method": "KMeans", "model": None, "model_ref": model_hash}
+    mock_conn.fetch.side_effect = [
+        [dict(row)],
+        [{"hash": model_hash, "data": zlib.compress(blob)}],
+        [dict(row)],
+    ]
+
+    first = await connector.get_best_models("bake_1")
+    second = await connector.get_best_models("bake_1")
+
+    assert first["data_claster"]["model"] == {"model": "kmeans"}
+    assert second["data_claster"]["model"] is \
+        first["data_claster"]["model"]
+    # третий запрос (к model_blobs) не понадобился
+    assert mock_conn.fetch.await_count == 3
+
+
+# Вытеснение из кэша во время загрузки не теряет найденные модели
+@pytest.mark.asyncio
+async def test_resolve_models_survives_eviction_during_load():
+    connector = DatabaseConnector("model-evict-host", 5432, "agent",
+                                  "user", "pass")
+    cached = {"model": "kmeans"}
+    model_cache.put(connector.model_cache_key("data_claster", 1, "a" * 64),
+                    cached, 10, "bake_1")
+    blob = pickle.dumps({"model": "knn"})
+
+    async def load_model_blobs(refs, schema):
+        assert refs == ["b" * 64]
+        model_cache.clear()
+        return {"b" * 64: blob}
+
+    connector.load_model_blobs = load_model_blobs
+    rows = [
+        {"model_table": "data_claster", "id": 1, "machine": "bake_1",
+         "model": None, "model_ref": "a" * 64},
+        {"model_table": "data_classif", "id": 2, "machine": "bake_1",
+         "model": None, "model_ref": "b" * 64},
+    ]
+
+    await connector._resolve_models(rows, "public")
+
+    assert rows[0]["model"] is cached
+    assert rows[1]["model"] == {"model": "knn"}
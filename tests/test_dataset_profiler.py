@@ -0,0 +1,63 @@
+from unittest.mock import patch
+
+import numpy as np
+import pytest
+from scipy import stats
+
+from src.analysis import dataset_profiler
+
+
+@pytest.fixture(autouse=True)
+def clear_profile_cache():
+    dataset_profiler.profile_cache.clear()
+
+
+def test_profile_matches_full_pass_statistics():
+    rng = np.random.default_rng(0)
+    X = rng.normal(5.0, 2.0, size=(1000, 3))
+    X[::97] += 40
+
+    profile = dataset_profiler.profile_dataset(X, chunk_rows=128)
+
+    assert np.allclose(profile.std, np.std(X, axis=0))
+    assert profile.cv == pytest.approx(
+        np.mean(np.std(X, axis=0) / np.mean(X, axis=0)))
+    assert profile.iqr == pytest.approx(np.mean(stats.iqr(X, axis=0)))
+    assert profile.outliers_zscore == pytest.approx(
+        np.mean(np.abs(stats.zscore(X)) > 3))
+
+
+def test_profile_sample_is_bounded():
+    X = np.random.default_rng(1).normal(size=(5000, 2))
+
+    running = dataset_profiler.RunningProfile(sample_size=300)
+    for start in range(0, len(X), 700):
+        running.update(X[start:start + 700])
+
+    assert len(running.sample) == 300
+    assert running.count == 5000
+    assert np.allclose(running.result().mean, X.mean(axis=0))
+
+
+def test_profile_is_cached():
+    X = np.arange(20.0).reshape(10, 2)
+    first = dataset_profiler.profile_dataset(X)
+    assert dataset_profiler.profile_dataset(X.copy()) is first
+
+
+def test_linearity_uses_bounded_stratified_sample():
+    rng = np.random.default_rng(2)
+    X = rng.normal(size=(3000, 2))
+    y = np.where(X[:, 0] > 0, "Норма", "Перегрузка").astype(object)
+
+    with patch.object(dataset_profiler.classification_methods,
+                      "determine_linearity",
+                      return_value="Linearly separable") as determine:
+        result = dataset_profiler.profile_linearity(X, y, max_samples=500)
+        dataset_profiler.profile_linearity(X, y, max_samples=500)
+
+    assert result == "Linearly separable"
+    determine.assert_called_once()
+    sample_X, sample_y = determine.call_args[0]
+    assert len(sample_X) <= 502
+    assert set(sample_y) == {"Норма", "Перегрузка"}
@@ -0,0 +1,73 @@
+import numpy as np
+import pytest
+from sklearn.cluster import AgglomerativeClustering, DBSCAN, \
+    KMeans, SpectralClustering
+
+from src.analysis import distance_graph, two_methods_included
+
+
+@pytest.fixture
+def blobs():
+    rng = np.random.default_rng(0)
+    return np.vstack([
+        rng.normal(0.0, 0.2, size=(40, 2)),
+        rng.normal(3.0, 0.2, size=(40, 2)),
+    ])
+
+
+def test_dbscan_on_radius_graph_matches_plain_fit(blobs):
+    precomputed = distance_graph.precompute_distances(
+        DBSCAN, {"eps": [0.1, 0.3, 0.5], "min_samples": [3, 5]}, blobs
+    )
+    assert precomputed.radius == 0.5
+
+    for eps in (0.1, 0.3, 0.5):
+        params, X_fit = precomputed.fit_input(
+            DBSCAN, {"eps": eps, "min_samples": 4}, blobs)
+        assert params["metric"] == "precomputed"
+        expected = DBSCAN(eps=eps, min_samples=4).fit(blobs).labels_
+        assert np.array_equal(DBSCAN(**params).fit(X_fit).labels_, expected)
+
+
+def test_agglomerative_uses_dense_matrix_except_ward(blobs):
+    precomputed = distance_graph.precompute_distances(
+        AgglomerativeClustering, {"n_clusters": [2, 3]}, blobs
+    )
+    params, X_fit = precomputed.fit_input(
+        AgglomerativeClustering, {"n_clusters": 2, "linkage": "average"},
+        blobs)
+    expected = AgglomerativeClustering(
+        n_clusters=2, linkage="average").fit(blobs).labels_
+    labels = AgglomerativeClustering(**params).fit(X_fit).labels_
+    assert np.array_equal(labels, expected)
+
+    params, X_fit = precomputed.fit_input(
+        AgglomerativeClustering, {"n_clusters": 2, "linkage": "ward"},
+        blobs)
+    assert X_fit is blobs and "metric" not in params
+
+
+def test_spectral_nearest_neighbors_graph(blobs):
+    precomputed = distance_graph.precompute_distances(
+        SpectralClustering, {"affinity": ["rbf", "nearest_neighbors"]}, blobs
+    )
+    params, X_fit = precomputed.fit_input(
+        SpectralClustering,
+        {"n_clusters": 2, "affinity": "nearest_neighbors", "gamma": 0.5},
+        blobs)
+    assert params["affinity"] == "precomputed_nearest_neighbors"
+    labels = SpectralClustering(random_state=42, **params).fit(X_fit).labels_
+    assert len(set(labels)) == 2
+
+
+def test_no_precomputation_for_kmeans(blobs):
+    assert distance_graph.precompute_distances(
+        KMeans, {"n_clusters": [2]}, blobs) is None
+
+
+def test_dbscan_search_with_precomputed_graph(blobs):
+    params, value = two_methods_included.optimize_hyperparameters_claster(
+        DBSCAN, {"eps": [0.3, 0.5], "min_samples": [3, 4]}, blobs,
+        n_trials=4, n_jobs=1
+    )
+    assert value > 0.5
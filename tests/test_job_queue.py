@@ -0,0 +1,98 @@
+import asyncio
+import os
+
+import pytest
+
+from src.analysis import two_methods_included
+from src.analysis.job_queue import JobQueue
+from src.analysis.training_pool import training_pool
+
+
+def objective(trial):
+    return trial.suggest_float("x", 0.0, 1.0)
+
+
+def optimize(n_trials):
+    params, value = two_methods_included.run_study(objective, n_trials,
+                                                   n_jobs=1)
+    return {"data": "Модель обучена", "best_value": value}
+
+
+async def train(n_trials):
+    return await training_pool.run(optimize, n_trials)
+
+
+def task_in_worker(n_trials):
+    # Внутри процесса пула training_pool.run не создает вложенный пул
+    result = asyncio.run(training_pool.run(optimize, n_trials))
+    return {**result, "pid": os.getpid()}
+
+
+async def fail():
+    raise RuntimeError("boom")
+
+
+@pytest.mark.asyncio
+async def test_job_reports_progress_and_result():
+    queue = JobQueue(max_running=1)
+    try:
+        job_id = queue.submit(train, 5, machine="bake_1")
+        assert queue.status(job_id)["status"] in ("queued", "running")
+        await asyncio.wait_for(queue._tasks[job_id], timeout=60)
+
+        status = queue.status(job_id)
+        progress = queue.progress(job_id)
+        result = queue.result(job_id)["result"]
+    finally:
+        await queue.shutdown()
+        training_pool.shutdown()
+
+    assert status["status"] == "done"
+    assert status["machine"] == "bake_1"
+    assert progress["trials_completed"] == 5
+    assert progress["study_trials"] == 5
+    assert progress["best_value"] == pytest.approx(result["best_value"])
+    assert queue.stats()["done"] == 1
+
+
+@pytest.mark.asyncio
+async def test_failed_job_keeps_error():
+    queue = JobQueue()
+    try:
+        job_id = queue.submit(fail)
+        await asyncio.wait_for(queue._tasks[job_id], timeout=10)
+    finally:
+        await queue.shutdown()
+
+    assert queue.status(job_id)["status"] == "error"
+    assert queue.status(job_id)["error"] == "boom"
+    assert queue.status("unknown") is None
+
+
+@pytest.mark.asyncio
+async def test_finished_jobs_are_bounded():
+    queue = JobQueue(max_finished=2)
+    try:
+        job_ids = [queue.submit(fail) for _ in range(4)]
+        await asyncio.gather(*list(queue._tasks.values()))
+    finally:
+        await queue.shutdown()
+
+    assert [queue.status(job_id) is None for job_id in job_ids] == \
+        [True, True, False, False]
+
+
+@pytest.mark.asyncio
+async def test_whole_task_runs_in_worker():
+    queue = JobQueue(max_running=1)
+    try:
+        job_id = queue.submit(training_pool.run, task_in_worker, 4)
+        await asyncio.wait_for(queue._tasks[job_id], timeout=60)
+        result = queue.result(job_id)["result"]
+        progress = queue.progress(job_id)
+    finally:
+        await queue.shutdown()
+        training_pool.shutdown()
+
+    assert result["pid"] != os.getpid()
+    assert progress["trials_completed"] == 4
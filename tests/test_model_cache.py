@@ -0,0 +1,49 @@
+import pickle
+
+from src.analysis.model_cache import ModelCache, deserialize_model
+
+
+DB = ("localhost", 5432, "agent")
+
+
+def test_get_or_load_counts_hits_and_misses():
+    cache = ModelCache()
+    blob = pickle.dumps({"n_clusters": 3})
+
+    first = cache.get_or_load((*DB, "data_claster", 1), "bake_1", blob)
+    second = cache.get_or_load((*DB, "data_claster", 1), "bake_1", blob)
+
+    assert first is second
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 1
+
+
+def test_lru_eviction_by_bytes():
+    cache = ModelCache(max_bytes=10)
+    cache.put((*DB, "data_classif", 1), "a", 6, "bake_1")
+    cache.put((*DB, "data_classif", 2), "b", 3, "bake_1")
+    cache.get((*DB, "data_classif", 1))
+    cache.put((*DB, "data_classif", 3), "c", 4, "bake_1")
+
+    assert (*DB, "data_classif", 1) in cache
+    assert (*DB, "data_classif", 2) not in cache
+    assert cache.stats()["bytes"] == 10
+
+
+def test_invalidate_machine():
+    cache = ModelCache()
+    cache.put((*DB, "data_classif", 1), "a", 1, "bake_1")
+    cache.put((*DB, "data_classif", 2), "b", 1, "bake_2")
+    cache.put((*DB, "data_claster", 3), "c", 1, "bake_1")
+
+    cache.invalidate_machine(DB, "data_classif", "bake_1")
+
+    assert (*DB, "data_classif", 1) not in cache
+    assert (*DB, "data_classif", 2) in cache
+    assert (*DB, "data_claster", 3) in cache
+
+
+def test_deserialize_model_accepts_ready_object():
+    model = {"ready": True}
+    assert deserialize_model(model) is model
+    assert deserialize_model(pickle.dumps(model)) == model
@@ -0,0 +1,32 @@
+import asyncio
+import os
+
+import pytest
+
+from src.analysis.training_pool import TrainingPool, \
+    default_training_workers
+
+
+def square(value):
+    return value * value, os.getpid()
+
+
+@pytest.mark.asyncio
+async def test_run_executes_in_worker_process():
+    pool = TrainingPool(max_workers=2)
+    try:
+        results = await asyncio.gather(*[pool.run(square, i)
+                                         for i in range(4)])
+    finally:
+        pool.shutdown()
+
+    assert [value for value, _ in results] == [0, 1, 4, 9]
+    assert all(pid != os.getpid() for _, pid in results)
+    assert pool.stats() == {"workers": 2, "submitted": 4, "running": 0}
+
+
+def test_default_training_workers(monkeypatch):
+    monkeypatch.delenv("TRAINING_WORKERS", raising=False)
+    assert default_training_workers() == 2
+    monkeypatch.setenv("TRAINING_WORKERS", "0")
+    assert default_training_workers() == 1
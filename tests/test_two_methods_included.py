@@ -0,0 +1,177 @@
+import os
+from unittest.mock import MagicMock
+
+import numpy as np
+import optuna
+import pytest
+from optuna.storages import JournalStorage
+from optuna.storages.journal import JournalFileBackend
+from sklearn.cluster import KMeans
+from sklearn.tree import DecisionTreeClassifier
+
+from src.analysis import training_pool, two_methods_included
+
+
+def test_default_n_jobs_from_env(monkeypatch):
+    monkeypatch.delenv("OPTUNA_N_JOBS", raising=False)
+    assert two_methods_included.default_n_jobs() == 1
+    monkeypatch.setenv("OPTUNA_N_JOBS", "3")
+    assert two_methods_included.default_n_jobs() == 3
+
+
+def test_optimize_claster_in_process_pool():
+    rng = np.random.default_rng(0)
+    X = np.vstack([rng.normal(0, 0.1, (30, 2)), rng.normal(3, 0.1, (30, 2))])
+
+    params, value = two_methods_included.optimize_hyperparameters_claster(
+        KMeans, {"n_clusters": (2, 4)}, X, n_trials=4, n_jobs=2
+    )
+
+    assert 2 <= params["n_clusters"] <= 4
+    assert -1 <= value <= 1
+
+
+def test_study_processes_use_training_start_method(monkeypatch):
+    contexts = []
+    executor_class = two_methods_included.ProcessPoolExecutor
+
+    def record_executor(*args, **kwargs):
+        contexts.append(kwargs.get("mp_context"))
+        return executor_class(*args, **kwargs)
+
+    monkeypatch.setattr(two_methods_included, "ProcessPoolExecutor",
+                        record_executor)
+    X = np.random.default_rng(0).normal(size=(20, 2))
+    two_methods_included.optimize_hyperparameters_claster(
+        KMeans, {"n_clusters": (2, 3)}, X, n_trials=2, n_jobs=2
+    )
+
+    assert [context.get_start_method() for context in contexts] == \
+        [training_pool.TRAINING_START_METHOD]
+
+
+def test_optimize_classif_in_process_pool():
+    rng = np.random.default_rng(0)
+    X = rng.normal(size=(40, 2))
+    y = (X[:, 0] > 0).astype(int)
+
+    params, value = two_methods_included.optimize_hyperparameters_classif(
+        DecisionTreeClassifier, {"max_depth": (1, 3)}, X, y,
+        n_trials=4, n_jobs=2
+    )
+
+    assert set(params) == {"max_depth"}
+    assert 0 <= value <= 1
+
+
+def test_objective_classif_prunes_after_first_fold():
+    rng = np.random.default_rng(0)
+    X = rng.normal(size=(40, 2))
+    y = (X[:, 0] > 0).astype(int)
+    trial = MagicMock()
+    trial.suggest_int.return_value = 2
+    trial.should_prune.return_value = True
+
+    with pytest.raises(optuna.TrialPruned):
+        two_methods_included.objective_classif(
+            trial, DecisionTreeClassifier, {"max_depth": (1, 3)}, X, y
+        )
+    trial.report.assert_called_once()
+    assert trial.report.call_args[0][1] == 0
+
+
+def test_objective_classif_reports_every_fold():
+    rng = np.random.default_rng(0)
+    X = rng.normal(size=(40, 2))
+    y = (X[:, 0] > 0).astype(int)
+    trial = MagicMock()
+    trial.suggest_int.return_value = 2
+    trial.should_prune.return_value = False
+
+    score = two_methods_included.objective_classif(
+        trial, DecisionTreeClassifier, {"max_depth": (1, 3)}, X, y
+    )
+    assert trial.report.call_count == 5
+    assert score == trial.report.call_args[0][0]
+
+
+def test_make_pruner():
+    assert isinstance(two_methods_included.make_pruner("halving"),
+                      optuna.pruners.SuccessiveHalvingPruner)
+    assert isinstance(two_methods_included.make_pruner(None),
+                      optuna.pruners.NopPruner)
+    with pytest.raises(ValueError):
+        two_methods_included.make_pruner("unknown")
+
+
+def test_warm_started_study_reuses_history(monkeypatch, tmp_path):
+    monkeypatch.setenv("OPTUNA_STUDY_DIR", str(tmp_path))
+    rng = np.random.default_rng(0)
+    X = np.vstack([rng.normal(0, 0.1, (30, 2)), rng.normal(3, 0.1, (30, 2))])
+    grid = {"n_clusters": list(np.arange(2, 6))}
+
+    first_params, _ = two_methods_included.optimize_hyperparameters_claster(
+        KMeans, grid, X, n_trials=12, study_key="Bake-1"
+    )
+    two_methods_included.optimize_hyperparameters_claster(
+        KMeans, grid, X, n_trials=12, study_key="Bake-1"
+    )
+
+    storage = JournalStorage(JournalFileBackend(
+        two_methods_included.study_storage_path("Bake-1")))
+    study = optuna.load_study(
+        study_name=two_methods_included.study_name_for(
+            "claster_silhouette", KMeans,
+            two_methods_included.plain_param_grid(grid)),
+        storage=storage)
+    trials = study.get_trials(deepcopy=False)
+    assert len(trials) == 12 + two_methods_included.warm_start_trials(12)
+    # Первым в новом запуске проверяется прошлый лучший вариант
+    assert trials[12].params == first_params
+
+    # Оценки другой метрики не попадают в историю силуэта
+    two_methods_included.optimize_hyperparameters_claster(
+        KMeans, grid, X, n_trials=3, scoring="calinski_harabasz",
+        study_key="Bake-1"
+    )
+    assert len(optuna.get_all_study_names(storage)) == 2
+    assert len(study.get_trials(deepcopy=False)) == len(trials)
+
+    two_methods_included.clear_study_history()
+    assert not tmp_path.exists()
+
+
+def test_study_dir_does_not_depend_on_cwd(monkeypatch, tmp_path):
+    monkeypatch.delenv("OPTUNA_STUDY_DIR", raising=False)
+    monkeypatch.chdir(tmp_path)
+    assert two_methods_included.study_dir() == \
+        two_methods_included.STUDY_DIR
+    assert os.path.isabs(two_methods_included.study_dir())
+
+
+def test_method_selector_restricts_huge_data():
+    rules = {
+        "data_size": {"Huge": ["MiniBatchKMeans", "Birch"]},
+        "data_set": {"Low": ["KMeans", "AgglomerativeClustering"]},
+        "noise": {"High": ["DBSCAN", "Birch"]},
+        "restrict": {"data_size": {"Huge": ["MiniBatchKMeans", "Birch"]}},
+    }
+    analysis = {"data_size": "Huge", "data_set": "Low", "noise": "Low"}
+    assert two_methods_included.method_selector_by_analysis(
+        analysis, rules) == "MiniBatchKMeans"
+    analysis["noise"] = "High"
+    assert two_methods_included.method_selector_by_analysis(
+        analysis, rules) == "Birch"
+
+
+@pytest.mark.asyncio
+async def test_limit_str_keeps_alarm_rows_outside_range():
+    data = [[1, None, 0, "Норма"], [5, None, 1, "Предел"],
+            [9, None, 0, "Норма"], [30, None, 1, "Предел"]]
+
+    filtered = await two_methods_included.processing_limit_str(data, "1:9")
+
+    assert [row[0] for row in filtered] == [1, 5, 9, 30]
+    filtered = await two_methods_included.processing_limit_str(
+        data[:3], "2:6")
+    assert [row[0] for row in filtered] == [5]